@@ -0,0 +1,190 @@
+import math
+
+from column_store import group_sums, load_numpy
+from dates import INVALID_DAY, date_to_day, day_to_date
+from money import SCALE
+
+#---------------------------------------------------------------------------------------------------Supported groupings and aggregate functions
+GROUP_BY_OPTIONS = ('category', 'day', 'month', 'year')
+FUNCTIONS = ('sum', 'count', 'mean', 'min', 'max', 'percentile')
+
+
+def aggregate(store, group_by='category', functions=('sum',), start_date=None, end_date=None, percentile=50):
+    """Group the transactions of a column store and compute aggregates for every group.
+    Args:
+    - store: The ColumnStore to read from.
+    - group_by: One of 'category', 'day', 'month' or 'year'.
+    - functions: Aggregates to compute, any of 'sum', 'count', 'mean', 'min', 'max', 'percentile'.
+    - start_date, end_date: Optional 'YYYY-MM-DD' limits (inclusive).
+    - percentile: The percentile computed by 'percentile' (0-100).
+    Returns:
+    - A list of (group, {function: value}) in category order or date order. Amounts are added up
+      exactly in integer minor units and returned in currency units."""
+
+    if group_by not in GROUP_BY_OPTIONS:
+        raise ValueError(f"Cannot group by '{group_by}'.")
+    for function in functions:
+        if function not in FUNCTIONS:
+            raise ValueError(f"Unknown aggregate '{function}'.")
+
+    start_day = date_to_day(start_date) if start_date else None
+    end_day = date_to_day(end_date) if end_date else None
+
+    if load_numpy() is not None:
+        return aggregate_numpy(store, group_by, functions, start_day, end_day, percentile)
+    return aggregate_python(store, group_by, functions, start_day, end_day, percentile)
+
+
+def period_label(group_by, day):
+    """Get the label of the day, month or year a day number falls in."""
+    date_str = day_to_date(day)
+    if group_by == 'month':
+        return date_str[:7]
+    if group_by == 'year':
+        return date_str[:4]
+    return date_str
+
+
+def group_rows(np, keys):
+    """Number the distinct keys in ascending order.
+    Category codes, days, months and years span a small range, so the keys are counted with one
+    np.bincount over that range instead of sorting every row as np.unique does.
+    Returns:
+    - (groups, inverse, counts): the distinct keys, the group number of every row and the rows per group."""
+
+    if len(keys):
+        low = int(keys.min())
+        span = int(keys.max()) - low + 1
+        if span <= max(len(keys), 1 << 16): #-----------------------------------------------------Wider ranges (sparse day keys) fall back to sorting
+            offsets = keys.astype(np.intp) - low
+            range_counts = np.bincount(offsets, minlength=span)
+            present = range_counts > 0
+            numbers = np.cumsum(present) - 1 #-------------------------------------------------------Group number of every key in the range
+            return np.flatnonzero(present) + low, numbers[offsets], range_counts[present]
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return groups, inverse, np.bincount(inverse, minlength=len(groups))
+
+
+def aggregate_numpy(store, group_by, functions, start_day, end_day, percentile):
+    """Vectorized implementation of aggregate using NumPy."""
+    np = load_numpy()
+    amounts, days, category_ids = store.numpy_columns()
+
+    #-----------------------------------------------------------------------------------------------Select the rows inside the date range
+    mask = None
+    if start_day is not None or end_day is not None or group_by != 'category':
+        mask = days != INVALID_DAY
+        if start_day is not None:
+            mask &= days >= start_day
+        if end_day is not None:
+            mask &= days <= end_day
+        amounts, days, category_ids = amounts[mask], days[mask], category_ids[mask]
+
+    #-----------------------------------------------------------------------------------------------Compute the group key of every row
+    if group_by == 'category':
+        keys = category_ids
+    elif group_by == 'day':
+        keys = days
+    else:
+        unit = 'M' if group_by == 'month' else 'Y'
+        keys = days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype(np.int64)
+
+    groups, inverse, counts = group_rows(np, keys)
+    results = {}
+
+    if 'sum' in functions or 'mean' in functions:
+        sums = group_sums(inverse, amounts, len(groups)) #------------------------------------------Exact int64 sums of the minor units
+        results['sum'] = sums / SCALE
+        results['mean'] = sums / np.maximum(counts, 1) / SCALE
+    results['count'] = counts
+
+    if 'min' in functions or 'max' in functions or 'percentile' in functions:
+        order = np.lexsort((amounts, inverse)) #--------------------------------------------------Sort by group, then by amount inside the group
+        sorted_amounts = amounts[order]
+        starts = np.cumsum(counts) - counts #------------------------------------------------------First sorted row of every group (empty when no row matched)
+        results['min'] = sorted_amounts[starts] / SCALE
+        results['max'] = sorted_amounts[starts + counts - 1] / SCALE
+
+        position = starts + (counts - 1) * (percentile / 100.0) #----------------------------------Linear interpolation between the closest ranks
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        fraction = position - lower
+        results['percentile'] = (sorted_amounts[lower] * (1 - fraction) + sorted_amounts[upper] * fraction) / SCALE
+
+    output = []
+    for index, key in enumerate(groups.tolist()):
+        if group_by == 'category':
+            label = store.categories[key]
+        elif group_by == 'day':
+            label = day_to_date(key)
+        elif group_by == 'month':
+            label = f"{1970 + key // 12:04d}-{key % 12 + 1:02d}"
+        else:
+            label = f"{1970 + key:04d}"
+
+        values = {}
+        for function in functions:
+            value = results[function][index]
+            values[function] = int(value) if function == 'count' else float(value)
+        output.append((label, values))
+
+    return output
+
+
+def aggregate_python(store, group_by, functions, start_day, end_day, percentile):
+    """Pure Python implementation of aggregate used when NumPy is not installed."""
+    groups = {}
+    labels = {} #-----------------------------------------------------------------------------------Day number -> group label
+    filtered = start_day is not None or end_day is not None or group_by != 'category'
+
+    for code, day, amount in zip(store.category_ids, store.days, store.amounts):
+        if filtered:
+            if day == INVALID_DAY:
+                continue
+            if start_day is not None and day < start_day:
+                continue
+            if end_day is not None and day > end_day:
+                continue
+
+        if group_by == 'category':
+            key = code
+        else:
+            key = labels.get(day)
+            if key is None:
+                key = labels[day] = period_label(group_by, day)
+
+        amounts = groups.get(key)
+        if amounts is None:
+            amounts = groups[key] = []
+        amounts.append(amount)
+
+    output = []
+    for key in sorted(groups):
+        amounts = groups[key]
+        label = store.categories[key] if group_by == 'category' else key
+        values = {}
+
+        for function in functions:
+            if function == 'sum':
+                values[function] = sum(amounts) / SCALE
+            elif function == 'count':
+                values[function] = len(amounts)
+            elif function == 'mean':
+                values[function] = sum(amounts) / len(amounts) / SCALE
+            elif function == 'min':
+                values[function] = min(amounts) / SCALE
+            elif function == 'max':
+                values[function] = max(amounts) / SCALE
+            else:
+                amounts.sort()
+                position = (len(amounts) - 1) * (percentile / 100.0)
+                lower = math.floor(position)
+                upper = math.ceil(position)
+                fraction = position - lower
+                values[function] = (amounts[lower] * (1 - fraction) + amounts[upper] * fraction) / SCALE
+
+        output.append((label, values))
+
+    return output
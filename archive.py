@@ -0,0 +1,241 @@
+import io
+import json
+import math
+import os
+import time
+from itertools import islice
+
+import bulk_import
+from dates import valid_date
+from money import format_minor, from_minor, parse_amount, to_minor
+
+#---------------------------------------------------------------------------------------------------Archive layouts, picked from the file name: 'ledger.ndjson.gz', 'ledger.csv.zst', 'ledger.ndjson', ...
+#ndjson: one {"category": ..., "amount": ..., "date": ...} object per line, any category name
+#csv: 'category, amount, date' lines like bulky.txt, so an archive can also be read as a bulk file once decompressed
+ARCHIVE_FORMATS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv', '.txt': 'csv'}
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'} #-------------------------------------------------------zstd needs the optional 'zstandard' package
+
+#---------------------------------------------------------------------------------------------------Streaming settings
+GZIP_LEVEL = 6 #--------------------------------------------------------------------------------------Level 9 is much slower for a few percent
+ZSTD_LEVEL = 3
+CHUNK_LINES = 10000 #--------------------------------------------------------------------------------Lines joined into one write
+AMOUNT_CACHE_SIZE = 10000 #--------------------------------------------------------------------------Formatted or parsed amounts kept, so memory stays flat
+BUFFER_SIZE = 1024 * 1024
+
+
+def split_archive_name(filename):
+    """Get (archive format, compression) from an archive file name.
+    Returns:
+    - ('ndjson' or 'csv', 'gzip', 'zstd' or None).
+    Raises ValueError if the name has no known archive extension."""
+
+    base, extension = os.path.splitext(filename.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression is not None:
+        base, extension = os.path.splitext(base)
+    archive_format = ARCHIVE_FORMATS.get(extension)
+    if archive_format is None:
+        if compression is None:
+            raise ValueError(f"'{filename}' is not an archive name: use .ndjson or .csv, optionally followed by .gz or .zst")
+        archive_format = 'csv' #----------------------------------------------------------------------'bulky.gz': a compressed bulk file
+    return archive_format, compression
+
+
+def is_archive(filename):
+    """Check if a file to import is an archive rather than a plain bulk file (compressed, or NDJSON)."""
+    try:
+        archive_format, compression = split_archive_name(filename)
+    except ValueError:
+        return False
+    return compression is not None or archive_format == 'ndjson'
+
+
+def load_zstandard():
+    """Import the optional zstandard package. Raises ValueError if it is not installed."""
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd archives need the 'zstandard' package (pip install zstandard), or use .gz instead") from None
+    return zstandard
+
+
+def open_archive(filename, mode, compression=None):
+    """Open an archive file as a text stream that compresses or decompresses on the fly.
+    Args:
+    - filename: The file to open.
+    - mode: 'r' or 'w'.
+    - compression: 'gzip', 'zstd' or None for a plain text file.
+    Returns:
+    - An open text file. Closing it finishes the compressed stream and closes the file."""
+
+    if compression == 'gzip':
+        import gzip #---------------------------------------------------------------------------------Only archive commands pay for importing gzip
+        raw = gzip.GzipFile(filename, mode + 'b', compresslevel=GZIP_LEVEL)
+    elif compression == 'zstd':
+        zstandard = load_zstandard()
+        file = open(filename, mode + 'b')
+        if mode == 'w':
+            raw = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(file)
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(file)
+    else:
+        return open(filename, mode, buffering=BUFFER_SIZE, encoding='utf-8', newline='' if mode == 'w' else None)
+
+    if mode == 'w':
+        raw = io.BufferedWriter(raw, BUFFER_SIZE)
+    else:
+        raw = io.BufferedReader(raw, BUFFER_SIZE)
+    return io.TextIOWrapper(raw, encoding='utf-8', newline='' if mode == 'w' else None)
+
+
+def transaction_rows(transactions):
+    """Yield (category, amount, date) rows from a transactions dictionary."""
+    for category, category_transactions in transactions.items():
+        for transaction in category_transactions:
+            yield category, transaction['amount'], transaction['date']
+
+
+def amount_text(amount, cache):
+    """Format an amount with exactly the currency digits, e.g. 12.3 -> '12.30' (cached per amount)."""
+    text = cache.get(amount)
+    if text is None:
+        if len(cache) >= AMOUNT_CACHE_SIZE:
+            cache.clear()
+        text = cache[amount] = format_minor(to_minor(amount))
+    return text
+
+
+def ndjson_lines(rows):
+    """Yield one NDJSON line per (category, amount, date) row."""
+    prefixes = {}
+    dates = {}
+    amounts = {}
+    for category, amount, date in rows:
+        prefix = prefixes.get(category)
+        if prefix is None:
+            prefix = prefixes[category] = '{"category": ' + json.dumps(category) + ', "amount": '
+        quoted_date = dates.get(date)
+        if quoted_date is None:
+            quoted_date = dates[date] = json.dumps(date)
+        yield f'{prefix}{amount_text(amount, amounts)}, "date": {quoted_date}}}\n'
+
+
+def csv_lines(rows):
+    """Yield one 'category, amount, date' line per row, in the bulky.txt layout.
+    Raises ValueError for a category name that cannot be read back from that layout (use NDJSON for those)."""
+
+    checked = set()
+    amounts = {}
+    for category, amount, date in rows:
+        if category not in checked:
+            if ',' in category or '\n' in category or '\r' in category or category != category.strip() or not category:
+                raise ValueError(f"Category {category!r} cannot be written as a bulk file line, export to .ndjson instead.")
+            checked.add(category)
+        yield f"{category}, {amount_text(amount, amounts)}, {date}\n"
+
+
+def parse_ndjson_line(line, amount_cache=None):
+    """Parse a single NDJSON archive line.
+    Args:
+    - line: A line holding a {"category": ..., "amount": ..., "date": ...} object.
+    - amount_cache: Optional {amount: amount} dictionary shared by the lines of a batch.
+    Returns:
+    - (expense_type, amount, date) tuple, like bulk_import.parse_bulk_line. The amount is rounded to the currency digits.
+    Raises ValueError if the line is not in the expected format."""
+
+    try:
+        record = json.loads(line, parse_float=parse_amount) #---------------------------------------Decimal text straight to minor units, never through float(), as in journal
+        expense_type = record['category']
+        amount = record['amount']
+        date = record['date']
+    except (KeyError, TypeError):
+        raise ValueError("expected an object with category, amount and date") from None
+    if not isinstance(expense_type, str) or not isinstance(date, str) or type(amount) not in (int, float):
+        raise ValueError("expected a text category and date and a number amount")
+    if not expense_type:
+        raise ValueError("missing expense type")
+    date = valid_date(date)
+
+    value = None if amount_cache is None else amount_cache.get(amount) #-------------------------------Archives repeat the same amounts many times
+    if value is None:
+        if not math.isfinite(amount): #---------------------------------------------------------------json accepts NaN and Infinity
+            raise ValueError(f"amount must be a finite number: {amount!r}")
+        value = from_minor(to_minor(amount))
+        if amount_cache is not None:
+            amount_cache[amount] = value
+    return expense_type, value, date
+
+
+def export_archive(filename, rows):
+    """Stream (category, amount, date) rows into a (compressed) archive file.
+
+    Lines are made by a generator and written CHUNK_LINES at a time, so memory does not grow with the
+    number of rows. The archive is written to '<filename>.tmp' first and only replaces filename once it
+    is complete.
+    Args:
+    - filename: The archive file; its name picks the layout and compression (see split_archive_name).
+    - rows: Any iterable of rows, e.g. transaction_rows(ledger.transactions) or PartitionedStorage.iter_rows().
+    Returns:
+    - A dictionary with the export statistics (rows, bytes, seconds, rows_per_sec)."""
+
+    archive_format, compression = split_archive_name(filename)
+    lines = ndjson_lines(rows) if archive_format == 'ndjson' else csv_lines(rows)
+    temp_filename = filename + '.tmp'
+    stats = {'rows': 0, 'bytes': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    start = time.perf_counter()
+
+    try:
+        with open_archive(temp_filename, 'w', compression) as file:
+            while True:
+                chunk = list(islice(lines, CHUNK_LINES))
+                if not chunk:
+                    break
+                file.write(''.join(chunk))
+                stats['rows'] += len(chunk)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    os.replace(temp_filename, filename)
+
+    stats['bytes'] = os.path.getsize(filename)
+    stats['seconds'] = time.perf_counter() - start
+    if stats['seconds'] > 0:
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds']
+    return stats
+
+
+def read_archive(filename):
+    """Yield the (category, amount, date) rows of an archive file one line at a time.
+    Raises ValueError on the first malformed line (import_archive writes those to a reject file instead)."""
+
+    archive_format, compression = split_archive_name(filename)
+    parse_line = parse_ndjson_line if archive_format == 'ndjson' else bulk_import.parse_bulk_line
+    amount_cache = {}
+    with open_archive(filename, 'r', compression) as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield parse_line(line, amount_cache)
+            except ValueError as e:
+                raise ValueError(f"{filename} line {line_number}: {e}") from None
+            if len(amount_cache) >= AMOUNT_CACHE_SIZE:
+                amount_cache.clear()
+
+
+def import_archive(filename, batch_size=bulk_import.BATCH_SIZE, duplicates='keep', near_days=None):
+    """Import a (compressed) archive file into the shared transactions dictionary in batches.
+    The file is decompressed as it is read and goes through the same batched import as a bulk file:
+    malformed lines are written to '<filename>.rejects' and duplicates listed in '<filename>.duplicates'.
+    Args:
+    - filename: The archive file (see split_archive_name).
+    - batch_size, duplicates, near_days: As for bulk_import.stream_bulk_transactions.
+    Returns:
+    - A dictionary with the import statistics (rows, rejected, duplicates, near_duplicates, batches, seconds, rows_per_sec)."""
+
+    archive_format, compression = split_archive_name(filename)
+    parse_line = parse_ndjson_line if archive_format == 'ndjson' else bulk_import.parse_bulk_line
+    with open_archive(filename, 'r', compression) as file:
+        return bulk_import.stream_bulk_lines(file, batch_size, filename + '.rejects', duplicates, near_days,
+                                             filename + '.duplicates', parse_line)
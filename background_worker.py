@@ -0,0 +1,86 @@
+import queue
+import threading
+
+#---------------------------------------------------------------------------------------------------How often the Tk main loop checks for finished tasks (milliseconds)
+POLL_INTERVAL = 50
+
+
+class Cancelled(Exception):
+    """Raised inside a task when a newer task of the same kind was submitted."""
+
+
+class BackgroundWorker:
+    """Runs slow GUI work (loading, searching, sorting, aggregating) on a background thread.
+
+    Tasks are run one at a time, in order, on a single worker thread. Their results are put on a
+    queue that the Tk main loop polls with root.after, so callbacks always run on the UI thread and
+    never touch Tk from the worker. Every task has a kind (e.g. 'search'); submitting a new task of
+    the same kind supersedes the older ones, which are skipped, stopped at their next cancellation
+    check, or have their result dropped.
+    """
+
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy #----------------------------------------------------------------------Called with True/False when the worker starts/stops being busy
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.generations = {} #-----------------------------------------------------------------------kind -> number of the latest task of that kind
+        self.pending = 0 #----------------------------------------------------------------------------Tasks submitted but not delivered yet
+        self.busy = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.root.after(POLL_INTERVAL, self.poll)
+
+    def submit(self, kind, function, callback, *args):
+        """Run function(*args, cancelled) on the worker thread and call callback(result) on the UI thread.
+        cancelled is a function the task can call to check whether it has been superseded.
+        If the task raises an exception, callback receives the exception instead of a result."""
+
+        generation = self.generations.get(kind, 0) + 1
+        self.generations[kind] = generation
+
+        def cancelled():
+            return self.generations[kind] != generation
+
+        self.pending += 1
+        self.set_busy(True)
+        self.tasks.put((kind, generation, function, args, callback, cancelled))
+
+    def run(self):
+        """Worker thread loop."""
+        while True:
+            kind, generation, function, args, callback, cancelled = self.tasks.get()
+
+            if cancelled(): #-----------------------------------------------------------------------Skip tasks that were superseded while queued
+                self.results.put((kind, generation, callback, Cancelled()))
+                continue
+
+            try:
+                result = function(*args, cancelled)
+            except Exception as e:
+                result = e
+            self.results.put((kind, generation, callback, result))
+
+    def poll(self):
+        """Deliver finished results to their callbacks. Runs on the UI thread.
+        Polling goes on even if a callback raises, so later results are still delivered."""
+        try:
+            while True:
+                kind, generation, callback, result = self.results.get_nowait()
+                self.pending -= 1
+
+                if generation == self.generations[kind] and not isinstance(result, Cancelled):
+                    callback(result)
+        except queue.Empty:
+            pass
+        finally:
+            if self.pending == 0:
+                self.set_busy(False)
+            self.root.after(POLL_INTERVAL, self.poll)
+
+    def set_busy(self, busy):
+        """Tell the on_busy callback when the worker starts or stops being busy."""
+        if busy != self.busy:
+            self.busy = busy
+            if self.on_busy is not None:
+                self.on_busy(busy)
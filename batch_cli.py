@@ -0,0 +1,401 @@
+"""Non-interactive command line for scripts, cron jobs and pipelines.
+
+Usage:
+    python batch_cli.py import FILE [FILE ...]        (use '-' to read bulk lines from stdin)
+    python batch_cli.py export [--format json|csv] [--output ARCHIVE]   (ARCHIVE: .ndjson or .csv, optionally .gz/.zst)
+    python batch_cli.py summary [--group-by category|day|month|year] [--start DATE] [--end DATE] [--format json|csv]
+    python batch_cli.py search [--category TEXT] [--min AMOUNT] [--max AMOUNT] [--start DATE] [--end DATE] [--format json|csv]
+    python batch_cli.py delete [--category NAME] [--min AMOUNT] [--max AMOUNT] [--start DATE] [--end DATE] [--dry-run]
+    python batch_cli.py update [filters as for delete] (--set AMOUNT | --add AMOUNT | --multiply FACTOR | --move CATEGORY) [--dry-run]
+    python batch_cli.py totals [--start-month YYYY-MM] [--end-month YYYY-MM] [--format json|csv]
+    python batch_cli.py trend [--level day|week|month|year] [--category NAME] [--start DATE] [--end DATE] [--format json|csv]
+    python batch_cli.py gui
+
+Archives named by import (e.g. 'ledger.ndjson.gz', 'ledger.csv.zst') are decompressed while they are
+read, and 'export --output' streams every row into one without building the whole text in memory.
+
+Every command loads the storage once and saves at most once. Results are written to stdout as
+JSON (default) or CSV, and messages go to stderr. The GUI modules are only imported by 'gui'.
+
+With partitioned storage (a .parts folder) summary and search with a date range only read the
+monthly segments inside the range, and totals only reads the segment footers, so none of them
+load the whole history.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import aggregation
+import archive
+import bulk_edit
+import bulk_import
+import ledger
+import parallel_import
+from column_store import ColumnStore
+from dates import date_sort_key, date_to_day, day_range
+from concurrency import ConcurrencyError
+from duplicate_index import DUPLICATE_MODES
+from money import from_minor, parse_amount
+from rollup_cube import LEVELS, day_periods, period_label
+from partitioned_storage import PartitionedStorage
+
+#---------------------------------------------------------------------------------------------------Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+
+def iso_date(text):
+    """argparse type for YYYY-MM-DD dates."""
+    try:
+        date_to_day(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', expected YYYY-MM-DD")
+    return text
+
+
+def write_records(records, fields, output_format, out=None):
+    """Write a list of dictionaries to stdout (or out) as a JSON array or as CSV with a header row."""
+    out = out or sys.stdout
+    if output_format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(records)
+    else:
+        json.dump(records, out, indent=2)
+        out.write('\n')
+
+
+def matches(transaction, args):
+    """Check a transaction against the amount and date filters of a command."""
+    if args.min is not None and transaction['amount'] < args.min:
+        return False
+    if args.max is not None and transaction['amount'] > args.max:
+        return False
+    if args.start is not None or args.end is not None:
+        first_day, last_day = day_range(args.start, args.end)
+        if not first_day <= date_sort_key(transaction['date']) <= last_day:
+            return False
+    return True
+
+
+def category_matches(category, args):
+    """Check a category against the (case insensitive) category text filter of a command."""
+    return args.category is None or args.category.lower() in category.lower()
+
+
+def candidate_rows(args):
+    """Get the (category, transaction) rows worth checking against the filters, using the search index."""
+    index = ledger.search_index
+    if args.category is not None:
+        return [(category, transaction)
+                for category in index.categories_matching(args.category)
+                for transaction in ledger.transactions[category]]
+    if args.min is not None or args.max is not None:
+        return index.amount_range(args.min, args.max)
+    if args.start is not None or args.end is not None:
+        return index.date_range(args.start, args.end)
+    return [(category, transaction) for category, category_transactions in ledger.transactions.items()
+            for transaction in category_transactions]
+
+
+#---------------------------------------------------------------------------------------------------Commands
+def command_import(args):
+    """Import bulk files (or stdin) and save once."""
+    totals = {'files': 0, 'rows': 0, 'rejected': 0, 'duplicates': 0, 'near_duplicates': 0, 'seconds': 0.0}
+    files = [filename for filename in args.files if filename != '-' and not archive.is_archive(filename)]
+    archives = [filename for filename in args.files if filename != '-' and archive.is_archive(filename)]
+
+    if '-' in args.files:
+        stats = bulk_import.stream_bulk_lines(sys.stdin, reject_filename=args.stdin_rejects, duplicates=args.duplicates,
+                                              near_days=args.near_days, duplicate_filename=args.stdin_duplicates)
+        totals['files'] += 1
+        for key in ('rows', 'rejected', 'duplicates', 'near_duplicates', 'seconds'):
+            totals[key] += stats[key]
+
+    for filename in archives:
+        try:
+            stats = archive.import_archive(filename, duplicates=args.duplicates, near_days=args.near_days)
+        except ValueError as e: #-----------------------------------------------------------------------zstd archive without the zstandard package
+            print(e, file=sys.stderr)
+            return EXIT_ERROR
+        totals['files'] += 1
+        for key in ('rows', 'rejected', 'duplicates', 'near_duplicates', 'seconds'):
+            totals[key] += stats[key]
+
+    if files:
+        stats = parallel_import.import_bulk_files(files, workers=args.workers, duplicates=args.duplicates, near_days=args.near_days)
+        for key in ('files', 'rows', 'rejected', 'duplicates', 'near_duplicates', 'seconds'):
+            totals[key] += stats[key]
+
+    ledger.save()
+    totals['rows_per_sec'] = totals['rows'] / totals['seconds'] if totals['seconds'] > 0 else 0.0
+    write_records([totals], list(totals), args.format)
+    return EXIT_OK
+
+
+def command_export(args):
+    """Write every transaction: the transactions.json layout as JSON, or bulk file lines as CSV.
+    With --output the rows are streamed into a (compressed) archive file and the statistics are written instead."""
+    if args.output:
+        return write_archive(args, archive.transaction_rows(ledger.transactions))
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        for category, category_transactions in ledger.transactions.items():
+            writer.writerows((category, transaction['amount'], transaction['date']) for transaction in category_transactions)
+    else:
+        json.dump(ledger.transactions, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+    return EXIT_OK
+
+
+def write_archive(args, rows):
+    """Stream rows into the --output archive and write the export statistics."""
+    try:
+        stats = archive.export_archive(args.output, rows)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    stats['file'] = args.output
+    write_records([stats], list(stats), args.format)
+    return EXIT_OK
+
+
+def command_summary(args):
+    """Write totals, counts, means, min, max and median per group."""
+    functions = ('sum', 'count', 'mean', 'min', 'max', 'percentile')
+    report = aggregation.aggregate(ledger.column_store(), args.group_by, functions, args.start, args.end)
+    records = [dict({args.group_by: group}, **values) for group, values in report]
+    write_records(records, [args.group_by] + list(functions), args.format)
+    return EXIT_OK
+
+
+def command_search(args):
+    """Write the transactions matching every given filter."""
+    records = [{'category': category, 'amount': transaction['amount'], 'date': transaction['date']}
+               for category, transaction in candidate_rows(args) if matches(transaction, args)]
+    write_records(records, ['category', 'amount', 'date'], args.format)
+    return EXIT_OK
+
+
+def has_filters(args):
+    """Check that a command that changes transactions was given at least one filter."""
+    if args.category is None and args.min is None and args.max is None and args.start is None and args.end is None:
+        print("Refusing to change everything: give at least one filter.", file=sys.stderr)
+        return False
+    return True
+
+
+def command_delete(args):
+    """Delete the transactions matching every given filter in one bulk change and save once."""
+    if not has_filters(args):
+        return EXIT_ERROR
+    deleted = bulk_edit.bulk_edit('delete', None, args.category, args.min, args.max, args.start, args.end, args.dry_run)
+    write_records([{'deleted': deleted, 'dry_run': args.dry_run}], ['deleted', 'dry_run'], args.format)
+    return EXIT_OK
+
+
+def command_update(args):
+    """Change the amount or the category of the transactions matching every given filter and save once."""
+    if not has_filters(args):
+        return EXIT_ERROR
+    for action in ('set', 'add', 'multiply', 'move'):
+        value = getattr(args, action)
+        if value is not None:
+            break
+    try:
+        updated = bulk_edit.bulk_edit(action, value, args.category, args.min, args.max, args.start, args.end, args.dry_run)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    write_records([{'updated': updated, 'dry_run': args.dry_run}], ['updated', 'dry_run'], args.format)
+    return EXIT_OK
+
+
+def command_totals(args):
+    """Write the total of every category in every month."""
+    month_totals = ledger.totals.month_totals
+    records = [{'month': month, 'category': category, 'total': from_minor(total)}
+               for month in sorted(month_totals)
+               if (args.start_month is None or month >= args.start_month) and (args.end_month is None or month <= args.end_month)
+               for category, total in month_totals[month].items() if total]
+    write_records(records, ['month', 'category', 'total'], args.format)
+    return EXIT_OK
+
+
+def command_trend(args):
+    """Write money out, money in, net and count of every day, week, month or year from the rollup cube."""
+    level = LEVELS.index(args.level)
+    start = day_periods(date_to_day(args.start))[level] if args.start else None
+    end = day_periods(date_to_day(args.end))[level] if args.end else None
+    records = [{'period': period_label(args.level, period), 'out': from_minor(out), 'in': from_minor(received),
+                'net': from_minor(out - received), 'count': count}
+               for period, out, received, count in ledger.cube.series(args.level, args.category, start, end)]
+    write_records(records, ['period', 'out', 'in', 'net', 'count'], args.format)
+    return EXIT_OK
+
+
+#---------------------------------------------------------------------------------------------------Commands that read only part of a partitioned storage folder
+def partition_summary(args, partitions):
+    """summary that only reads the segments inside the date range."""
+    store = ColumnStore()
+    day_cache = {}
+    for category, amount, date in partitions.iter_rows(start_date=args.start, end_date=args.end):
+        store.append_rows(category, ((amount, date),), day_cache)
+    store.stale = False
+
+    functions = ('sum', 'count', 'mean', 'min', 'max', 'percentile')
+    report = aggregation.aggregate(store, args.group_by, functions, args.start, args.end)
+    records = [dict({args.group_by: group}, **values) for group, values in report]
+    write_records(records, [args.group_by] + list(functions), args.format)
+    return EXIT_OK
+
+
+def partition_search(args, partitions):
+    """search that only reads the segments inside the date range."""
+    records = [{'category': category, 'amount': amount, 'date': date}
+               for category, amount, date in partitions.iter_rows(start_date=args.start, end_date=args.end)
+               if category_matches(category, args) and matches({'amount': amount, 'date': date}, args)]
+    write_records(records, ['category', 'amount', 'date'], args.format)
+    return EXIT_OK
+
+
+def partition_export(args, partitions):
+    """export --output that streams the rows segment by segment, without loading the whole history."""
+    return write_archive(args, partitions.iter_rows())
+
+
+def partition_totals(args, partitions):
+    """totals straight from the segment footers."""
+    month_totals = partitions.month_totals(args.start_month, args.end_month)
+    records = [{'month': month, 'category': category, 'total': total}
+               for month, totals in month_totals.items() for category, total in totals.items()]
+    write_records(records, ['month', 'category', 'total'], args.format)
+    return EXIT_OK
+
+
+def command_gui(args):
+    """Open the GUI on the loaded transactions."""
+    import sample_code_1 #-------------------------------------------------------------------------Only the GUI command pays for importing tkinter
+    sample_code_1.main(ledger.transactions)
+    ledger.save()
+    return EXIT_OK
+
+
+def build_parser():
+    """Create the argument parser with every subcommand."""
+    parser = argparse.ArgumentParser(description="Personal Finance Tracker batch commands.")
+    parser.add_argument('--storage', help="Storage file (default: FINANCE_TRACKER_STORAGE or transactions.json)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_format(command):
+        command.add_argument('--format', choices=('json', 'csv'), default='json')
+
+    def add_filters(command, category_help):
+        command.add_argument('--category', help=category_help)
+        command.add_argument('--min', type=parse_amount, help="Minimum amount")
+        command.add_argument('--max', type=parse_amount, help="Maximum amount")
+        command.add_argument('--start', type=iso_date, help="First date (YYYY-MM-DD)")
+        command.add_argument('--end', type=iso_date, help="Last date (YYYY-MM-DD)")
+
+    command = commands.add_parser('import', help="Import bulk files, folders or glob patterns ('-' reads stdin)")
+    command.add_argument('files', nargs='+')
+    command.add_argument('--workers', type=int, help="Number of parser processes")
+    command.add_argument('--stdin-rejects', default='stdin.rejects', help="Where to write malformed stdin lines")
+    command.add_argument('--duplicates', choices=DUPLICATE_MODES, default='keep',
+                         help="What to do with rows already stored: keep, skip, or flag (import and list them in '<file>.duplicates')")
+    command.add_argument('--near-days', type=int, help="Also treat the same category and amount within N days as a duplicate")
+    command.add_argument('--stdin-duplicates', default='stdin.duplicates', help="Where to list duplicate stdin lines")
+    add_format(command)
+    command.set_defaults(run=command_import, changes=True)
+
+    command = commands.add_parser('export', help="Write all transactions (JSON layout of transactions.json, or bulk file CSV)")
+    command.add_argument('--output', help="Stream into an archive file instead: .ndjson or .csv, optionally followed by .gz or .zst")
+    add_format(command)
+    command.set_defaults(run=command_export, run_partitioned=partition_export)
+
+    command = commands.add_parser('summary', help="Grouped totals, counts, means, min, max and median")
+    command.add_argument('--group-by', choices=aggregation.GROUP_BY_OPTIONS, default='category')
+    command.add_argument('--start', type=iso_date, help="First date (YYYY-MM-DD)")
+    command.add_argument('--end', type=iso_date, help="Last date (YYYY-MM-DD)")
+    add_format(command)
+    command.set_defaults(run=command_summary, run_partitioned=partition_summary)
+
+    command = commands.add_parser('search', help="Find transactions by category text, amount range and date range")
+    add_filters(command, "Text contained in the category name (case insensitive)")
+    add_format(command)
+    command.set_defaults(run=command_search, run_partitioned=partition_search)
+
+    command = commands.add_parser('delete', help="Delete the transactions matching every filter")
+    add_filters(command, "Exact category name (default: every category)")
+    command.add_argument('--dry-run', action='store_true', help="Only count the matching transactions")
+    add_format(command)
+    command.set_defaults(run=command_delete, changes=True)
+
+    command = commands.add_parser('update', help="Change the amount or category of the transactions matching every filter")
+    add_filters(command, "Exact category name (default: every category)")
+    action = command.add_mutually_exclusive_group(required=True)
+    action.add_argument('--set', type=parse_amount, help="New amount")
+    action.add_argument('--add', type=parse_amount, help="Amount to add (negative to subtract)")
+    action.add_argument('--multiply', help="Factor to multiply the amount by (e.g. -1 to flip the sign)")
+    action.add_argument('--move', metavar='CATEGORY', help="Category to move the transactions to (merged if it exists)")
+    command.add_argument('--dry-run', action='store_true', help="Only count the transactions that would change")
+    add_format(command)
+    command.set_defaults(run=command_update, changes=True)
+
+    command = commands.add_parser('totals', help="Total of every category in every month")
+    command.add_argument('--start-month', help="First month (YYYY-MM)")
+    command.add_argument('--end-month', help="Last month (YYYY-MM)")
+    add_format(command)
+    command.set_defaults(run=command_totals, run_partitioned=partition_totals)
+
+    command = commands.add_parser('trend', help="Totals per day, week, month or year from the rollup cube")
+    command.add_argument('--level', choices=LEVELS, default='month')
+    command.add_argument('--category', help="Exact category name (default: every category)")
+    command.add_argument('--start', type=iso_date, help="First date (YYYY-MM-DD)")
+    command.add_argument('--end', type=iso_date, help="Last date (YYYY-MM-DD)")
+    add_format(command)
+    command.set_defaults(run=command_trend)
+
+    command = commands.add_parser('gui', help="Open the GUI")
+    command.set_defaults(run=command_gui, changes=True)
+
+    return parser
+
+
+def main(argv=None):
+    """Run one batch command. Returns the process exit code."""
+    args = build_parser().parse_args(argv)
+
+    #-----------------------------------------------------------------------------------------------Answer from the needed segments only, without loading everything
+    filename = args.storage or ledger.STORAGE_FILENAME
+    run_partitioned = getattr(args, 'run_partitioned', None)
+    date_range = getattr(args, 'start', None) is not None or getattr(args, 'end', None) is not None
+    if run_partitioned is not None and os.path.splitext(filename)[1].lower() == '.parts' and (date_range or args.command == 'totals' or getattr(args, 'output', None)):
+        return run_partitioned(args, PartitionedStorage(filename))
+
+    try:
+        ledger.load(args.storage)
+    except json.decoder.JSONDecodeError:
+        print(f"{args.storage or ledger.STORAGE_FILENAME} is not valid JSON.", file=sys.stderr)
+        return EXIT_ERROR
+    except ConcurrencyError as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+
+    try:
+        return args.run(args)
+    except FileNotFoundError as e:
+        print(f"File '{e.filename}' not found.", file=sys.stderr)
+        return EXIT_ERROR
+    except ConcurrencyError as e: #-----------------------------------------------------------------Another process kept the storage locked, or changed the same rows
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if getattr(args, 'changes', False) and not getattr(args, 'dry_run', False): #-------------------Read-only commands take no write lock and leave the storage and cube files alone
+            ledger.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Compare size, throughput and peak memory of the archive formats with the pretty-printed JSON path.
+
+Usage: python benchmarks/bench_archive.py [--rows N] [--repeat N] [--output results.json]
+
+The JSON path is what the snapshot did before the binary format: json.dump(transactions, indent=4)
+to write, json.load to read. Every archive layout (ndjson, csv) is measured plain, with gzip, and with
+zstd when the zstandard package is installed. Reading an archive goes through archive.read_archive,
+one row at a time. Times are the fastest of --repeat runs; the peak traced memory (tracemalloc) of
+each write and read is measured in a separate run, so it does not slow down the timed ones.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+from bench_snapshot import generate_transactions
+
+ARCHIVE_NAMES = ['transactions.ndjson', 'transactions.ndjson.gz', 'transactions.ndjson.zst',
+                 'transactions.csv', 'transactions.csv.gz', 'transactions.csv.zst']
+
+
+def write_json(filename, transactions):
+    with open(filename, 'w') as file:
+        json.dump(transactions, file, indent=4)
+
+
+def read_json(filename):
+    with open(filename) as file:
+        return sum(len(rows) for rows in json.load(file).values())
+
+
+def write_archive(filename, transactions):
+    archive.export_archive(filename, archive.transaction_rows(transactions))
+
+
+def read_archive(filename):
+    return sum(1 for _ in archive.read_archive(filename))
+
+
+def fastest(repeat, function, *args):
+    """Get the fastest of repeat runs of function(*args) in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def peak_memory(function, *args):
+    """Get the peak memory traced while running function(*args), in KiB."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def zstd_available():
+    try:
+        archive.load_zstandard()
+    except ValueError:
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file as well")
+    args = parser.parse_args()
+
+    transactions = generate_transactions(args.rows)
+    cases = [('json', 'transactions.json', write_json, read_json)]
+    cases += [(name[len('transactions.'):], name, write_archive, read_archive) for name in ARCHIVE_NAMES
+              if zstd_available() or not name.endswith('.zst')]
+
+    results = {'rows': args.rows, 'python': sys.version.split()[0], 'formats': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, name, write, read in cases:
+            filename = os.path.join(directory, name)
+            write_seconds = fastest(args.repeat, write, filename, transactions)
+            read_seconds = fastest(args.repeat, read, filename)
+            rows = read(filename)
+            if rows != args.rows:
+                print(f"FAIL: {label} read back {rows} rows, expected {args.rows}")
+                return 1
+            results['formats'][label] = {
+                'file_bytes': os.path.getsize(filename),
+                'write_seconds': round(write_seconds, 3),
+                'read_seconds': round(read_seconds, 3),
+                'write_rows_per_sec': round(args.rows / write_seconds),
+                'read_rows_per_sec': round(args.rows / read_seconds),
+                'write_peak_kib': peak_memory(write, filename, transactions),
+                'read_peak_kib': peak_memory(read, filename),
+            }
+            os.remove(filename)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Time the exact int64 group totals and the grouping step of aggregation on large column stores.
+
+Usage: python benchmarks/bench_group_sums.py [--rows 10000000] [--groups 50] [--repeat 3] [--output results.json]
+
+Totals (column_store.group_sums), for --rows int64 amounts in --groups groups:
+- add_at:            np.add.at, used on NumPy 1.25 and later
+- bincount:          one float64 np.bincount, used on older NumPy while no total can pass 2 ** 53
+- bincount_split:    three bincounts over 21 bit pieces, used on older NumPy for larger amounts
+Summary (aggregation.aggregate(store, group_by, ('sum', 'count'))) grouped by category and by month:
+- unique:            the rows numbered by np.unique, which sorts every row
+- bincount:          the rows numbered by aggregation.group_rows, one count over the key range
+Every method must give the same result. Times are the fastest of --repeat runs.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aggregation
+import column_store
+from column_store import ColumnStore, group_sums, load_numpy
+
+
+def fastest(repeat, function, *args):
+    """Get the fastest of repeat runs of function(*args) in seconds, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def sums_with(use_add_at, keys, amounts, length):
+    """Run group_sums with the np.add.at or the bincount method."""
+    fast_add_at = column_store.fast_add_at
+    column_store.fast_add_at = lambda: use_add_at
+    try:
+        return group_sums(keys, amounts, length)
+    finally:
+        column_store.fast_add_at = fast_add_at
+
+
+def unique_rows(np, keys):
+    """The np.unique grouping aggregation.group_rows replaced."""
+    groups, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    return groups, inverse, np.bincount(inverse, minlength=len(groups))
+
+
+def summary_with(group_rows, store, group_by):
+    """Run aggregation.aggregate with another grouping function."""
+    original = aggregation.group_rows
+    aggregation.group_rows = group_rows
+    try:
+        return aggregation.aggregate(store, group_by, ('sum', 'count'))
+    finally:
+        aggregation.group_rows = original
+
+
+def make_store(np, generator, rows, groups):
+    """Build a column store of random rows straight from NumPy columns (days in 2000-2029)."""
+    store = ColumnStore()
+    store.amounts = array('q', generator.integers(-10 ** 7, 10 ** 7, rows, dtype=np.int64).tobytes())
+    store.days = array('i', generator.integers(10957, 21915, rows, dtype=np.int32).tobytes())
+    store.category_ids = array('H', generator.integers(0, groups, rows, dtype=np.uint16).tobytes())
+    store.categories = [f"Category {code}" for code in range(groups)]
+    store.category_codes = {category: code for code, category in enumerate(store.categories)}
+    store.stale = False
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--groups', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file as well")
+    args = parser.parse_args()
+
+    np = load_numpy()
+    if np is None:
+        print("This benchmark needs NumPy.")
+        return 1
+
+    generator = np.random.default_rng(2024)
+    keys = generator.integers(0, args.groups, args.rows).astype(np.uint16)
+    results = {'rows': args.rows, 'groups': args.groups, 'numpy': np.__version__,
+               'add_at_used': column_store.fast_add_at(), 'totals': {}, 'summary': {}}
+
+    #-----------------------------------------------------------------------------------------------Totals: amounts up to 1e7 take the single bincount, up to 1e15 the split one
+    small = generator.integers(-10 ** 7, 10 ** 7, args.rows, dtype=np.int64)
+    large = generator.integers(-10 ** 15, 10 ** 15, args.rows, dtype=np.int64)
+    for label, use_add_at, amounts in (('add_at', True, small), ('bincount', False, small), ('bincount_split', False, large)):
+        seconds, sums = fastest(args.repeat, sums_with, use_add_at, keys, amounts, args.groups)
+        expected = sums_with(True, keys, amounts, args.groups)
+        if not np.array_equal(sums, expected):
+            print(f"FAIL: {label} totals differ from np.add.at")
+            return 1
+        results['totals'][label] = round(seconds, 3)
+
+    #-----------------------------------------------------------------------------------------------Summary: grouping by np.unique against group_rows
+    store = make_store(np, generator, args.rows, args.groups)
+    for group_by in ('category', 'month'):
+        unique_seconds, expected = fastest(args.repeat, summary_with, unique_rows, store, group_by)
+        bincount_seconds, summary = fastest(args.repeat, summary_with, aggregation.group_rows, store, group_by)
+        if summary != expected:
+            print(f"FAIL: the {group_by} summary differs between np.unique and group_rows")
+            return 1
+        results['summary'][group_by] = {
+            'unique_seconds': round(unique_seconds, 3),
+            'bincount_seconds': round(bincount_seconds, 3),
+            'speedup': round(unique_seconds / bincount_seconds, 1),
+        }
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
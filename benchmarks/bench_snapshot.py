@@ -0,0 +1,106 @@
+"""Compare start-up time and peak memory of the JSON and binary snapshot formats.
+
+Usage: python benchmarks/bench_snapshot.py [--rows N] [--repeat N] [--output results.json]
+
+Each load runs in a fresh Python process, so the numbers include interpreter start-up and show
+the peak resident memory of a process that only loads the snapshot. On Linux the peak is read from
+VmHWM, because ru_maxrss keeps the high-water mark of the parent across exec.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from binary_snapshot import write_snapshot
+
+CATEGORIES = ['Salary', 'Rent', 'Groceries', 'Transport', 'Loan', 'Clothing', 'Credit Card Payment',
+              'Home Repairs', 'Medical', 'Internet Bill', 'Electricity bill', 'Subscriptions', 'Travel', 'Insurance']
+
+#---------------------------------------------------------------------------------------------------Code run in the child process for each format
+LOADERS = {
+    'json': "import json\nwith open(FILENAME) as file:\n    transactions = json.load(file)",
+    'binary': "from binary_snapshot import MappedSnapshot\ntransactions = {}\nsnapshot = MappedSnapshot(FILENAME)\nsnapshot.load_into(transactions)\nsnapshot.close()",
+    'binary_open': "from binary_snapshot import MappedSnapshot\nsnapshot = MappedSnapshot(FILENAME)\nfirst = snapshot[0] if len(snapshot) else None\nsnapshot.close()",
+}
+
+CHILD = """
+import resource, sys, time
+sys.path.insert(0, {root!r})
+FILENAME = {filename!r}
+start = time.perf_counter()
+{loader}
+seconds = time.perf_counter() - start
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as status:
+        max_rss = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    pass
+print(seconds, max_rss)
+"""
+
+
+def generate_transactions(rows, seed=1):
+    """Build a transactions dictionary with random rows."""
+    generator = random.Random(seed)
+    transactions = {category: [] for category in CATEGORIES}
+    for _ in range(rows):
+        transactions[generator.choice(CATEGORIES)].append({
+            'amount': float(generator.randint(100, 100000)),
+            'date': f"20{generator.randint(15, 24)}-{generator.randint(1, 12):02d}-{generator.randint(1, 28):02d}"})
+    return transactions
+
+
+def run_child(format_name, filename):
+    """Load a snapshot in a fresh process and return (load seconds, total seconds, peak RSS in KiB)."""
+    code = CHILD.format(root=ROOT, filename=filename, loader=LOADERS[format_name])
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    seconds, max_rss = output.split()
+    return float(seconds), total, int(max_rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Write the results to this JSON file as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        transactions = generate_transactions(args.rows)
+        files = {'json': os.path.join(directory, 'transactions.json'),
+                 'binary': os.path.join(directory, 'transactions.bin')}
+        with open(files['json'], 'w') as file:
+            json.dump(transactions, file, indent=4)
+        write_snapshot(files['binary'], transactions)
+        del transactions
+
+        results = {'rows': args.rows, 'python': sys.version.split()[0], 'formats': {}}
+        for format_name in LOADERS:
+            filename = files['json' if format_name == 'json' else 'binary']
+            runs = [run_child(format_name, filename) for _ in range(args.repeat)]
+            results['formats'][format_name] = {
+                'file_bytes': os.path.getsize(filename),
+                'load_seconds': min(run[0] for run in runs),
+                'process_seconds': min(run[1] for run in runs),
+                'max_rss_kib': min(run[2] for run in runs),
+            }
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Check that the command line front ends start without importing the GUI.
+
+Usage: python benchmarks/check_import_time.py [--max-ms N]
+
+Each module is imported in a fresh interpreter with '-X importtime'. The check fails (exit code 1)
+if tkinter or sample_code_1 shows up in the import log, or if the import takes longer than --max-ms.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#---------------------------------------------------------------------------------------------------Modules that must start without the GUI
+CLI_MODULES = ('w2082753', 'batch_cli')
+
+#---------------------------------------------------------------------------------------------------Modules that only the GUI may import
+GUI_MODULES = ('tkinter', '_tkinter', 'sample_code_1')
+
+
+def import_log(module):
+    """Import a module in a fresh interpreter.
+    Returns:
+    - {imported module name: cumulative import time in microseconds}."""
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-ms', type=float, help="Also fail if a module takes longer than this to import")
+    args = parser.parse_args()
+
+    failures = []
+    for module in CLI_MODULES:
+        times = import_log(module)
+        milliseconds = times.get(module, 0) / 1000
+        gui_imports = [name for name in GUI_MODULES if name in times]
+        print(f"{module}: {milliseconds:.1f} ms, {len(times)} modules")
+
+        if gui_imports:
+            failures.append(f"{module} imports {', '.join(gui_imports)} at startup")
+        if args.max_ms is not None and milliseconds > args.max_ms:
+            failures.append(f"{module} takes {milliseconds:.1f} ms to import (limit {args.max_ms} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
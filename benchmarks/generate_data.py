@@ -0,0 +1,82 @@
+"""Write synthetic bulk files in the bulky.txt layout ('expense type, amount, date' per line).
+
+Usage: python benchmarks/generate_data.py ROWS OUTPUT [--seed N] [--start-year YYYY] [--years N]
+
+Files are written in chunks, so even 10^8 rows only need a few megabytes of memory.
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+#---------------------------------------------------------------------------------------------------Categories and amount ranges, weighted roughly like a household budget
+CATEGORIES = [
+    ('Salary', 50000, 150000, 1),
+    ('Rent', 4000, 8000, 1),
+    ('Groceries', 200, 6000, 20),
+    ('Transport', 50, 1500, 15),
+    ('Loan', 5000, 20000, 1),
+    ('Clothing', 500, 10000, 3),
+    ('Credit Card Payment', 1000, 30000, 2),
+    ('Home Repairs', 500, 25000, 1),
+    ('Medical', 300, 15000, 2),
+    ('Internet Bill', 1500, 4000, 1),
+    ('Electricity bill', 1000, 6000, 1),
+    ('Dining', 300, 5000, 8),
+    ('Entertainment', 200, 4000, 4),
+    ('Insurance', 2000, 12000, 1),
+]
+
+#---------------------------------------------------------------------------------------------------Number of lines generated and written at a time
+CHUNK_ROWS = 100000
+
+
+def generate_lines(rows, seed=1, start_year=2015, years=10):
+    """Yield bulk file lines in date order.
+    Args:
+    - rows: Number of lines to generate.
+    - seed: Random seed, so the same arguments always give the same file.
+    - start_year: First year of the generated dates.
+    - years: Number of years the dates are spread over.
+    Returns:
+    - A generator of lines ending in a newline."""
+
+    generator = random.Random(seed)
+    names = [name for name, low, high, weight in CATEGORIES]
+    ranges = {name: (low, high) for name, low, high, weight in CATEGORIES}
+    weights = [weight for name, low, high, weight in CATEGORIES]
+
+    first_day = date(start_year, 1, 1)
+    day_count = (date(start_year + years, 1, 1) - first_day).days
+    dates = [(first_day + timedelta(days=offset)).isoformat() for offset in range(day_count)]
+
+    for row in range(rows):
+        name = generator.choices(names, weights)[0]
+        low, high = ranges[name]
+        amount = generator.randint(low, high)
+        yield f"{name}, {amount}, {dates[row * day_count // rows]}\n"
+
+
+def write_bulk_file(filename, rows, seed=1, start_year=2015, years=10):
+    """Write a bulk file with the given number of rows."""
+    lines = generate_lines(rows, seed, start_year, years)
+    with open(filename, 'w') as file:
+        while True:
+            chunk = [line for _, line in zip(range(CHUNK_ROWS), lines)]
+            if not chunk:
+                break
+            file.writelines(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--start-year', type=int, default=2015)
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+    write_bulk_file(args.output, args.rows, args.seed, args.start_year, args.years)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Time the main tracker operations on synthetic data and print the results as JSON.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 1000,10000,100000] [--repeat 3] [--storage transactions.json] [--output results.json]
+
+For every size a bulk file is generated in a temporary folder, then the suite times:
+- import:          w2082753.read_bulk_transactions_from_file
+- save:            w2082753.save_transactions (commit of the imported rows)
+- save_full:       rewriting the whole storage (journal compaction / SQLite rewrite)
+- load:            w2082753.load_transactions
+- summary:         w2082753.display_summary
+- cli_search_*:    w2082753.search_transactions by category, amount range and date range
+- index_build:     building the search index from scratch
+- gui_search:      the index search used by FinanceTrackerGUI.search_transactions
+- gui_display:     FinanceTrackerGUI.prepare_table snapshot and display_transactions of the full table
+- gui_sort_*:      FinanceTrackerGUI.sort_rows on each column, then showing the sorted page
+
+GUI timings need a display. Without one the suite starts Xvfb if it is installed, otherwise the
+GUI timings are reported as skipped. Read-only operations are run --repeat times and the fastest
+run is kept. Save the output of two commits and compare them to spot regressions.
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ledger
+import w2082753
+from column_store import load_numpy
+from generate_data import write_bulk_file
+
+DEFAULT_SIZES = '1000,10000,100000'
+
+
+def timed(function, *args):
+    """Run function(*args) with its printed output discarded.
+    Returns:
+    - The time it took in seconds."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        function(*args)
+        return time.perf_counter() - start
+
+
+def fastest(repeat, function, *args):
+    """Get the fastest of repeat runs of function(*args) in seconds."""
+    return min(timed(function, *args) for _ in range(repeat))
+
+
+def with_input(answers, function):
+    """Wrap a prompting CLI function so its input() calls get the given answers."""
+    def run():
+        replies = iter(answers)
+        original_input = builtins.input
+        builtins.input = lambda prompt='': next(replies)
+        try:
+            function()
+        finally:
+            builtins.input = original_input
+    return run
+
+
+def git_commit():
+    """Get the commit the benchmarks are run on, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_display():
+    """Make sure Tk can open a window: use $DISPLAY, or start Xvfb if it is installed.
+    Returns:
+    - The Xvfb process to stop afterwards, or None."""
+
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        return None
+    if shutil.which('Xvfb') is None:
+        return None
+
+    display = ':%d' % (90 + os.getpid() % 100)
+    process = subprocess.Popen(['Xvfb', display, '-nolisten', 'tcp'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(0.5) #---------------------------------------------------------------------------------Give the server a moment to accept connections
+    return process
+
+
+def bench_gui(results, repeat):
+    """Time the GUI table operations on the loaded transactions (skipped without a display)."""
+    try:
+        import tkinter as tk
+        import sample_code_1
+        root = tk.Tk()
+    except Exception as e: #---------------------------------------------------------------------------No tkinter or no display
+        results['gui'] = f"skipped: {e}"
+        return
+
+    root.withdraw()
+    try:
+        app = sample_code_1.FinanceTrackerGUI(root, ledger.transactions)
+        results['gui_display'] = fastest(repeat, lambda: app.display_transactions(app.prepare_table(None)[1]))
+
+        for col, column in enumerate(('category', 'date', 'amount')):
+            def sort_and_show():
+                order = app.sort_rows(app.table_rows, column, False)
+                app.show_sorted(col, False, order)
+                root.update_idletasks()
+            results[f'gui_sort_{column}'] = fastest(repeat, sort_and_show)
+    finally:
+        root.destroy()
+
+
+def bench_size(rows, directory, storage, repeat, gui):
+    """Run every benchmark on a fresh store with the given number of rows."""
+    bulk_filename = os.path.join(directory, f'bulk_{rows}.txt')
+    write_bulk_file(bulk_filename, rows)
+
+    ledger.STORAGE_FILENAME = os.path.join(directory, storage)
+    timed(w2082753.load_transactions) #------------------------------------------------------------Start from empty storage
+
+    results = {'rows': rows, 'bulk_file_bytes': os.path.getsize(bulk_filename)}
+    results['import'] = timed(w2082753.read_bulk_transactions_from_file, bulk_filename)
+    results['import_rows_per_sec'] = rows / results['import']
+    results['save'] = timed(w2082753.save_transactions)
+    results['save_full'] = timed(ledger.storage.write_all, ledger.transactions)
+    results['load'] = fastest(repeat, w2082753.load_transactions)
+    results['summary'] = fastest(repeat, w2082753.display_summary)
+
+    results['cli_search_category'] = fastest(repeat, with_input(['c', 'groc'], w2082753.search_transactions))
+    results['cli_search_amount'] = fastest(repeat, with_input(['a', '1000', '1100'], w2082753.search_transactions))
+    results['cli_search_date'] = fastest(repeat, with_input(['d', '2020-01-01', '2020-01-31'], w2082753.search_transactions))
+
+    def build_index():
+        ledger.search_index.reset(ledger.transactions)
+        ledger.search_index.ensure_built()
+    results['index_build'] = fastest(repeat, build_index)
+    results['gui_search'] = fastest(repeat, ledger.search_index.search, 'Groceries')
+
+    if gui:
+        bench_gui(results, repeat)
+
+    ledger.close()
+    ledger.storage = None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma separated row counts (up to 10^8)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--storage', default='transactions.json', help="Storage file name; use a .db name for SQLite")
+    parser.add_argument('--no-gui', action='store_true', help="Skip the GUI timings")
+    parser.add_argument('--output', help="Write the results to this JSON file as well")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': load_numpy() is not None,
+        'storage': args.storage,
+        'sizes': [],
+    }
+
+    xvfb = None if args.no_gui else start_display()
+    working_directory = os.getcwd()
+    try:
+        for rows in (int(size) for size in args.sizes.split(',')):
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory) #-----------------------------------------------------------------Keep the default file names (rejects, migration) inside the temporary folder
+                try:
+                    results['sizes'].append(bench_size(rows, directory, args.storage, args.repeat, not args.no_gui))
+                finally:
+                    os.chdir(working_directory)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
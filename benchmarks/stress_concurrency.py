@@ -0,0 +1,177 @@
+"""Stress test several processes changing the same storage at once.
+
+Usage: python benchmarks/stress_concurrency.py [--processes 4] [--changes 200] [--pause-ms 2] [--storage transactions.json] [--keep]
+
+Every worker process loads the storage in a temporary folder and makes --changes changes, saving after
+each one like the CLI does:
+- adds a row to its own category and sometimes updates one of its rows by index
+- adds a row to a 'shared' category that every worker writes to
+- deletes the first row of 'shared' by index, which can conflict with the other workers (retried)
+Dates go back and forth between years, so a process that loads partitioned storage (rows in month
+order) holds the rows of a category in another order than the process that added them.
+- picks up the other workers' saves through ledger.refresh between changes
+- starts over like a new instance (close and load) every RESTART_EVERY changes
+- waits up to --pause-ms between changes, so the workers take turns like people do
+
+At the end every worker catches up once more. The check fails (exit code 1) if a fresh load does not
+have exactly the rows the workers report, if the running totals do not match, or if any worker's
+in-memory view differs from the stored transactions, or if 'shared' does not hold exactly the rows
+added minus the rows deleted (compared by value). The statistics are printed as JSON.
+"""
+import argparse
+import json
+from collections import Counter
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#---------------------------------------------------------------------------------------------------Share of the changes that go to the shared category, and how often a worker deletes from it
+SHARED_EVERY = 3
+DELETE_EVERY = 7
+UPDATE_EVERY = 11
+RESTART_EVERY = 50
+
+
+def out_of_order_date(change, number=0):
+    """Get a date that jumps between years, so month order differs from the order rows were added in."""
+    return f"{2022 + (change * 7 + number) % 3}-{1 + change % 12:02d}-{1 + (change + number) % 28:02d}"
+
+
+def view_of(transactions, partitioned):
+    """Get a comparable copy of a transactions dictionary. Partitioned storage loads every category
+    in month order, so rows of the shared category (added with any date) are compared sorted."""
+    view = {category: [[transaction['amount'], transaction['date']] for transaction in rows] for category, rows in transactions.items()}
+    if partitioned:
+        view = {category: sorted(rows) for category, rows in sorted(view.items())}
+    return view
+
+
+def worker(number, folder, storage, changes, pause, barrier, results):
+    """Make changes to the shared storage from one process and report what it did."""
+    sys.path.insert(0, ROOT)
+    os.chdir(folder)
+    import ledger
+    from concurrency import ConflictError
+
+    stats = {'worker': number, 'changes': 0, 'shared_added': [], 'shared_deleted': [], 'conflicts': 0, 'refreshes': 0}
+    category = f"worker-{number}"
+    ledger.load(storage)
+    barrier.wait()
+
+    for change in range(changes):
+        time.sleep(random.random() * pause)
+        if change % RESTART_EVERY == RESTART_EVERY - 1:
+            ledger.close()
+            ledger.load(storage)
+        elif ledger.refresh():
+            stats['refreshes'] += 1
+
+        ledger.add_row(category, (change + 1) / 100, out_of_order_date(change))
+        if change % UPDATE_EVERY == UPDATE_EVERY - 1:
+            ledger.update_row(category, change // 2, -(change // 2 + 1) / 100, ledger.transactions[category][change // 2]['date'])
+        ledger.save()
+
+        if change % SHARED_EVERY == 0:
+            row = [float(number), out_of_order_date(change, number)]
+            ledger.add_row('shared', *row)
+            ledger.save()
+            stats['shared_added'].append(row)
+
+        if change % DELETE_EVERY == DELETE_EVERY - 1:
+            while ledger.transactions.get('shared'):
+                try:
+                    first = ledger.transactions['shared'][0]
+                    ledger.delete_row('shared', 0)
+                    ledger.save()
+                    stats['shared_deleted'].append([first['amount'], first['date']])
+                    break
+                except ConflictError: #-------------------------------------------------------------Someone else changed 'shared' first: try again on the latest rows
+                    stats['conflicts'] += 1
+        stats['changes'] += 1
+
+    barrier.wait() #----------------------------------------------------------------------------------Every worker has saved everything
+    ledger.refresh()
+    stats['view'] = view_of(ledger.transactions, storage.endswith('.parts'))
+    stats['totals_mismatches'] = len(ledger.totals.check(ledger.transactions))
+    barrier.wait()
+    ledger.close()
+    results.put(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--changes', type=int, default=200, help="Changes made by every process")
+    parser.add_argument('--pause-ms', type=float, default=2, help="Longest wait between two changes of a process")
+    parser.add_argument('--storage', default='transactions.json', help="Storage file name (.json, .db or .parts)")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary folder")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='tracker-stress-')
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.processes)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(number, folder, args.storage, args.changes, args.pause_ms / 1000, barrier, results))
+                 for number in range(args.processes)]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    seconds = time.perf_counter() - start
+
+    #-----------------------------------------------------------------------------------------------Check a fresh load against what the workers did
+    sys.path.insert(0, ROOT)
+    os.chdir(folder)
+    import ledger
+    ledger.load(args.storage)
+    partitioned = args.storage.endswith('.parts')
+    stored = view_of(ledger.transactions, partitioned)
+
+    failures = []
+    for report in reports:
+        rows = ledger.transactions.get(f"worker-{report['worker']}", [])
+        if len(rows) != args.changes:
+            failures.append(f"worker-{report['worker']} has {len(rows)} rows, expected {args.changes}")
+        if report['view'] != stored:
+            failures.append(f"worker {report['worker']} ended with a different view of the transactions")
+        if report['totals_mismatches']:
+            failures.append(f"worker {report['worker']} has {report['totals_mismatches']} running totals that do not match")
+    expected_shared = Counter()
+    for report in reports:
+        expected_shared.update(tuple(row) for row in report['shared_added'])
+        expected_shared.subtract(tuple(row) for row in report['shared_deleted'])
+    stored_shared = Counter((transaction['amount'], transaction['date']) for transaction in ledger.transactions.get('shared', []))
+    if stored_shared != +expected_shared:
+        failures.append(f"'shared' has {sum(stored_shared.values())} rows, expected {sum((+expected_shared).values())}"
+                        f" ({len(stored_shared - expected_shared)} unexpected, {len(+expected_shared - stored_shared)} missing)")
+    if ledger.totals.check(ledger.transactions):
+        failures.append("running totals of the fresh load do not match")
+    ledger.close()
+
+    changes = sum(report['changes'] for report in reports)
+    print(json.dumps({'storage': args.storage, 'processes': args.processes, 'changes': changes, 'seconds': round(seconds, 2),
+                      'changes_per_sec': round(changes / seconds, 1),
+                      'conflicts': sum(report['conflicts'] for report in reports),
+                      'refreshes': sum(report['refreshes'] for report in reports)}, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    os.chdir(ROOT)
+    if args.keep:
+        print(f"Files kept in {folder}")
+    else:
+        shutil.rmtree(folder, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
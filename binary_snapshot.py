@@ -0,0 +1,177 @@
+import mmap
+import os
+import struct
+import time
+
+from column_store import load_numpy
+from dates import INVALID_DAY, date_to_day, day_to_date
+from money import CURRENCY_DIGITS, to_minor
+
+#---------------------------------------------------------------------------------------------------File layout (all numbers little endian)
+#Header:        magic, format version, snapshot id, category count, row count, raw date count,
+#               offset of the category table, offset of the records, offset of the raw date table,
+#               currency digits of the amounts
+#Categories:    for each category: uint32 byte length + UTF-8 name
+#Records:       for each transaction: uint32 category id, int32 day number, int64 amount in minor units (16 bytes)
+#Raw dates:     for each date that is not YYYY-MM-DD: uint64 row number, uint32 byte length + UTF-8 text
+MAGIC = b'FTSNAP\x00\x01'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<8sIQIQQQQQI')
+RECORD = struct.Struct('<Iiq')
+LENGTH = struct.Struct('<I')
+RAW_DATE = struct.Struct('<QI')
+
+#---------------------------------------------------------------------------------------------------Version 1 files (float64 amounts, no currency digits) can still be read
+PREFIX = struct.Struct('<8sI')
+HEADER_V1 = struct.Struct('<8sIQIQQQQQ')
+RECORD_V1 = struct.Struct('<Iid')
+
+
+def write_snapshot(filename, transactions):
+    """Write the transactions dictionary as a binary snapshot, replacing the file atomically.
+    Returns:
+    - The id of the new snapshot."""
+
+    snapshot_id = time.time_ns()
+    categories = list(transactions)
+    temp_filename = filename + '.tmp'
+
+    with open(temp_filename, 'wb') as file:
+        file.write(b'\0' * HEADER.size) #------------------------------------------------------------The header is written last, once the offsets are known
+
+        categories_offset = file.tell()
+        for category in categories:
+            name = category.encode('utf-8')
+            file.write(LENGTH.pack(len(name)))
+            file.write(name)
+
+        records_offset = file.tell()
+        day_cache = {}
+        minor_cache = {}
+        raw_dates = []
+        row = 0
+        for category_id, category in enumerate(categories):
+            records = bytearray()
+            for transaction in transactions[category]:
+                date_str = transaction['date']
+                day = day_cache.get(date_str)
+                if day is None:
+                    try:
+                        day = date_to_day(date_str)
+                    except (TypeError, ValueError):
+                        day = INVALID_DAY
+                    day_cache[date_str] = day
+                if day == INVALID_DAY:
+                    raw_dates.append((row, str(date_str)))
+                units = minor_cache.get(transaction['amount'])
+                if units is None:
+                    units = minor_cache[transaction['amount']] = to_minor(transaction['amount'])
+                records += RECORD.pack(category_id, day, units)
+                row += 1
+            file.write(records)
+
+        raw_dates_offset = file.tell()
+        for raw_row, date_str in raw_dates:
+            text = date_str.encode('utf-8')
+            file.write(RAW_DATE.pack(raw_row, len(text)))
+            file.write(text)
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, snapshot_id, len(categories), row, len(raw_dates),
+                               categories_offset, records_offset, raw_dates_offset, CURRENCY_DIGITS))
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_filename, filename)
+    return snapshot_id
+
+
+class MappedSnapshot:
+    """Read-only view of a binary snapshot through mmap.
+
+    Opening a snapshot only reads the header and the category table. Records are decoded straight
+    from the mapped file when they are used, so the operating system pages them in lazily.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = PREFIX.unpack_from(self.map, 0) if len(self.map) >= PREFIX.size else (None, None)
+        if magic != MAGIC or version not in (1, FORMAT_VERSION):
+            self.close()
+            raise ValueError(f"'{filename}' is not a transactions snapshot.")
+
+        if version == 1:
+            (magic, version, self.snapshot_id, category_count, self.row_count, raw_date_count,
+             categories_offset, self.records_offset, raw_dates_offset) = HEADER_V1.unpack_from(self.map, 0)
+            self.record = RECORD_V1
+            self.scale = 1 #----------------------------------------------------------------------------Amounts are already in currency units
+        else:
+            (magic, version, self.snapshot_id, category_count, self.row_count, raw_date_count,
+             categories_offset, self.records_offset, raw_dates_offset, digits) = HEADER.unpack_from(self.map, 0)
+            self.record = RECORD
+            self.scale = 10 ** digits #--------------------------------------------------------------Minor units of the currency digits the file was written with
+
+        self.categories = []
+        position = categories_offset
+        for _ in range(category_count):
+            (length,) = LENGTH.unpack_from(self.map, position)
+            position += LENGTH.size
+            self.categories.append(self.map[position:position + length].decode('utf-8'))
+            position += length
+
+        self.raw_dates = {} #-------------------------------------------------------------------------Row number -> date text for invalid dates
+        position = raw_dates_offset
+        for _ in range(raw_date_count):
+            row, length = RAW_DATE.unpack_from(self.map, position)
+            position += RAW_DATE.size
+            self.raw_dates[row] = self.map[position:position + length].decode('utf-8')
+            position += length
+
+    def __len__(self):
+        return self.row_count
+
+    def __getitem__(self, row):
+        """Get row number row as a (category, date, amount) tuple."""
+        if not 0 <= row < self.row_count:
+            raise IndexError(row)
+        category_id, day, amount = self.record.unpack_from(self.map, self.records_offset + row * self.record.size)
+        date_str = self.raw_dates[row] if day == INVALID_DAY else day_to_date(day)
+        return self.categories[category_id], date_str, amount / self.scale
+
+    def records(self):
+        """Get the packed records without copying them.
+        Returns a NumPy structured array over the mapped file when NumPy is installed,
+        otherwise an iterator of (category_id, day, amount) tuples. Amounts are int64 minor units
+        (divide by self.scale for currency units), or float64 currency units in version 1 files."""
+
+        view = memoryview(self.map)[self.records_offset:self.records_offset + self.row_count * self.record.size]
+        np = load_numpy()
+        if np is not None:
+            amount_type = '<f8' if self.record is RECORD_V1 else '<i8'
+            return np.frombuffer(view, dtype=np.dtype([('category_id', '<u4'), ('day', '<i4'), ('amount', amount_type)]))
+        return self.record.iter_unpack(view)
+
+    def load_into(self, transactions):
+        """Add every row of the snapshot to a transactions dictionary."""
+        lists = [transactions.setdefault(category, []) for category in self.categories]
+        dates = {}
+        view = memoryview(self.map)[self.records_offset:self.records_offset + self.row_count * self.record.size]
+        scale = self.scale
+
+        for row, (category_id, day, amount) in enumerate(self.record.iter_unpack(view)):
+            if day == INVALID_DAY:
+                date_str = self.raw_dates[row]
+            else:
+                date_str = dates.get(day)
+                if date_str is None:
+                    date_str = dates[day] = day_to_date(day)
+            lists[category_id].append({'amount': amount / scale, 'date': date_str})
+
+        view.release()
+
+    def close(self):
+        """Unmap and close the file."""
+        self.map.close()
+        self.file.close()
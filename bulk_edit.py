@@ -0,0 +1,146 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import ledger
+from dates import date_sort_key, day_range
+from money import from_minor, parse_minor, to_minor
+
+#---------------------------------------------------------------------------------------------------What a bulk edit does with the matching transactions
+#delete: remove them, set: amount = value, add: amount += value, multiply: amount *= value (e.g. -1 to flip the sign),
+#move: reassign them to the category value (a whole matching category is merged into it)
+BULK_ACTIONS = ('delete', 'set', 'add', 'multiply', 'move')
+
+
+def find_matches(category=None, min_amount=None, max_amount=None, start_date=None, end_date=None):
+    """Find the transactions matching every given filter in one pass over the candidate categories.
+    Args:
+    - category: Exact category name (None for every category).
+    - min_amount, max_amount: Amount range in currency units, inclusive (None for no limit).
+    - start_date, end_date: Date range 'YYYY-MM-DD', inclusive (None for no limit).
+    Returns:
+    - {category: [index, ...]} with ascending indexes, for the categories that have matches."""
+
+    if category is None:
+        categories = list(ledger.transactions)
+    else:
+        categories = [category] if category in ledger.transactions else []
+
+    dated = start_date is not None or end_date is not None
+    first_day, last_day = day_range(start_date, end_date) #-------------------------------------------Compare dates as day numbers
+    low = None if min_amount is None else to_minor(min_amount) #----------------------------------------Compare exactly in minor units
+    high = None if max_amount is None else to_minor(max_amount)
+    minor_cache = {}
+
+    found = {}
+    for name in categories:
+        indexes = []
+        for index, transaction in enumerate(ledger.transactions[name]):
+            if dated and not first_day <= date_sort_key(transaction['date']) <= last_day:
+                continue
+            if low is not None or high is not None:
+                units = minor_cache.get(transaction['amount'])
+                if units is None:
+                    units = minor_cache[transaction['amount']] = to_minor(transaction['amount'])
+                if (low is not None and units < low) or (high is not None and units > high):
+                    continue
+            indexes.append(index)
+        if indexes:
+            found[name] = indexes
+    return found
+
+
+def amount_function(action, value):
+    """Get the function that changes an amount in minor units for the 'set', 'add' and 'multiply' actions.
+    Raises ValueError if value is not a number."""
+
+    if action == 'multiply':
+        try:
+            factor = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"could not convert string to factor: {value!r}") from None
+        if not factor.is_finite():
+            raise ValueError(f"factor must be a finite number: {value!r}")
+        return lambda units: int((units * factor).quantize(Decimal(1), rounding=ROUND_HALF_UP)) #-----Half away from zero, like money.parse_minor
+
+    units_value = parse_minor(value) if isinstance(value, str) else to_minor(value)
+    if action == 'set':
+        return lambda units: units_value
+    return lambda units: units + units_value
+
+
+def bulk_edit(action, value=None, category=None, min_amount=None, max_amount=None, start_date=None, end_date=None, dry_run=False):
+    """Apply one action to every transaction matching the filters and save once, holding the storage lock.
+    Each category with matches becomes one change record, so the ledger, its indexes and the storage
+    see one bulk change per category instead of one change per transaction.
+    Args:
+    - action: One of BULK_ACTIONS.
+    - value: The amount for 'set' and 'add', the factor for 'multiply', the target category for 'move'.
+    - category, min_amount, max_amount, start_date, end_date: The filters (see find_matches).
+    - dry_run: Only count the transactions the action would change, without the write lock or a save.
+    Returns:
+    - The number of transactions changed (or that would be changed).
+    Raises ValueError for an unknown action or a missing or invalid value."""
+
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown bulk action: {action}")
+    if action == 'move' and not (value or '').strip():
+        raise ValueError("Moving transactions needs a target category.")
+    change = None
+    if action in ('set', 'add', 'multiply'):
+        if value is None:
+            raise ValueError(f"The '{action}' action needs a value.")
+        change = amount_function(action, value)
+
+    if dry_run: #-----------------------------------------------------------------------------------A preview only reads: pick up other processes' saves, but take no write lock and save nothing
+        ledger.refresh()
+        return edit_matches(find_matches(category, min_amount, max_amount, start_date, end_date), action, value, change, True)
+    with ledger.exclusive(): #------------------------------------------------------------------Other processes' saves are applied first, then one save at the end
+        return edit_matches(find_matches(category, min_amount, max_amount, start_date, end_date), action, value, change, False)
+
+
+def edit_matches(found, action, value, change, dry_run):
+    """Apply an action to the transactions found by find_matches, one change record per category.
+    Args:
+    - found: {category: [index, ...]} from find_matches.
+    - action, value: As for bulk_edit.
+    - change: The amount function for 'set', 'add' and 'multiply' (see amount_function), None otherwise.
+    - dry_run: Only count the transactions the action would change.
+    Returns:
+    - The number of transactions changed (or that would be changed)."""
+
+    changed = 0
+    for name, indexes in found.items():
+        category_transactions = ledger.transactions[name]
+
+        if action == 'delete':
+            changed += len(indexes)
+            if not dry_run:
+                if len(indexes) == len(category_transactions):
+                    ledger.delete_category(name)
+                else:
+                    ledger.delete_rows(name, indexes)
+
+        elif action == 'move':
+            new_category = value.strip()
+            if new_category == name:
+                continue
+            changed += len(indexes)
+            if not dry_run:
+                if len(indexes) == len(category_transactions): #-------------------------------------Every row moves: rename, or merge into an existing category
+                    ledger.rename_category(name, new_category)
+                else:
+                    ledger.move_rows(name, indexes, new_category)
+
+        else:
+            changed_indexes = []
+            rows = []
+            for index in indexes:
+                transaction = category_transactions[index]
+                units = to_minor(transaction['amount'])
+                new_units = change(units)
+                if new_units != units: #---------------------------------------------------------------Rows that already have the new amount are left alone
+                    changed_indexes.append(index)
+                    rows.append((from_minor(new_units), transaction['date']))
+            changed += len(changed_indexes)
+            if not dry_run:
+                ledger.update_rows(name, changed_indexes, rows)
+    return changed
@@ -0,0 +1,166 @@
+import time
+from itertools import islice
+
+import ledger
+from dates import valid_date
+from duplicate_index import write_duplicates
+from money import parse_amount
+
+#---------------------------------------------------------------------------------------------------Streaming bulk import settings
+BATCH_SIZE = 50000 #---------------------------------------------------------------------------------Number of lines parsed and committed together
+READ_BUFFER_SIZE = 1024 * 1024 #---------------------------------------------------------------------Size of the file read buffer in bytes
+
+
+def parse_bulk_line(line, amount_cache=None):
+    """Parse a single line of a bulk file.
+    Args:
+    - line: A line in the format 'expense type, amount, date'.
+    - amount_cache: Optional {amount text: amount} dictionary shared by the lines of a batch.
+    Returns:
+    - (expense_type, amount, date) tuple. The amount text is parsed straight to minor units (see money),
+      and the date is checked and shared with the other rows of the same date (see dates.valid_date).
+    Raises ValueError if the line is not in the expected format."""
+
+    parts = line.strip().split(',') #-------------------------------------------Split the line into parts based on commas
+
+    if len(parts) != 3: #-------------------------------------------------------Check if the line has exactly 3 parts
+        raise ValueError("expected expense type, amount and date separated by commas")
+
+    expense_type, amount, date = parts
+    expense_type = expense_type.strip()
+    date = valid_date(date.strip())
+
+    if not expense_type:
+        raise ValueError("missing expense type")
+
+    if amount_cache is None:
+        return expense_type, parse_amount(amount), date
+
+    value = amount_cache.get(amount) #------------------------------------------Bulk files repeat the same amounts many times
+    if value is None:
+        value = amount_cache[amount] = parse_amount(amount)
+    return expense_type, value, date
+
+
+def parse_bulk_batch(lines, first_line_number, parse_line=parse_bulk_line):
+    """Parse a batch of bulk file lines without touching the transactions dictionary.
+    Args:
+    - lines: The raw lines of the batch.
+    - first_line_number: The line number of the first line in the file (1 based).
+    - parse_line: The line parser, parse_bulk_line or one with the same arguments (e.g. archive.parse_ndjson_line).
+    Returns:
+    - (staged, rejects) where staged maps each expense type to a list of (amount, date) pairs
+      and rejects is a list of (line_number, line, reason) tuples."""
+
+    staged = {}
+    rejects = []
+    amount_cache = {}
+
+    for line_number, line in enumerate(lines, first_line_number):
+        if not line.strip(): #------------------------------------------------------Skip blank lines
+            continue
+
+        try:
+            expense_type, amount, date = parse_line(line, amount_cache)
+        except ValueError as e:
+            rejects.append((line_number, line.rstrip('\n'), str(e)))
+            continue
+
+        rows = staged.get(expense_type)
+        if rows is None:
+            rows = staged[expense_type] = []
+        rows.append((amount, date))
+
+    return staged, rejects
+
+
+def write_rejects(reject_file, rejects):
+    """Write rejected lines to the reject file."""
+    for line_number, line, reason in rejects:
+        reject_file.write(f"{line_number}: {reason}: {line}\n")
+
+
+def stream_bulk_transactions(filename, batch_size=BATCH_SIZE, reject_filename=None, duplicates='keep', near_days=None):
+    """Import a bulk file of any size into the shared transactions dictionary.
+
+    The file is read through a large buffer and parsed in batches of batch_size lines.
+    Each batch is parsed completely before it is committed, so a batch is either added
+    as a whole or not at all. Malformed lines are written to the reject file instead of
+    stopping the import, and only one batch is held in memory at a time.
+    Args:
+    - filename: The name of the bulk file.
+    - batch_size: The number of lines parsed per batch.
+    - reject_filename: Where to write malformed lines (defaults to '<filename>.rejects').
+    - duplicates: 'keep', 'skip' or 'flag' rows already stored (duplicates are listed in '<filename>.duplicates').
+    - near_days: Also treat rows with the same category and amount within this many days as duplicates.
+    Returns:
+    - A dictionary with the import statistics (rows, rejected, duplicates, near_duplicates, batches, seconds, rows_per_sec)."""
+
+    if reject_filename is None:
+        reject_filename = filename + ".rejects"
+
+    with open(filename, 'r', buffering=READ_BUFFER_SIZE) as file:
+        return stream_bulk_lines(file, batch_size, reject_filename, duplicates, near_days, filename + ".duplicates")
+
+
+def stream_bulk_lines(file, batch_size=BATCH_SIZE, reject_filename='stdin.rejects', duplicates='keep', near_days=None,
+                      duplicate_filename='stdin.duplicates', parse_line=parse_bulk_line):
+    """Import bulk lines from an open file (or any iterable of lines, such as sys.stdin) in batches.
+    Args:
+    - file: The open file to read the lines from.
+    - batch_size: The number of lines parsed per batch.
+    - reject_filename: Where to write malformed lines.
+    - duplicates: 'keep', 'skip' or 'flag' rows already stored.
+    - near_days: Also treat rows with the same category and amount within this many days as duplicates.
+    - duplicate_filename: Where to list the duplicates found.
+    - parse_line: The line parser (see parse_bulk_batch).
+    Returns:
+    - A dictionary with the import statistics (rows, rejected, duplicates, near_duplicates, batches, seconds, rows_per_sec)."""
+
+    stats = {'rows': 0, 'rejected': 0, 'duplicates': 0, 'near_duplicates': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    reject_file = None
+    duplicate_file = None
+    check = ledger.duplicate_index.check(near_days) if duplicates != 'keep' else None
+    start = time.perf_counter()
+
+    try:
+        line_number = 1
+
+        while True:
+            lines = list(islice(file, batch_size)) #--------------------------------Read the next batch of lines
+            if not lines:
+                break
+
+            staged, rejects = parse_bulk_batch(lines, line_number, parse_line)
+            if check is not None:
+                staged, found = check.filter(staged, duplicates)
+                if found:
+                    if duplicate_file is None:
+                        duplicate_file = open(duplicate_filename, 'w')
+                    write_duplicates(duplicate_file, found)
+            ledger.add_rows(staged) #---------------------------------------------------Commit the whole batch
+            if check is not None:
+                check.added_rows(staged)
+
+            if rejects:
+                if reject_file is None: #----------------------------------------Only create the reject file when it is needed
+                    reject_file = open(reject_filename, 'w')
+                write_rejects(reject_file, rejects)
+
+            stats['rows'] += sum(len(rows) for rows in staged.values())
+            stats['rejected'] += len(rejects)
+            stats['batches'] += 1
+            line_number += len(lines)
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+        if duplicate_file is not None:
+            duplicate_file.close()
+
+    if check is not None:
+        stats.update(check.stats)
+    stats['seconds'] = time.perf_counter() - start
+    if stats['seconds'] > 0:
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds']
+
+    return stats
@@ -0,0 +1,280 @@
+from array import array
+
+from dates import INVALID_DAY, LAST_DAY, date_to_day, day_to_date
+from money import from_minor, to_minor
+
+#---------------------------------------------------------------------------------------------------NumPy is optional, it is only used to speed up scans
+#It is imported on first use (see load_numpy), so programs that never scan start faster.
+np = None
+numpy_checked = False
+
+
+def load_numpy():
+    """Import NumPy the first time it is needed.
+    Returns:
+    - The numpy module, or None if it is not installed."""
+
+    global np, numpy_checked
+    if not numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        numpy_checked = True
+    return np
+
+
+#---------------------------------------------------------------------------------------------------Bits per piece when group_sums splits amounts that are too large to add up as float64
+SUM_PIECE_BITS = 21
+
+
+def group_sums(keys, amounts, length):
+    """Add up int64 amounts per group key exactly.
+    NumPy 1.25 and later run np.add.at as a fast indexed loop, which beats every alternative. Older
+    versions run it one element at a time, so there np.bincount is used instead: it is one pass, but it
+    adds float64 weights. When no total can pass 2 ** 53 the weights are exact, otherwise the amounts are
+    split into 21 bit pieces (a signed top piece and two unsigned ones), each piece is added up with its
+    own bincount (exact for up to 2 ** 31 rows) and the pieces are joined back as int64.
+    Args:
+    - keys: Group number of every row (0 <= key < length).
+    - amounts: The int64 amounts of the rows.
+    - length: Number of groups.
+    Returns:
+    - An int64 array with the total of every group."""
+
+    sums = np.zeros(length, dtype=np.int64)
+    if fast_add_at():
+        np.add.at(sums, keys, amounts)
+        return sums
+    if not len(amounts):
+        return sums
+
+    largest = max(abs(int(amounts.min())), abs(int(amounts.max())))
+    if largest * len(amounts) < 2 ** 53: #-----------------------------------------------------------Every partial sum is an exact float64
+        return np.bincount(keys, weights=amounts, minlength=length).astype(np.int64)
+    mask = (1 << SUM_PIECE_BITS) - 1
+    for shift in (2 * SUM_PIECE_BITS, SUM_PIECE_BITS, 0):
+        piece = amounts >> shift if shift == 2 * SUM_PIECE_BITS else (amounts >> shift) & mask
+        sums += np.bincount(keys, weights=piece, minlength=length).astype(np.int64) << shift
+    return sums
+
+
+def fast_add_at():
+    """Check if np.add.at has the fast indexed loop of NumPy 1.25 and later."""
+    version = tuple(int(part) for part in np.__version__.split('.')[:2] if part.isdigit())
+    return version >= (1, 25)
+
+
+class ColumnStore:
+    """Compact column based copy of the transactions dictionary.
+
+    Each transaction takes 14 bytes: the amount as int64 minor units (see money), the date as an
+    int32 day number and the category as a uint16 code into the category table. Dates that are not in
+    YYYY-MM-DD format are kept as text in a small side table so nothing is lost.
+    """
+
+    def __init__(self):
+        self.amounts = array('q')
+        self.days = array('i')
+        self.category_ids = array('H')
+        self.categories = [] #------------------------------------------------------------------------Category code -> category name
+        self.category_codes = {} #--------------------------------------------------------------------Category name -> category code
+        self.raw_dates = {} #-------------------------------------------------------------------------Row number -> date text for invalid dates
+        self.stale = True #---------------------------------------------------------------------------Set when the store no longer matches the dictionary
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """Build a store from a {category: [{'amount': ..., 'date': ...}]} dictionary."""
+        store = cls()
+        store.rebuild(transactions)
+        return store
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __getitem__(self, row):
+        """Get row number row as a (category, date, amount) tuple."""
+        return self.categories[self.category_ids[row]], self.date_at(row), from_minor(self.amounts[row])
+
+    def snapshot(self):
+        """Get an independent copy of the store that later changes to this one do not touch.
+        The columns are copied with one memory copy each, so a reader on another thread can keep
+        using the snapshot while this store is rebuilt or appended to."""
+
+        copy = ColumnStore()
+        copy.amounts = self.amounts[:]
+        copy.days = self.days[:]
+        copy.category_ids = self.category_ids[:]
+        copy.categories = self.categories[:]
+        copy.category_codes = dict(self.category_codes)
+        copy.raw_dates = dict(self.raw_dates)
+        copy.stale = False
+        return copy
+
+    def clear(self):
+        """Remove every row and category."""
+        self.amounts = array('q')
+        self.days = array('i')
+        self.category_ids = array('H')
+        self.categories = []
+        self.category_codes = {}
+        self.raw_dates = {}
+
+    def category_code(self, category):
+        """Get the code of a category, adding it to the category table if it is new."""
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.categories)
+            self.categories.append(category)
+            if code > 0xFFFF and self.category_ids.typecode == 'H': #-----------------------------------Widen the codes if there are more than 65536 categories
+                self.category_ids = array('I', self.category_ids)
+        return code
+
+    def append_rows(self, category, rows, day_cache=None, minor_cache=None):
+        """Append (amount, date) pairs of one category to the store."""
+        if day_cache is None:
+            day_cache = {}
+        if minor_cache is None:
+            minor_cache = {}
+
+        code = self.category_code(category)
+        start = len(self.amounts)
+
+        for amount, date_str in rows:
+            day = day_cache.get(date_str)
+            if day is None:
+                try:
+                    day = date_to_day(date_str)
+                except (TypeError, ValueError):
+                    day = INVALID_DAY
+                day_cache[date_str] = day
+
+            if day == INVALID_DAY:
+                self.raw_dates[len(self.amounts)] = date_str
+            units = minor_cache.get(amount)
+            if units is None:
+                units = minor_cache[amount] = to_minor(amount)
+            self.amounts.append(units)
+            self.days.append(day)
+
+        self.category_ids.extend([code] * (len(self.amounts) - start))
+
+    def rebuild(self, transactions):
+        """Refill the store from the transactions dictionary."""
+        self.clear()
+        day_cache = {} #-----------------------------------------------------------------------------Bulk data repeats the same dates and amounts many times
+        minor_cache = {}
+        for category, category_transactions in transactions.items():
+            self.append_rows(category, ((t['amount'], t['date']) for t in category_transactions), day_cache, minor_cache)
+        self.stale = False
+
+    #-----------------------------------------------------------------------------------------------Ledger listener methods
+    def apply(self, record, removed):
+        """Keep the store in step with a change record. Appends are applied directly,
+        any other change marks the store stale so it is rebuilt on next use."""
+        if self.stale:
+            return
+        if record['op'] == 'add':
+            self.append_rows(record['category'], record['rows'])
+        else:
+            self.stale = True
+
+    def reset(self, transactions):
+        """Mark the store stale after the whole dictionary was replaced."""
+        self.stale = True
+
+    #-----------------------------------------------------------------------------------------------Read API
+    def date_at(self, row):
+        """Get the date text of a row."""
+        day = self.days[row]
+        if day == INVALID_DAY:
+            return self.raw_dates[row]
+        return day_to_date(day)
+
+    def rows(self, category=None):
+        """Yield (category, date, amount) tuples, optionally only for one category."""
+        categories = self.categories
+        date_cache = {}
+
+        if category is None:
+            positions = range(len(self.amounts))
+        else:
+            code = self.category_codes.get(category)
+            if code is None:
+                return
+            positions = self.positions_of(code)
+
+        for row in positions:
+            day = self.days[row]
+            date_str = date_cache.get(day)
+            if date_str is None:
+                date_str = self.date_at(row)
+                if day != INVALID_DAY:
+                    date_cache[day] = date_str
+            yield categories[self.category_ids[row]], date_str, from_minor(self.amounts[row])
+
+    def positions_of(self, code):
+        """Get the row numbers of one category, in insertion order."""
+        if load_numpy() is not None:
+            return np.flatnonzero(self.numpy_columns()[2] == code).tolist()
+        category_ids = self.category_ids
+        return [row for row in range(len(category_ids)) if category_ids[row] == code]
+
+    def grouped_rows(self):
+        """Yield (category, [(date, amount), ...]) in category order, like iterating the dictionary."""
+        positions = {code: [] for code in range(len(self.categories))}
+        for row, code in enumerate(self.category_ids):
+            positions[code].append(row)
+
+        for code, rows in positions.items():
+            yield self.categories[code], [(self.date_at(row), from_minor(self.amounts[row])) for row in rows]
+
+    def category_totals(self):
+        """Get the total amount of every category as {category: total}, added up exactly in minor units."""
+        if load_numpy() is not None:
+            amounts, days, category_ids = self.numpy_columns()
+            totals = group_sums(category_ids, amounts, len(self.categories)).tolist() #------------------Integer sums, no rounding drift
+        else:
+            totals = [0] * len(self.categories)
+            for code, amount in zip(self.category_ids, self.amounts):
+                totals[code] += amount
+        return {category: from_minor(total) for category, total in zip(self.categories, totals)}
+
+    def sort_order(self, column, reverse=False):
+        """Get the row numbers sorted by 'category', 'date' or 'amount'.
+        The sort is stable in both directions, like sorted(..., reverse=reverse).
+        Categories sort case insensitively and invalid dates sort after every valid date."""
+
+        #-----------------------------------------------------------------------------------------------Rank the category names once, then sort the rows by the rank of their code
+        ranks = [0] * len(self.categories)
+        for rank, code in enumerate(sorted(range(len(self.categories)), key=lambda code: self.categories[code].lower().strip())):
+            ranks[code] = rank
+
+        if load_numpy() is not None:
+            amounts, days, category_ids = self.numpy_columns()
+            if column == 'date':
+                keys = np.where(days == INVALID_DAY, LAST_DAY, days).astype(np.int64)
+            elif column == 'amount':
+                keys = amounts
+            else:
+                keys = np.asarray(ranks, dtype=np.int64)[category_ids]
+            return np.argsort(-keys if reverse else keys, kind='stable').tolist()
+
+        if column == 'date':
+            keys = [LAST_DAY if day == INVALID_DAY else day for day in self.days]
+        elif column == 'amount':
+            keys = self.amounts
+        else:
+            keys = [ranks[code] for code in self.category_ids]
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+
+    def numpy_columns(self):
+        """Get zero copy NumPy views of the (amounts in minor units, days, category_ids) columns."""
+        return (np.frombuffer(self.amounts, dtype=np.int64),
+                np.frombuffer(self.days, dtype=np.int32),
+                np.frombuffer(self.category_ids, dtype=np.uint16 if self.category_ids.typecode == 'H' else np.uint32))
+
+    def nbytes(self):
+        """Get the memory used by the row columns in bytes."""
+        return sum(column.itemsize * len(column) for column in (self.amounts, self.days, self.category_ids))
@@ -0,0 +1,207 @@
+import json
+import os
+import time
+
+from money import parse_amount
+
+#---------------------------------------------------------------------------------------------------Advisory locking: fcntl on Unix, msvcrt on Windows (exclusive locks only), none elsewhere
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+#---------------------------------------------------------------------------------------------------Files kept next to the storage, e.g. 'transactions.json.lock' and 'transactions.json.feed'
+LOCK_SUFFIX = '.lock'
+FEED_SUFFIX = '.feed'
+
+#---------------------------------------------------------------------------------------------------Locking and change feed settings
+LOCK_TIMEOUT = float(os.environ.get('FINANCE_TRACKER_LOCK_TIMEOUT', '30')) #---------------------------Seconds to wait for another process to finish saving
+LOCK_POLL_SECONDS = 0.01
+FEED_MAX_BYTES = 4 * 1024 * 1024 #-------------------------------------------------------------------The feed starts over once it is bigger than this
+FEED_ROW_LIMIT = 20000 #---------------------------------------------------------------------------------Saves that change more rows tell the other processes to reload instead
+
+
+class ConcurrencyError(Exception):
+    """Base class of the errors raised when another process gets in the way of a change."""
+
+
+class LockTimeout(ConcurrencyError):
+    """Raised when the storage lock could not be taken within LOCK_TIMEOUT seconds."""
+
+
+class ConflictError(ConcurrencyError):
+    """Raised when a change was based on transactions that another process has changed since."""
+
+
+class FileLock:
+    """Advisory lock on a lock file, shared between every process that uses the same storage.
+
+    Readers take a shared lock and writers an exclusive one. The lock is advisory: it only keeps out
+    processes that take it too, which every part of the tracker does through the ledger.
+    """
+
+    def __init__(self, filename, timeout=LOCK_TIMEOUT):
+        self.filename = filename
+        self.timeout = timeout
+        self.file = None
+        self.exclusive = False
+
+    @property
+    def held(self):
+        return self.file is not None
+
+    def try_lock(self, exclusive):
+        """Try once to lock the open lock file. Returns True if the lock was taken."""
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self, exclusive=True):
+        """Wait for the lock (at most timeout seconds).
+        Raises LockTimeout if another process keeps holding it."""
+
+        if self.held:
+            raise RuntimeError(f"{self.filename} is already locked by this process")
+        self.file = open(self.filename, 'a+')
+        deadline = time.monotonic() + self.timeout
+        while not self.try_lock(exclusive):
+            if time.monotonic() >= deadline:
+                self.file.close()
+                self.file = None
+                raise LockTimeout(f"The storage is busy: another instance has been saving for more than {self.timeout:.0f} seconds.")
+            time.sleep(LOCK_POLL_SECONDS)
+        self.exclusive = exclusive
+
+    def release(self):
+        """Release the lock if this process holds it."""
+        if not self.held:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+            self.exclusive = False
+
+
+class ChangeFeed:
+    """Append-only file of the change records every process saved, so the others can catch up.
+
+    The file starts with a header line holding a random epoch, followed by one JSON line per save:
+    {"records": [...]} with the ledger change records of that save, or {"reload": true} when the save
+    was too big to publish. A process remembers the epoch and the byte offset it has read up to, which
+    together are the storage version: one stat call tells whether anything was saved since, and only
+    the new lines are read. A new epoch (the feed started over) means a full reload.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.epoch = None #---------------------------------------------------------------------------None while the feed file does not exist
+        self.offset = 0
+        self.file_key = None #------------------------------------------------------------------------(inode, size) of the file when it was last read
+        self.broken = False #-------------------------------------------------------------------------A torn line was found, so the next save starts over
+
+    def current_key(self):
+        """Get (inode, size) of the feed file, or None if it does not exist."""
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def changed(self):
+        """Check with one stat call whether another process saved since the feed was last read."""
+        return self.current_key() != self.file_key
+
+    def read_header(self, file):
+        """Read the epoch from the header line of an open feed file (None if the header is unreadable)."""
+        try:
+            return json.loads(file.readline()).get('epoch')
+        except (ValueError, AttributeError):
+            return None
+
+    def skip_to_end(self):
+        """Start following the feed from its current end (after a full load)."""
+        self.epoch = None
+        self.offset = 0
+        self.file_key = None
+        try:
+            with open(self.filename, 'rb') as file:
+                self.epoch = self.read_header(file)
+                self.offset = file.seek(0, os.SEEK_END)
+                self.file_key = (os.fstat(file.fileno()).st_ino, self.offset)
+        except FileNotFoundError:
+            pass
+
+    def read_changes(self):
+        """Read the change records other processes saved since the feed was last read.
+        Returns:
+        - A list of change records (empty if nothing changed), or None if a full reload is needed."""
+
+        if not self.changed():
+            return []
+        try:
+            file = open(self.filename, 'rb')
+        except FileNotFoundError:
+            return None #---------------------------------------------------------------------------The feed was removed
+        with file:
+            epoch = self.read_header(file)
+            if epoch is None or (self.epoch is not None and epoch != self.epoch):
+                return None #-----------------------------------------------------------------------The feed started over, changes may have been missed
+            if self.epoch is None: #----------------------------------------------------------------The feed was created after the load: every line is new
+                self.epoch = epoch
+            else:
+                file.seek(self.offset)
+
+            records = []
+            reload = False
+            for line in file:
+                if not line.endswith(b'\n'):
+                    self.broken = True
+                    return None
+                entry = json.loads(line, parse_float=parse_amount)
+                if entry.get('reload'):
+                    reload = True
+                else:
+                    records.extend(entry['records'])
+            self.offset = file.tell()
+            self.file_key = (os.fstat(file.fileno()).st_ino, self.offset)
+        return None if reload else records
+
+    def start_over(self):
+        """Atomically replace the feed with an empty one under a new epoch."""
+        self.epoch = os.urandom(8).hex()
+        header = json.dumps({'epoch': self.epoch}) + '\n'
+        with open(self.filename + '.tmp', 'w') as file:
+            file.write(header)
+        os.replace(self.filename + '.tmp', self.filename)
+        self.offset = len(header)
+        self.file_key = self.current_key()
+        self.broken = False
+
+    def publish(self, records):
+        """Append the records of one save (None for a save too big to publish). Call while holding the exclusive lock."""
+        if self.epoch is None or self.broken or self.current_key() is None:
+            self.start_over()
+        line = json.dumps({'reload': True} if records is None else {'records': records}) + '\n'
+        with open(self.filename, 'a') as file:
+            file.write(line)
+            file.flush()
+            self.offset = file.tell()
+            self.file_key = (os.fstat(file.fileno()).st_ino, self.offset)
+        if self.offset > FEED_MAX_BYTES:
+            self.start_over()
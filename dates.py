@@ -0,0 +1,71 @@
+from datetime import date
+from functools import lru_cache
+
+#---------------------------------------------------------------------------------------------------Dates are stored as 'YYYY-MM-DD' text and compared as day numbers (days since 1970-01-01)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+FIRST_DAY = date.min.toordinal() - EPOCH_ORDINAL #---------------------------------------------------0001-01-01
+FINAL_DAY = date.max.toordinal() - EPOCH_ORDINAL #---------------------------------------------------9999-12-31
+INVALID_DAY = -2 ** 31 #-----------------------------------------------------------------------------Day number used for dates that are not in YYYY-MM-DD format
+LAST_DAY = 2 ** 31 - 1 #-----------------------------------------------------------------------------Invalid dates sort after every valid date
+
+#---------------------------------------------------------------------------------------------------Distinct dates kept by the parse caches
+#Bulk files reuse a few thousand dates across millions of rows, 65536 days is almost 180 years.
+DATE_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_to_day(date_str):
+    """Convert a 'YYYY-MM-DD' string to a day number. Raises ValueError for invalid dates.
+    Only the fixed layout is accepted (not '2024-1-5' or '20240105'), so the date text of
+    every valid row sorts the same way as its day number."""
+
+    if (len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-' or not date_str.isascii()
+            or not (date_str[:4] + date_str[5:7] + date_str[8:]).isdigit()):
+        raise ValueError(f"invalid date {date_str!r}, expected YYYY-MM-DD")
+    try: #----------------------------------------------------------------------------------------------date() checks the month and day
+        return date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:])).toordinal() - EPOCH_ORDINAL
+    except ValueError as e:
+        raise ValueError(f"invalid date {date_str!r}: {e}") from None
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def day_to_date(day):
+    """Convert a day number back to a 'YYYY-MM-DD' string."""
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def valid_date(date_str):
+    """Check a 'YYYY-MM-DD' date and get the one shared string object for it.
+    Rows made from the returned strings share one object per distinct date instead of one per row.
+    Raises ValueError for invalid dates."""
+
+    date_to_day(date_str)
+    return date_str
+
+
+def is_valid_date(date_str):
+    """Check if a string is a valid 'YYYY-MM-DD' date."""
+    try:
+        date_to_day(date_str)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def date_sort_key(date_str):
+    """Get the day number of a date for sorting and range checks, LAST_DAY for an invalid date."""
+    try:
+        return date_to_day(date_str)
+    except (TypeError, ValueError):
+        return LAST_DAY
+
+
+def day_range(start_date=None, end_date=None):
+    """Get the (first, last) day numbers of an inclusive 'YYYY-MM-DD' date range.
+    An open end becomes the first or final valid day, so first <= date_sort_key(date) <= last
+    is False for invalid dates whenever a date filter is given.
+    Raises ValueError if a given date is invalid."""
+
+    return (FIRST_DAY if start_date is None else date_to_day(start_date),
+            FINAL_DAY if end_date is None else date_to_day(end_date))
@@ -0,0 +1,228 @@
+from bisect import bisect_left, bisect_right
+
+from dates import date_to_day
+
+#---------------------------------------------------------------------------------------------------What an import does with duplicate rows
+DUPLICATE_MODES = ('keep', 'skip', 'flag') #--------------------------------------------------------keep: import silently, skip: leave out, flag: import and report
+
+
+def day_number(date_str, cache):
+    """Get the day number of a date, or None if it is not a valid YYYY-MM-DD date."""
+    day = cache.get(date_str, False)
+    if day is False:
+        try:
+            day = date_to_day(date_str)
+        except (TypeError, ValueError):
+            day = None
+        cache[date_str] = day
+    return day
+
+
+class DuplicateIndex:
+    """Hash index of (category, amount, date) keys for finding duplicate transactions.
+
+    - exact duplicates are found with a {key: count} dictionary in O(1) per row
+    - near duplicates (same category and amount, dates at most N days apart) are found with a
+      sorted list of day numbers per (category, amount)
+    The index is built on first use and then kept up to date through the ledger listener methods.
+    The day lists are only built the first time a near duplicate check asks for them.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.stale = True
+
+    def rebuild(self):
+        """Build the index from the transactions dictionary."""
+        self.counts = {}
+        self.days = None #----------------------------------------------------------------------------(category, amount) -> sorted day numbers, None until a near check needs them
+        self.day_cache = {}
+        for category, category_transactions in self.transactions.items():
+            self.add_rows(category, ((transaction['amount'], transaction['date']) for transaction in category_transactions))
+        self.stale = False
+
+    def ensure_built(self):
+        if self.stale:
+            self.rebuild()
+
+    def ensure_days(self):
+        """Build the day lists for near duplicate checks, sorting each list once."""
+        self.ensure_built()
+        if self.days is None:
+            self.days = {}
+            for category, category_transactions in self.transactions.items():
+                add_days(self.days, category, ((transaction['amount'], transaction['date']) for transaction in category_transactions), self.day_cache)
+
+    def add_rows(self, category, rows):
+        """Add (amount, date) rows of one category to the index."""
+        if self.days is not None:
+            rows = list(rows)
+            add_days(self.days, category, rows, self.day_cache)
+        counts = self.counts
+        for amount, date_str in rows:
+            key = (category, amount, date_str)
+            counts[key] = counts.get(key, 0) + 1
+
+    def remove_rows(self, category, transactions):
+        """Remove transactions of one category from the index."""
+        for transaction in transactions:
+            amount, date_str = transaction['amount'], transaction['date']
+            key = (category, amount, date_str)
+            if self.counts[key] == 1:
+                del self.counts[key]
+            else:
+                self.counts[key] -= 1
+            if self.days is not None:
+                day = day_number(date_str, self.day_cache)
+                if day is not None:
+                    days = self.days[(category, amount)]
+                    del days[bisect_left(days, day)]
+
+    def count(self, category, amount, date_str):
+        """Get how many stored transactions have exactly this category, amount and date."""
+        self.ensure_built()
+        return self.counts.get((category, amount, date_str), 0)
+
+    def count_near(self, category, amount, day, near_days):
+        """Get how many stored transactions have this category and amount within near_days of day."""
+        self.ensure_days()
+        days = self.days.get((category, amount))
+        if not days:
+            return 0
+        return bisect_right(days, day + near_days) - bisect_left(days, day - near_days)
+
+    def check(self, near_days=None):
+        """Start checking one import against the index (see DuplicateCheck)."""
+        if near_days is None:
+            self.ensure_built()
+        else:
+            self.ensure_days()
+        return DuplicateCheck(self, near_days)
+
+    #-----------------------------------------------------------------------------------------------Ledger listener methods
+    def apply(self, record, removed):
+        """Update the index for one ledger change record."""
+        if self.stale:
+            return
+
+        op = record['op']
+        category = record['category']
+
+        if op == 'add':
+            self.add_rows(category, record['rows'])
+        elif op == 'update':
+            self.remove_rows(category, removed)
+            self.add_rows(category, [(record['amount'], record['date'])])
+        elif op in ('delete', 'delete_category', 'delete_rows'):
+            self.remove_rows(category, removed)
+        elif op == 'update_rows':
+            self.remove_rows(category, removed)
+            self.add_rows(category, record['rows'])
+        elif op == 'move_rows':
+            self.remove_rows(category, removed)
+            self.add_rows(record['new_category'], ((transaction['amount'], transaction['date']) for transaction in removed))
+        else: #----------------------------------------------------------------------------------------Renames change every key of the category
+            self.stale = True
+
+    def reset(self, transactions):
+        """Drop the index after the whole dictionary was replaced. It is rebuilt on next use."""
+        self.transactions = transactions
+        self.stale = True
+
+
+class DuplicateCheck:
+    """Finds the duplicates in the batches of one import.
+
+    Rows are compared with what was stored before the import started. Rows added by earlier batches
+    of the same import are subtracted from the index counts, so a file that repeats a row on purpose
+    is imported in full the first time, and a second import of the same file matches every row once.
+    """
+
+    def __init__(self, index, near_days=None):
+        self.index = index
+        self.near_days = near_days
+        self.used = {} #------------------------------------------------------------------------------key -> stored duplicates already matched by this import
+        self.added = {} #-----------------------------------------------------------------------------key -> rows this import added
+        self.added_days = {} #------------------------------------------------------------------------(category, amount) -> sorted day numbers this import added
+        self.day_cache = {}
+        self.stats = {'duplicates': 0, 'near_duplicates': 0}
+
+    def filter(self, staged, mode):
+        """Find the duplicates in one parsed batch.
+        Args:
+        - staged: {category: [(amount, date), ...]} from the bulk parser.
+        - mode: 'keep', 'skip' or 'flag' (see DUPLICATE_MODES).
+        Returns:
+        - (rows to add, [(category, amount, date, 'duplicate' or 'near duplicate'), ...])."""
+
+        if mode == 'keep':
+            return staged, []
+
+        kept = {}
+        found = []
+        for category, rows in staged.items():
+            kept_rows = []
+            for amount, date_str in rows:
+                kind = self.classify(category, amount, date_str)
+                if kind is not None:
+                    found.append((category, amount, date_str, kind))
+                    if mode == 'skip':
+                        continue
+                kept_rows.append((amount, date_str))
+            if kept_rows:
+                kept[category] = kept_rows
+        return kept, found
+
+    def classify(self, category, amount, date_str):
+        """Check one row against the transactions stored before the import."""
+        key = (category, amount, date_str)
+        stored = self.index.count(category, amount, date_str) - self.added.get(key, 0)
+        if stored > self.used.get(key, 0):
+            self.used[key] = self.used.get(key, 0) + 1
+            self.stats['duplicates'] += 1
+            return 'duplicate'
+
+        if self.near_days is not None:
+            day = day_number(date_str, self.day_cache)
+            if day is not None:
+                stored = self.index.count_near(category, amount, day, self.near_days)
+                added_days = self.added_days.get((category, amount))
+                if added_days:
+                    stored -= bisect_right(added_days, day + self.near_days) - bisect_left(added_days, day - self.near_days)
+                if stored > 0:
+                    self.stats['near_duplicates'] += 1
+                    return 'near duplicate'
+        return None
+
+    def added_rows(self, staged):
+        """Note the rows the import has just added to the ledger."""
+        for category, rows in staged.items():
+            for amount, date_str in rows:
+                key = (category, amount, date_str)
+                self.added[key] = self.added.get(key, 0) + 1
+            if self.near_days is not None:
+                add_days(self.added_days, category, rows, self.day_cache)
+
+
+def add_days(days, category, rows, day_cache):
+    """Add the day numbers of (amount, date) rows of one category to a {(category, amount): sorted days} dictionary.
+    The days are appended and every list that grew is sorted once at the end, instead of one insort per row."""
+
+    grown = set()
+    for amount, date_str in rows:
+        day = day_number(date_str, day_cache)
+        if day is not None:
+            key = (category, amount)
+            key_days = days.get(key)
+            if key_days is None:
+                key_days = days[key] = []
+            key_days.append(day)
+            grown.add(key)
+    for key in grown:
+        days[key].sort() #-----------------------------------------------------------------------------Already sorted lists with a few new days at the end sort in linear time
+
+
+def write_duplicates(duplicate_file, duplicates):
+    """Write duplicate rows to the duplicates report as 'kind: category, amount, date' lines."""
+    for category, amount, date_str, kind in duplicates:
+        duplicate_file.write(f"{kind}: {category}, {amount}, {date_str}\n")
@@ -0,0 +1,279 @@
+"""Import service that ingests bulk files dropped into a folder.
+
+Usage: python ingest_service.py DROP_FOLDER [--interval 5] [--concurrency 4] [--queue-size 2] [--once]
+
+New '*.txt' files in the drop folder are parsed in worker processes (at most --concurrency at a
+time) and committed one file at a time, each file as one batch followed by one save. Files whose
+content was ingested before are recognised by their SHA-256 hash and skipped. Finished files are
+moved to 'processed/' inside the drop folder and malformed lines go to 'processed/<file>.rejects'.
+With --duplicates skip or flag, rows that are already stored are also left out or reported in
+'processed/<file>.duplicates'.
+
+Memory stays bounded during a burst: a file is only parsed when a parse slot is free, and parsed
+files wait in a queue of --queue-size entries for the committer, so at most concurrency + queue
+size parsed files are held at once.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import ledger
+from concurrency import ConcurrencyError
+from bulk_import import BATCH_SIZE, READ_BUFFER_SIZE, parse_bulk_batch, write_rejects
+from duplicate_index import DUPLICATE_MODES, write_duplicates
+
+#---------------------------------------------------------------------------------------------------Files inside the drop folder
+MANIFEST_FILENAME = '.ingested.json' #----------------------------------------------------------------Content hashes of every ingested file
+PROCESSED_FOLDER = 'processed'
+DROP_PATTERN_SUFFIX = '.txt'
+
+#---------------------------------------------------------------------------------------------------Service defaults
+POLL_INTERVAL = 5.0 #--------------------------------------------------------------------------------Seconds between scans of the drop folder
+SETTLE_SECONDS = 2.0 #-------------------------------------------------------------------------------Files changed more recently than this may still be being written
+CONCURRENCY = 4
+QUEUE_SIZE = 2
+
+
+def file_digest(filename):
+    """Get the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(READ_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_drop_file(filename, known_digests):
+    """Hash a dropped file and parse it unless its content was ingested before. Runs in a worker process.
+    Args:
+    - filename: The dropped bulk file.
+    - known_digests: Digests already in the manifest.
+    Returns:
+    - (digest, staged, rejects); staged and rejects are None for a duplicate."""
+
+    digest = file_digest(filename)
+    if digest in known_digests:
+        return digest, None, None
+
+    staged = {}
+    rejects = []
+    with open(filename, 'r', buffering=READ_BUFFER_SIZE) as file:
+        line_number = 1
+        while True:
+            lines = list(islice(file, BATCH_SIZE)) #-------------------------------------------------Only one batch of raw lines in memory at a time
+            if not lines:
+                break
+            batch_staged, batch_rejects = parse_bulk_batch(lines, line_number)
+            for category, rows in batch_staged.items():
+                category_rows = staged.get(category)
+                if category_rows is None:
+                    staged[category] = rows
+                else:
+                    category_rows.extend(rows)
+            rejects.extend(batch_rejects)
+            line_number += len(lines)
+    return digest, staged, rejects
+
+
+class IngestService:
+    """Watches a drop folder and imports every new bulk file into the ledger.
+
+    Parsing runs in an executor with bounded concurrency. Committing runs on the event loop
+    thread only, so the ledger is never touched by two tasks at once.
+    """
+
+    def __init__(self, drop_folder, concurrency=CONCURRENCY, queue_size=QUEUE_SIZE,
+                 settle_seconds=SETTLE_SECONDS, executor=None, duplicates='keep', near_days=None):
+        self.drop_folder = drop_folder
+        self.processed_folder = os.path.join(drop_folder, PROCESSED_FOLDER)
+        self.manifest_filename = os.path.join(drop_folder, MANIFEST_FILENAME)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.settle_seconds = settle_seconds
+        self.executor = executor #--------------------------------------------------------------------None means a process pool created by run
+        self.duplicates = duplicates #----------------------------------------------------------------What to do with rows already stored ('keep', 'skip' or 'flag')
+        self.near_days = near_days
+        self.manifest = self.read_manifest()
+        self.in_flight = set() #----------------------------------------------------------------------Files being parsed or waiting to be committed
+        self.stats = {'files': 0, 'duplicates': 0, 'rows': 0, 'rejected': 0, 'duplicate_rows': 0}
+
+    #-----------------------------------------------------------------------------------------------Manifest of ingested files
+    def read_manifest(self):
+        try:
+            with open(self.manifest_filename, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def write_manifest(self):
+        """Write the manifest atomically."""
+        with open(self.manifest_filename + '.tmp', 'w') as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(self.manifest_filename + '.tmp', self.manifest_filename)
+
+    #-----------------------------------------------------------------------------------------------Scanning
+    def ready_files(self):
+        """Get the dropped files that are complete and not being processed yet, oldest first."""
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.drop_folder):
+            if not entry.is_file() or not entry.name.endswith(DROP_PATTERN_SUFFIX) or entry.path in self.in_flight:
+                continue
+            modified = entry.stat().st_mtime
+            if now - modified >= self.settle_seconds:
+                files.append((modified, entry.path))
+        return [path for modified, path in sorted(files)]
+
+    def move_to_processed(self, filename):
+        """Move a finished file out of the drop folder so it is not scanned again."""
+        os.makedirs(self.processed_folder, exist_ok=True)
+        target = os.path.join(self.processed_folder, os.path.basename(filename))
+        if os.path.exists(target): #-----------------------------------------------------------------Keep both files if the name was used before
+            stem, extension = os.path.splitext(target)
+            target = f"{stem}.{time.time_ns()}{extension}"
+        os.replace(filename, target)
+        return target
+
+    #-----------------------------------------------------------------------------------------------Pipeline
+    async def parse(self, filename, semaphore, queue):
+        """Parse one file in the executor and hand the result to the committer."""
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, parse_drop_file, filename, frozenset(self.manifest))
+        except Exception as e:
+            result = e
+        try:
+            await queue.put((filename, result)) #-------------------------------------------------Waits while the queue is full (backpressure)
+        finally:
+            semaphore.release() #-----------------------------------------------------------------The slot is held until the result is queued
+
+    def commit(self, filename, result):
+        """Add one parsed file to the ledger as one batch and save. Runs on the event loop thread.
+        The duplicate check, the add and the save run in one exclusive() block, so if any of them
+        fails the file's rows are dropped again and the file is left for the next scan."""
+        if isinstance(result, Exception):
+            print(f"Could not ingest '{filename}': {result}", flush=True)
+            return
+
+        digest, staged, rejects = result
+        name = os.path.basename(filename)
+        if staged is None or digest in self.manifest: #-------------------------------------------Checked again: an identical file may have been committed meanwhile
+            self.stats['duplicates'] += 1
+            self.move_to_processed(filename)
+            print(f"Skipped '{name}': same content as '{self.manifest[digest]['file']}'.", flush=True)
+            return
+
+        found = []
+        try:
+            with ledger.exclusive(): #-------------------------------------------------------------Other processes' rows are in the index before the check
+                if self.duplicates != 'keep':
+                    staged, found = ledger.duplicate_index.check(self.near_days).filter(staged, self.duplicates)
+                ledger.add_rows(staged)
+        except ConcurrencyError as e: #--------------------------------------------------------------Leave the file in the drop folder for the next scan
+            print(f"Could not ingest '{name}' yet: {e}", flush=True)
+            return
+
+        rows = sum(len(category_rows) for category_rows in staged.values())
+        self.manifest[digest] = {'file': name, 'rows': rows, 'rejected': len(rejects), 'duplicate_rows': len(found),
+                                 'ingested_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        self.stats['files'] += 1
+        self.stats['rows'] += rows
+        self.stats['rejected'] += len(rejects)
+        self.stats['duplicate_rows'] += len(found)
+
+        self.write_manifest() #-------------------------------------------------------------------Before the move: if the move fails, the next scan skips the file
+        target = self.move_to_processed(filename)
+        if rejects:
+            with open(target + '.rejects', 'w') as reject_file:
+                write_rejects(reject_file, rejects)
+        if found:
+            with open(target + '.duplicates', 'w') as duplicate_file:
+                write_duplicates(duplicate_file, found)
+        print(f"Ingested '{name}': {rows} transactions, {len(rejects)} rejected, {len(found)} duplicates.", flush=True)
+
+    async def run_once(self):
+        """Ingest every file that is in the drop folder now.
+        Returns:
+        - The service statistics (files, duplicate files, rows, rejected, duplicate_rows) so far."""
+
+        files = self.ready_files()
+        if not files:
+            return self.stats
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = []
+
+        async def start_parsing():
+            for filename in files:
+                await semaphore.acquire() #-------------------------------------------------------Wait for a free parse slot
+                self.in_flight.add(filename)
+                tasks.append(asyncio.create_task(self.parse(filename, semaphore, queue)))
+
+        producer = asyncio.create_task(start_parsing())
+        for _ in range(len(files)):
+            filename, result = await queue.get()
+            try:
+                self.commit(filename, result)
+            except Exception as e: #---------------------------------------------------------------One bad file (a failed move or write) must not stop the service
+                print(f"Could not finish ingesting '{filename}': {e}", flush=True)
+            finally:
+                self.in_flight.discard(filename)
+
+        await producer
+        await asyncio.gather(*tasks)
+        return self.stats
+
+    async def run(self, interval=POLL_INTERVAL, stop=None):
+        """Scan the drop folder every interval seconds until the stop event is set."""
+        own_executor = self.executor is None
+        if own_executor:
+            self.executor = ProcessPoolExecutor(max_workers=self.concurrency)
+        try:
+            while stop is None or not stop.is_set():
+                await self.run_once()
+                try:
+                    await asyncio.wait_for(stop.wait(), interval) if stop is not None else await asyncio.sleep(interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if own_executor:
+                self.executor.shutdown()
+                self.executor = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('drop_folder')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="Seconds between scans")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="Files parsed at the same time")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help="Parsed files waiting to be committed")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS, help="Ignore files modified in the last N seconds")
+    parser.add_argument('--once', action='store_true', help="Ingest the files present now and exit")
+    parser.add_argument('--duplicates', choices=DUPLICATE_MODES, default='keep', help="What to do with rows already stored")
+    parser.add_argument('--near-days', type=int, help="Also treat the same category and amount within N days as a duplicate")
+    args = parser.parse_args()
+
+    ledger.load()
+    service = IngestService(args.drop_folder, args.concurrency, args.queue_size, args.settle,
+                            duplicates=args.duplicates, near_days=args.near_days)
+    try:
+        if args.once:
+            with ProcessPoolExecutor(max_workers=args.concurrency) as executor:
+                service.executor = executor
+                print(json.dumps(asyncio.run(service.run_once())))
+        else:
+            asyncio.run(service.run(args.interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import atexit
+import functools
+import io
+import os
+import threading
+import time
+
+#---------------------------------------------------------------------------------------------------Environment variables that switch profiling on without touching the menu
+#FINANCE_TRACKER_PROFILE: '1' or 'timers' for timers and counters only, or a comma separated list
+#                         that may also name 'cprofile' and 'tracemalloc' (e.g. 'cprofile,tracemalloc')
+#FINANCE_TRACKER_PROFILE_REPORT: report file name (default 'profile_report.txt')
+PROFILE_ENV = 'FINANCE_TRACKER_PROFILE'
+REPORT_ENV = 'FINANCE_TRACKER_PROFILE_REPORT'
+DEFAULT_REPORT = 'profile_report.txt'
+
+#---------------------------------------------------------------------------------------------------Upper bounds of the latency histogram buckets in seconds (the last bucket is open ended)
+BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+BUCKET_LABELS = ('<100us', '<1ms', '<10ms', '<100ms', '<1s', '<10s', '>=10s')
+
+#---------------------------------------------------------------------------------------------------Number of functions listed from the cProfile statistics
+PROFILE_LINES = 30
+
+enabled = False #-----------------------------------------------------------------------------------Checked by every timer, so disabled timers only cost one global lookup
+timings = {} #--------------------------------------------------------------------------------------operation -> list of durations in seconds
+counters = {} #-------------------------------------------------------------------------------------counter -> total
+lock = threading.Lock() #---------------------------------------------------------------------------The GUI worker thread records timings too
+profiler = None
+tracing_memory = False
+report_filename = DEFAULT_REPORT
+started_at = None
+exit_hook_registered = False
+
+
+def record(name, seconds):
+    """Add one duration to an operation."""
+    with lock:
+        samples = timings.get(name)
+        if samples is None:
+            samples = timings[name] = []
+        samples.append(seconds)
+
+
+def count(name, amount=1):
+    """Add amount to a counter (does nothing while instrumentation is off)."""
+    if enabled:
+        with lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+def timed(name):
+    """Decorator that records how long every call of a function takes under the operation name."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start_time)
+        return wrapper
+    return decorate
+
+
+class timer:
+    """Context manager that records how long a block takes, for code that also waits for user input.
+
+    Usage:
+        with instrumentation.timer('cli.search'):
+            ...
+    """
+
+    __slots__ = ('name', 'start_time')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter() if enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start_time is not None:
+            record(self.name, time.perf_counter() - self.start_time)
+        return False
+
+
+def start(cprofile=False, trace_memory=False, filename=None):
+    """Start collecting timings and counters, optionally with cProfile and tracemalloc.
+    cProfile only follows the thread that calls start (the CLI, or the GUI main loop); work done on
+    the GUI worker thread still shows up in the timings.
+    Args:
+    - cprofile: Also profile every function call with cProfile.
+    - trace_memory: Also trace allocations with tracemalloc to report the peak memory.
+    - filename: Report file name (default from FINANCE_TRACKER_PROFILE_REPORT or 'profile_report.txt')."""
+
+    global enabled, profiler, tracing_memory, report_filename, started_at, exit_hook_registered
+
+    with lock:
+        timings.clear()
+        counters.clear()
+    report_filename = filename or os.environ.get(REPORT_ENV, DEFAULT_REPORT)
+    started_at = time.time()
+
+    if cprofile and profiler is None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if trace_memory and not tracing_memory:
+        import tracemalloc
+        tracemalloc.start()
+        tracing_memory = True
+
+    if not exit_hook_registered: #-------------------------------------------------------------------Write the report even if the program ends without calling stop
+        atexit.register(stop)
+        exit_hook_registered = True
+    enabled = True
+
+
+def stop():
+    """Stop collecting and write the report.
+    Returns:
+    - The report file name, or None if instrumentation was not running."""
+
+    global enabled, profiler, tracing_memory
+
+    if not enabled:
+        return None
+    enabled = False
+
+    profile_text = None
+    if profiler is not None:
+        profiler.disable()
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        profile_text = output.getvalue()
+        profiler = None
+
+    memory = None
+    if tracing_memory:
+        import tracemalloc
+        memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracing_memory = False
+
+    write_report(report_filename, memory, profile_text)
+    return report_filename
+
+
+def start_from_environment():
+    """Start instrumentation if the FINANCE_TRACKER_PROFILE environment variable asks for it."""
+    value = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if not value or value in ('0', 'off', 'false', 'no'):
+        return
+    modes = {mode.strip() for mode in value.split(',')}
+    start(cprofile='cprofile' in modes or 'all' in modes, trace_memory='tracemalloc' in modes or 'all' in modes)
+
+
+def histogram(samples):
+    """Count the durations in each latency bucket."""
+    counts = [0] * len(BUCKET_LABELS)
+    for seconds in samples:
+        bucket = 0
+        while bucket < len(BUCKETS) and seconds >= BUCKETS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    return counts
+
+
+def percentile(sorted_samples, fraction):
+    """Get a percentile of an already sorted list of durations."""
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def peak_rss_kib():
+    """Get the peak resident memory of the process in KiB, or None where it is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if os.uname().sysname == 'Darwin' else peak #---------------------------macOS reports bytes
+
+
+def write_report(filename, memory=None, profile_text=None):
+    """Write the latency table, histograms, counters, peak memory and cProfile statistics to a file."""
+    with lock:
+        operations = {name: sorted(samples) for name, samples in timings.items()}
+        counter_items = sorted(counters.items())
+
+    lines = [f"Finance Tracker profile report ({time.strftime('%Y-%m-%d %H:%M:%S')})",
+             f"Duration: {time.time() - started_at:.1f}s", ""]
+
+    lines.append(f"{'Operation':<28} {'Calls':>7} {'Total s':>10} {'Mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'Max ms':>10}")
+    lines.append("-" * 91)
+    for name, samples in sorted(operations.items()):
+        total = sum(samples)
+        lines.append(f"{name:<28} {len(samples):>7} {total:>10.3f} {total / len(samples) * 1000:>10.3f} "
+                     f"{percentile(samples, 0.5) * 1000:>10.3f} {percentile(samples, 0.95) * 1000:>10.3f} {samples[-1] * 1000:>10.3f}")
+
+    lines += ["", "Latency histograms", f"{'Operation':<28} " + " ".join(f"{label:>7}" for label in BUCKET_LABELS)]
+    for name, samples in sorted(operations.items()):
+        lines.append(f"{name:<28} " + " ".join(f"{bucket:>7}" for bucket in histogram(samples)))
+
+    if counter_items:
+        lines += ["", "Counters"]
+        lines += [f"{name:<28} {value:>12}" for name, value in counter_items]
+
+    lines += ["", "Memory"]
+    rss = peak_rss_kib()
+    if rss is not None:
+        lines.append(f"Peak resident memory: {rss / 1024:.1f} MiB")
+    if memory is not None:
+        current, peak = memory
+        lines.append(f"Peak traced Python memory: {peak / 1024 / 1024:.1f} MiB (current {current / 1024 / 1024:.1f} MiB)")
+
+    if profile_text:
+        lines += ["", "cProfile (sorted by cumulative time)", profile_text]
+
+    with open(filename, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+
+
+start_from_environment()
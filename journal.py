@@ -0,0 +1,268 @@
+import json
+import os
+import zlib
+
+from binary_snapshot import MappedSnapshot, write_snapshot
+from dates import date_sort_key, day_range
+from money import parse_amount
+from storage_backend import StorageBackend, file_stamp
+
+#---------------------------------------------------------------------------------------------------Journal settings
+SYNC_EVERY = 1000 #-----------------------------------------------------------------------------------Records written between two fsync calls
+MIN_COMPACT_BYTES = 1024 * 1024 #---------------------------------------------------------------------Never compact while the log is smaller than this
+
+
+class TransactionJournal(StorageBackend):
+    """Append-only change log on top of a snapshot (the default storage backend).
+
+    Every change to the transactions dictionary is written as one JSON line to the log file.
+    Compaction writes a binary snapshot ('transactions.bin', see binary_snapshot), which is opened
+    through mmap on the next start. The JSON snapshot ('transactions.json') is only read when there
+    is no binary snapshot yet, so existing JSON files are imported automatically. After that it is an
+    export only: compaction rewrites it in the export_json layout for other programs that read it, so
+    it matches the binary snapshot but not the changes logged since.
+
+    The log starts with a header that identifies the snapshot it belongs to (the snapshot id of a
+    binary snapshot, or the checksum of a JSON one), so a crash in the middle of a compaction never
+    replays changes twice: once the new snapshot is in place the old log no longer matches it and
+    is ignored.
+    """
+
+    def __init__(self, snapshot_filename='transactions.json', log_filename=None, sync_every=SYNC_EVERY):
+        self.snapshot_filename = snapshot_filename
+        self.binary_filename = os.path.splitext(snapshot_filename)[0] + '.bin'
+        self.log_filename = log_filename or os.path.splitext(snapshot_filename)[0] + '.log'
+        self.sync_every = sync_every
+        self.snapshot_token = 0 #-----------------------------------------------------------------Identifies the snapshot the log belongs to
+        self.snapshot_size = 0
+        self.log_file = None
+        self.pending = 0 #--------------------------------------------------------------------------Records written since the last fsync
+        self.commit_offset = None #-------------------------------------------------------------------Log size at the last commit, rollback cuts the log back to it
+        self.follow_log = False #---------------------------------------------------------------------Another process wrote (and maybe compacted) the log since it was opened
+
+    def load(self, transactions, apply_record):
+        """Load the snapshot into the transactions dictionary and replay the log tail.
+        Args:
+        - transactions: The dictionary to load into.
+        - apply_record: Function that applies one log record to the dictionary.
+        Returns:
+        - The number of log records replayed."""
+
+        if os.path.exists(self.binary_filename):
+            snapshot = MappedSnapshot(self.binary_filename)
+            try:
+                snapshot.load_into(transactions)
+                self.snapshot_token = f"bin:{snapshot.snapshot_id}"
+            finally:
+                snapshot.close()
+            self.snapshot_size = os.path.getsize(self.binary_filename)
+        else:
+            self.load_json_snapshot(transactions)
+
+        replayed = 0
+        try:
+            with open(self.log_filename, 'r') as file:
+                header = self.read_record(file.readline())
+
+                if not self.header_matches(header):
+                    return 0 #----------------------------------------------------------------------The log belongs to an older snapshot
+
+                for line in file:
+                    record = self.read_record(line)
+                    if record is None: #----------------------------------------------------------Stop at a torn write from a crash
+                        break
+                    apply_record(transactions, record)
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+
+        return replayed
+
+    def load_json_snapshot(self, transactions):
+        """Load the JSON snapshot (used until the first binary snapshot is written)."""
+        try:
+            with open(self.snapshot_filename, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b''
+
+        self.snapshot_token = zlib.crc32(data)
+        self.snapshot_size = len(data)
+        if data.strip():
+            transactions.update(json.loads(data, parse_float=parse_amount)) #--------------------------Decimal text straight to minor units, never through float()
+
+    def header_matches(self, header):
+        """Check whether a log header belongs to the loaded snapshot."""
+        if header is None:
+            return False
+        return header.get('snapshot', header.get('snapshot_crc')) == self.snapshot_token
+
+    def read_record(self, line):
+        """Decode one log line, or return None if it is incomplete."""
+        if not line.endswith('\n'):
+            return None
+        try:
+            return json.loads(line, parse_float=parse_amount)
+        except json.decoder.JSONDecodeError:
+            return None
+
+    def open_log(self):
+        """Open the log for appending, starting a new one if it does not match the snapshot."""
+        header = None
+        try:
+            with open(self.log_filename, 'r') as file:
+                header = self.read_record(file.readline())
+        except FileNotFoundError:
+            pass
+
+        if self.follow_log and header is not None and 'snapshot' in header: #-------------------------Take over the snapshot of the other process's compaction
+            self.snapshot_token = header['snapshot']
+            if os.path.exists(self.binary_filename):
+                self.snapshot_size = os.path.getsize(self.binary_filename)
+        self.follow_log = False
+
+        if not self.header_matches(header):
+            self.write_log_header()
+        else:
+            self.drop_torn_tail()
+
+        self.commit_offset = self.log_size()
+        self.log_file = open(self.log_filename, 'a')
+
+    def drop_torn_tail(self):
+        """Cut off an incomplete last line left by a crash so new records start on a fresh line."""
+        with open(self.log_filename, 'rb+') as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            position = size
+
+            while position > 0:
+                step = min(4096, position)
+                file.seek(position - step)
+                block = file.read(step)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    position = position - step + newline + 1
+                    break
+                position -= step
+
+            if position != size:
+                file.truncate(position)
+
+    def write_log_header(self):
+        """Atomically replace the log with an empty one that belongs to the current snapshot."""
+        temp_filename = self.log_filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            file.write(json.dumps({'op': 'header', 'snapshot': self.snapshot_token}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, self.log_filename)
+
+    def append(self, record):
+        """Append one change record to the log. The record is fsynced in batches."""
+        if self.log_file is None:
+            self.open_log()
+
+        self.log_file.write(json.dumps(record) + '\n')
+        self.pending += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+
+    def append_batch(self, records):
+        """Append several change records as one {'op': 'batch', 'records': [...]} log line.
+        Replay stops at a torn line, so after a crash the batch is replayed whole or not at all."""
+        if len(records) == 1:
+            self.append(records[0])
+        else:
+            self.append({'op': 'batch', 'records': records})
+
+    def sync(self):
+        """Flush the log and fsync it to disk."""
+        if self.log_file is not None and self.pending:
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+        self.pending = 0
+
+    def log_size(self):
+        """Get the current size of the log file in bytes."""
+        try:
+            return os.path.getsize(self.log_filename)
+        except FileNotFoundError:
+            return 0
+
+    def commit(self, transactions):
+        """Make all appended records durable and compact the log once it outgrows the snapshot."""
+        self.sync()
+        if self.log_size() > max(self.snapshot_size, MIN_COMPACT_BYTES):
+            self.compact(transactions)
+        self.commit_offset = self.log_size()
+
+    def rollback(self):
+        """Drop the records appended since the last commit by cutting the log back to its committed size."""
+        if self.log_file is not None:
+            try:
+                self.log_file.close()
+            except OSError: #--------------------------------------------------------------------------The buffered records could not be written, they are dropped anyway
+                pass
+            self.log_file = None
+        self.pending = 0
+        if self.commit_offset is not None and self.log_size() > self.commit_offset:
+            os.truncate(self.log_filename, self.commit_offset)
+
+    def compact(self, transactions):
+        """Write a new binary snapshot of the transactions dictionary and start an empty log."""
+        self.sync()
+        snapshot_id = write_snapshot(self.binary_filename, transactions) #------------------------From here on the old log is ignored
+
+        self.snapshot_token = f"bin:{snapshot_id}"
+        self.snapshot_size = os.path.getsize(self.binary_filename)
+
+        if self.log_file is not None:
+            self.log_file.close()
+        self.write_log_header()
+        self.log_file = open(self.log_filename, 'a')
+        self.write_json_export(transactions)
+
+    def write_json_export(self, transactions):
+        """Atomically rewrite the JSON snapshot file as a pretty printed export of the transactions dictionary.
+        It is never read back once a binary snapshot exists (see the class docstring)."""
+        temp_filename = self.snapshot_filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump(transactions, file, indent=4)
+        os.replace(temp_filename, self.snapshot_filename)
+
+    def write_all(self, transactions):
+        """Write a full snapshot of the transactions dictionary."""
+        self.compact(transactions)
+
+    def iter_rows(self, category=None, start_date=None, end_date=None):
+        """Yield (category, amount, date) rows. The JSON format has no indexes, so this reads the whole file."""
+        from ledger import apply_record #--------------------------------------------------------------Imported here because ledger imports this module
+
+        dated = start_date is not None or end_date is not None
+        first_day, last_day = day_range(start_date, end_date)
+        transactions = {}
+        TransactionJournal(self.snapshot_filename, self.log_filename).load(transactions, apply_record)
+        for row_category, category_transactions in transactions.items():
+            if category is not None and row_category != category:
+                continue
+            for transaction in category_transactions:
+                date = transaction['date']
+                if not dated or first_day <= date_sort_key(date) <= last_day:
+                    yield row_category, transaction['amount'], date
+
+    def stamp(self):
+        """Get the stamp of the JSON snapshot, the binary snapshot and the log."""
+        return file_stamp([self.snapshot_filename, self.binary_filename, self.log_filename])
+
+    def apply_external(self, record):
+        """Another process appended to the log: reopen it before the next append."""
+        self.close()
+        self.follow_log = True
+
+    def close(self):
+        """Sync and close the log file."""
+        self.sync()
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
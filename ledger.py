@@ -0,0 +1,553 @@
+import json
+import os
+from contextlib import contextmanager
+
+from journal import TransactionJournal
+from sqlite_storage import SqliteStorage
+from partitioned_storage import PartitionedStorage
+from column_store import ColumnStore
+from running_totals import RunningTotals
+from search_index import SearchIndex
+from duplicate_index import DuplicateIndex
+from rollup_cube import CUBE_SUFFIX, RollupCube
+from concurrency import FEED_ROW_LIMIT, FEED_SUFFIX, LOCK_SUFFIX, ChangeFeed, ConflictError, FileLock
+
+#---------------------------------------------------------------------------------------------------Shared transactions dictionary {category: [{'amount': ..., 'date': ...}]}
+transactions = {}
+
+#---------------------------------------------------------------------------------------------------Where transactions are stored: a .json file (snapshot + journal), a .db file (SQLite)
+#or a .parts folder (one segment per month)
+STORAGE_FILENAME = os.environ.get('FINANCE_TRACKER_STORAGE', 'transactions.json')
+
+#---------------------------------------------------------------------------------------------------Storage backend that records every change (set by load)
+storage = None
+
+#---------------------------------------------------------------------------------------------------Change counter, increased on every change so caches can tell they are out of date
+version = 0
+
+#---------------------------------------------------------------------------------------------------Sharing the storage with other processes (set by load)
+#Changes are made while holding the exclusive storage lock, taken by the first change after a save and
+#released by the save. Every save is published to the change feed, which the other processes read to
+#catch up without loading everything again.
+lock = None
+feed = None
+storage_filename = None
+unsaved = [] #---------------------------------------------------------------------------------------Change records since the last save, None when too many rows to publish
+unsaved_rows = 0
+batch_depth = 0 #------------------------------------------------------------------------------------Nesting of exclusive() blocks
+
+#---------------------------------------------------------------------------------------------------Change records that point at rows by their position in a category
+INDEXED_OPS = ('update', 'delete', 'update_rows', 'delete_rows', 'move_rows')
+
+#---------------------------------------------------------------------------------------------------Compact column copy of the dictionary, used for scans
+store = ColumnStore()
+
+#---------------------------------------------------------------------------------------------------Per-category and per-month totals, updated on every change
+totals = RunningTotals()
+
+#---------------------------------------------------------------------------------------------------Category, amount and date indexes for searches (built on first search)
+search_index = SearchIndex(transactions)
+
+#---------------------------------------------------------------------------------------------------(category, amount, date) index for finding duplicates on import (built on first check)
+duplicate_index = DuplicateIndex(transactions)
+
+#---------------------------------------------------------------------------------------------------Totals by category and day/week/month/year for trend views (saved next to the storage on close)
+cube = RollupCube(transactions)
+cube_filename = None #-------------------------------------------------------------------------------Set by load
+
+#---------------------------------------------------------------------------------------------------Objects kept in step with every change
+#Each listener has apply(record, removed) called after a change, where removed is the list of
+#transactions the change removed or replaced, and reset(transactions) called after a reload.
+listeners = [store, totals, search_index, duplicate_index, cube]
+
+
+def apply_record(transactions, record):
+    """Apply one change record to a transactions dictionary.
+    The same function is used for live changes and for replaying the journal, so both always agree.
+    Args:
+    - transactions: The transactions dictionary to change.
+    - record: A change record such as {'op': 'add', 'category': ..., 'rows': [[amount, date], ...]}.
+      The bulk records ('update_rows', 'delete_rows', 'move_rows') name many rows by their ascending indexes.
+      A {'op': 'batch', 'records': [...]} record applies each of its records in turn."""
+
+    op = record['op']
+    if op == 'batch': #-----------------------------------------------------------------------------Several changes written as one journal line
+        for batch_record in record['records']:
+            apply_record(transactions, batch_record)
+        return
+    category = record['category']
+
+    if op == 'add':
+        rows = transactions.get(category)
+        if rows is None:
+            rows = transactions[category] = []
+        rows.extend({'amount': amount, 'date': date} for amount, date in record['rows'])
+
+    elif op == 'update':
+        transactions[category][record['index']] = {'amount': record['amount'], 'date': record['date']}
+
+    elif op == 'delete':
+        del transactions[category][record['index']]
+
+    elif op == 'delete_category':
+        del transactions[category]
+
+    elif op == 'update_rows':
+        rows = transactions[category]
+        for index, (amount, date) in zip(record['indexes'], record['rows']):
+            rows[index] = {'amount': amount, 'date': date}
+
+    elif op in ('delete_rows', 'move_rows'): #---------------------------------------------------------One pass over the category, however many rows go
+        rows = transactions[category]
+        indexes = set(record['indexes'])
+        moved = [rows[index] for index in record['indexes']]
+        rows[:] = [transaction for index, transaction in enumerate(rows) if index not in indexes]
+        if op == 'move_rows':
+            new_rows = transactions.get(record['new_category'])
+            if new_rows is None:
+                new_rows = transactions[record['new_category']] = []
+            new_rows.extend(moved) #----------------------------------------------------------------The same transaction objects, added at the end
+
+    elif op == 'rename_category':
+        new_category = record['new_category']
+        if new_category in transactions: #--------------------------------------------------------Merge into the existing category
+            transactions[new_category].extend(transactions.pop(category))
+        else: #------------------------------------------------------------------------------------Rename the key but keep the category order
+            items = [(new_category if key == category else key, value) for key, value in transactions.items()]
+            transactions.clear()
+            transactions.update(items)
+
+    else:
+        raise ValueError(f"Unknown change record: {op}")
+
+
+def removed_rows(transactions, record):
+    """Get the transactions that a change record will remove or replace."""
+    op = record['op']
+    if op in ('update', 'delete'):
+        return [transactions[record['category']][record['index']]]
+    if op == 'delete_category':
+        return list(transactions[record['category']])
+    if op in ('update_rows', 'delete_rows', 'move_rows'):
+        rows = transactions[record['category']]
+        return [rows[index] for index in record['indexes']]
+    return []
+
+
+def apply_change(record):
+    """Apply a change record to the shared transactions dictionary and count the change.
+    Returns:
+    - The transactions the change removed or replaced."""
+
+    global version
+    removed = removed_rows(transactions, record)
+    apply_record(transactions, record)
+    version += 1
+    return removed
+
+
+def record_change(record):
+    """Apply a change to the shared transactions dictionary, write it to storage and notify the listeners.
+    Raises ConflictError if another process changed the same category since this process last looked,
+    as the record may point at rows that have moved. The latest transactions are loaded by then."""
+    record_changes([record])
+
+
+def record_changes(records):
+    """Apply several changes as one unit, like record_change.
+    They are written to storage with one append_batch call (a single journal line), so a crash never
+    leaves only some of them. If applying or writing them fails, every change since the last save is
+    dropped (see discard_changes) before the error is raised again."""
+
+    global unsaved, unsaved_rows
+    touched = begin_write()
+    for record in records:
+        if record['op'] != 'add' and (touched is None or record_categories(record) & touched):
+            end_write()
+            raise ConflictError(f"'{record['category']}' was changed by another instance. The latest transactions were loaded, please try again.")
+
+    try:
+        removed = [apply_change(record) for record in records]
+        if storage is not None:
+            storage.append_batch(records)
+    except BaseException:
+        discard_changes()
+        raise
+
+    for record, record_removed in zip(records, removed):
+        for listener in listeners:
+            listener.apply(record, record_removed)
+
+        if unsaved is not None:
+            unsaved_rows += len(record.get('rows', ())) + len(record.get('indexes', ()))
+            if unsaved_rows > FEED_ROW_LIMIT: #-----------------------------------------------------Too big to publish: the other processes reload instead
+                unsaved = None
+            else:
+                unsaved.append(published_record(record, record_removed))
+
+
+def published_record(record, removed):
+    """Get the copy of a change record that is published to the other processes.
+    Records that point at rows by position also carry the (amount, date) values of those rows, because
+    another process may hold the same rows in another order (partitioned storage loads every category
+    in month order). See local_record."""
+
+    if record['op'] not in INDEXED_OPS:
+        return record
+    return dict(record, values=[[transaction['amount'], transaction['date']] for transaction in removed])
+
+
+def local_record(record):
+    """Point a record published by another process at the rows of this process that have its values.
+    Returns:
+    - The record to apply here, or None if a row is missing (the caller loads everything again)."""
+
+    values = record.get('values')
+    if values is None:
+        return record
+    rows = transactions.get(record['category'])
+    if rows is None:
+        return None
+    single = 'index' in record
+    indexes = [record['index']] if single else record['indexes']
+    if all(index < len(rows) and rows[index]['amount'] == amount and rows[index]['date'] == date
+           for index, (amount, date) in zip(indexes, values)):
+        return record #-------------------------------------------------------------------------------Same order in both processes
+
+    positions = {} #---------------------------------------------------------------------------------(amount, date) -> indexes of the rows with those values
+    for index, transaction in enumerate(rows):
+        positions.setdefault((transaction['amount'], transaction['date']), []).append(index)
+    found = []
+    for amount, date in values:
+        candidates = positions.get((amount, date))
+        if not candidates:
+            return None
+        found.append(candidates.pop()) #---------------------------------------------------------------Rows with equal values are interchangeable
+
+    local = dict(record)
+    if single:
+        local['index'] = found[0]
+    else:
+        order = sorted(range(len(found)), key=found.__getitem__) #-------------------------------------Bulk records need ascending indexes
+        local['indexes'] = [found[position] for position in order]
+        if 'rows' in record:
+            local['rows'] = [record['rows'][position] for position in order]
+    return local
+
+
+def record_categories(record):
+    """Get the categories a change record touches."""
+    categories = {record['category']}
+    if 'new_category' in record:
+        categories.add(record['new_category'])
+    return categories
+
+
+def notify_reset():
+    """Tell the listeners that the whole dictionary was replaced."""
+    global version
+    version += 1
+    for listener in listeners:
+        listener.reset(transactions)
+
+
+def column_store():
+    """Get the column store, rebuilding it first if a change made it stale."""
+    if store.stale:
+        store.rebuild(transactions)
+    return store
+
+
+#---------------------------------------------------------------------------------------------------Sharing the storage with other processes
+def catch_up():
+    """Apply the changes other processes saved since this one last looked. Call while holding the lock.
+    Returns:
+    - The set of categories they changed, or None if everything was loaded again."""
+
+    records = feed.read_changes()
+    if records is None:
+        load(storage_filename)
+        return None
+
+    touched = set()
+    for record in records:
+        record = local_record(record)
+        if record is None: #------------------------------------------------------------------------The rows differ from the other process: start again from the storage
+            load(storage_filename)
+            return None
+        removed = apply_change(record)
+        storage.apply_external(record)
+        for listener in listeners:
+            listener.apply(record, removed)
+        touched |= record_categories(record)
+    return touched
+
+
+def begin_write():
+    """Take the exclusive storage lock for a change, catching up with other processes first.
+    Does nothing if the lock is already held for writing.
+    Returns:
+    - The set of categories other processes changed meanwhile, or None if everything was loaded again."""
+
+    if lock is None or lock.exclusive:
+        return set()
+    lock.acquire(exclusive=True)
+    try:
+        return catch_up()
+    except BaseException:
+        lock.release()
+        raise
+
+
+def end_write():
+    """Release the storage lock once there is nothing left to save outside an exclusive() block."""
+    if lock is not None and batch_depth == 0 and unsaved == []:
+        lock.release()
+
+
+@contextmanager
+def exclusive():
+    """Hold the storage lock for a read-modify-write sequence and save once at the end.
+    Other processes' changes are applied on entry, so indexes computed inside the block stay valid.
+    The outermost block is one unit: if it raises, or its save fails, its changes are dropped from
+    storage and memory (see discard_changes) and the error is raised again."""
+
+    global batch_depth
+    if batch_depth == 0 and lock is not None and lock.exclusive: #------------------------------------Save earlier changes first, so a failure only drops the block's own
+        save()
+    begin_write()
+    batch_depth += 1
+    try:
+        yield
+    except BaseException:
+        batch_depth -= 1
+        if batch_depth == 0:
+            discard_changes()
+        raise
+
+    batch_depth -= 1
+    if batch_depth == 0 and lock is not None and lock.exclusive:
+        try:
+            save()
+        except BaseException:
+            discard_changes()
+            raise
+
+
+def discard_changes():
+    """Drop every change made since the last save: roll back the storage backend and load the saved
+    transactions again. The lock is released unless an exclusive() block still holds it."""
+    if storage is None:
+        return
+    storage.rollback()
+    load(storage_filename)
+    end_write()
+
+
+def changed_elsewhere():
+    """Check with one stat call whether another process saved since the last load or refresh."""
+    return feed is not None and feed.changed()
+
+
+def refresh():
+    """Apply the changes other processes saved since the last load or refresh.
+    Costs one stat call when nothing changed, and reads only the new changes otherwise.
+    Returns:
+    - True if the transactions changed."""
+
+    if not changed_elsewhere() or lock.held:
+        return False
+    lock.acquire(exclusive=False)
+    try:
+        catch_up()
+    finally:
+        lock.release()
+    return True
+
+
+#---------------------------------------------------------------------------------------------------Change functions used by the CLI, the GUI and the importers
+def add_row(category, amount, date):
+    """Add one transaction to a category."""
+    record_change({'op': 'add', 'category': category, 'rows': [[amount, date]]})
+
+
+def add_rows(staged):
+    """Add a batch of transactions, given as {category: [(amount, date), ...]}.
+    The whole batch is stored as one unit, whatever the number of categories (see record_changes)."""
+    if staged:
+        record_changes([{'op': 'add', 'category': category, 'rows': rows} for category, rows in staged.items()])
+
+
+def update_row(category, index, amount, date):
+    """Replace the amount and date of the transaction at index in a category."""
+    record_change({'op': 'update', 'category': category, 'index': index, 'amount': amount, 'date': date})
+
+
+def delete_row(category, index):
+    """Delete the transaction at index in a category."""
+    record_change({'op': 'delete', 'category': category, 'index': index})
+
+
+def delete_category(category):
+    """Delete a category and all of its transactions."""
+    record_change({'op': 'delete_category', 'category': category})
+
+
+def rename_category(category, new_category):
+    """Rename a category, merging it into new_category if that already exists."""
+    if new_category != category:
+        record_change({'op': 'rename_category', 'category': category, 'new_category': new_category})
+
+
+def update_rows(category, indexes, rows):
+    """Replace the (amount, date) of the transactions at the given ascending indexes of a category."""
+    if indexes:
+        record_change({'op': 'update_rows', 'category': category, 'indexes': list(indexes), 'rows': list(rows)})
+
+
+def delete_rows(category, indexes):
+    """Delete the transactions at the given ascending indexes of a category."""
+    if indexes:
+        record_change({'op': 'delete_rows', 'category': category, 'indexes': list(indexes)})
+
+
+def move_rows(category, indexes, new_category):
+    """Move the transactions at the given ascending indexes to the end of new_category (created if needed)."""
+    if indexes and new_category != category:
+        record_change({'op': 'move_rows', 'category': category, 'indexes': list(indexes), 'new_category': new_category})
+
+
+#---------------------------------------------------------------------------------------------------Loading and saving
+def open_storage(filename):
+    """Create the storage backend for a file name: SQLite for .db/.sqlite files, monthly segments
+    for .parts folders, JSON otherwise."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return SqliteStorage(filename)
+    if extension == '.parts':
+        return PartitionedStorage(filename)
+    return TransactionJournal(filename)
+
+
+def migrate_json_to_sqlite(json_filename='transactions.json', db_filename='transactions.db'):
+    """Copy the JSON snapshot and journal into an SQLite database, if the database is still empty.
+    Returns:
+    - The number of transactions copied (0 if the database already had data)."""
+    return migrate_json(json_filename, SqliteStorage(db_filename))
+
+
+def migrate_json(json_filename, target):
+    """Copy the JSON snapshot and journal into an empty SQLite or partitioned storage backend.
+    Returns:
+    - The number of transactions copied (0 if the target already had data)."""
+
+    if not target.is_empty():
+        return 0
+
+    migrated = {}
+    TransactionJournal(json_filename).load(migrated, apply_record)
+    if migrated:
+        target.write_all(migrated)
+    return sum(len(category_transactions) for category_transactions in migrated.values())
+
+
+def load(filename=None):
+    """Load the shared transactions dictionary from storage.
+    A new SQLite database or partitioned folder is filled from 'transactions.json' the first time it is used.
+    Returns:
+    - transactions: The shared transactions dictionary."""
+
+    global storage, cube_filename, storage_filename, lock, feed, unsaved, unsaved_rows
+    if filename is None:
+        filename = STORAGE_FILENAME
+    if storage is not None:
+        storage.close()
+    if lock is None or lock.filename != filename + LOCK_SUFFIX:
+        if lock is not None:
+            lock.release()
+        lock = FileLock(filename + LOCK_SUFFIX)
+        feed = ChangeFeed(filename + FEED_SUFFIX)
+    storage_filename = filename
+    unsaved = []
+    unsaved_rows = 0
+
+    own_lock = not lock.held #----------------------------------------------------------------------Not already held by a catch up
+    if own_lock:
+        lock.acquire(exclusive=True)
+    try:
+        transactions.clear()
+        storage = open_storage(filename)
+        if isinstance(storage, (SqliteStorage, PartitionedStorage)) and storage.is_empty():
+            migrate_json('transactions.json', storage) #---------------------------------------------One-shot migration from the JSON file (if there is one)
+
+        try:
+            storage.load(transactions, apply_record)
+        except json.decoder.JSONDecodeError:
+            transactions.clear() #--------------------------------------------------------------------Start empty if the snapshot is corrupt
+            raise
+        finally:
+            notify_reset()
+            feed.skip_to_end()
+        cube_filename = filename + CUBE_SUFFIX
+        cube.use_saved(cube_filename, storage.stamp()) #-----------------------------------------------Reuse the saved cube if the storage has not changed since
+    finally:
+        if own_lock:
+            lock.release()
+    return transactions
+
+
+def save(filename=None):
+    """Make every change since the last save durable and publish it to the other processes.
+    Cost depends on the size of the changes.
+    Raises ConflictError if the storage was changed meanwhile by a process that did not take the lock.
+    The changes then stay unsaved; load (or discard_changes) before making more."""
+
+    global storage, unsaved, unsaved_rows
+    if storage is None: #-----------------------------------------------------------------------Nothing was loaded, so write everything
+        storage = open_storage(filename or STORAGE_FILENAME)
+        storage.write_all(transactions)
+        return
+    if not lock.exclusive:
+        if unsaved == []: #---------------------------------------------------------------------No change since the last save
+            storage.commit(transactions)
+            return
+        lock.acquire(exclusive=True) #--------------------------------------------------------------Retrying a failed save, which released the lock
+
+    try:
+        if feed.changed(): #----------------------------------------------------------------------Optimistic check: nobody saved since this process caught up
+            raise ConflictError(f"{storage_filename} was changed by a process that did not lock it. Reload before making more changes.")
+        storage.commit(transactions)
+        if unsaved is None or unsaved:
+            feed.publish(unsaved)
+        unsaved = [] #----------------------------------------------------------------------------Only once committed, a failed save keeps them for the retry
+        unsaved_rows = 0
+    finally:
+        if batch_depth == 0:
+            lock.release()
+
+
+def export_json(filename='transactions.json'):
+    """Write the shared transactions dictionary as pretty printed JSON (the import/export format)."""
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as file:
+        json.dump(transactions, file, indent=4)
+    os.replace(temp_filename, filename)
+
+
+def close():
+    """Save and close the storage backend, then save the rollup cube for the next start.
+    The lock is held throughout, so the cube is saved for exactly the stored transactions."""
+
+    global batch_depth
+    if storage is None:
+        return
+    begin_write()
+    batch_depth += 1 #------------------------------------------------------------------------------Keep the lock after the save
+    try:
+        save()
+        storage.close()
+        if cube_filename is not None:
+            cube.save(cube_filename, storage.stamp())
+    finally:
+        batch_depth -= 1
+        lock.release()
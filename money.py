@@ -0,0 +1,89 @@
+import os
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+#---------------------------------------------------------------------------------------------------Digits after the decimal point of the currency (2 = cents, 0 for currencies without minor units)
+#Amounts are counted exactly as integers of 10 ** -CURRENCY_DIGITS currency units ("minor units").
+#The transactions dictionary, the JSON files and SQLite keep the float from_minor(units) instead: it is the
+#double closest to the decimal amount, its repr is the decimal text ('12.34'), and to_minor gets the units
+#back exactly for any amount below 2 ** 53 minor units. So every total is added up in minor units while
+#transactions.json keeps the layout the menu and the GUI have always read and written.
+CURRENCY_DIGITS = int(os.environ.get('FINANCE_TRACKER_CURRENCY_DIGITS', '2'))
+SCALE = 10 ** CURRENCY_DIGITS #-----------------------------------------------------------------------Minor units per currency unit
+
+
+def parse_minor(text):
+    """Parse a decimal amount such as '-12.5' straight to integer minor units, without going through float.
+    Extra decimal places are rounded half away from zero ('1.005' is 101 cents).
+    Raises ValueError if the text is not a number."""
+
+    text = text.strip()
+    if '_' not in text: #-------------------------------------------------------------------------------Common cases '12.34' and '12': let int() do the work
+        dot = text.find('.')
+        try:
+            if dot < 0:
+                return int(text) * SCALE
+            if len(text) - dot == CURRENCY_DIGITS + 1 and text[dot + 1:].isdecimal(): #-------------------The whole part is checked by int(), but '.-1' would pass as -1
+                return int(text[:dot] + text[dot + 1:])
+        except ValueError:
+            pass
+
+    whole, dot, fraction = text.partition('.')
+    negative = whole.startswith('-')
+    if negative or whole.startswith('+'):
+        whole = whole[1:]
+
+    if (whole.isdigit() or (not whole and fraction)) and (not fraction or fraction.isdigit()):
+        try:
+            units = int(whole or '0') * SCALE
+            if fraction and CURRENCY_DIGITS:
+                units += int(fraction[:CURRENCY_DIGITS].ljust(CURRENCY_DIGITS, '0'))
+            if fraction[CURRENCY_DIGITS:CURRENCY_DIGITS + 1] >= '5': #--------------------------------Round on the first dropped digit
+                units += 1
+            return -units if negative else units
+        except ValueError: #-----------------------------------------------------------------------Digits that int() does not accept, such as '²'
+            pass
+
+    return decimal_to_minor(text) #------------------------------------------------------------------Exponents, underscores and other rare forms
+
+
+def decimal_to_minor(text):
+    """Slow path of parse_minor for any number format Decimal understands ('1e3', '1_000')."""
+    try:
+        value = Decimal(text.strip())
+    except InvalidOperation:
+        raise ValueError(f"could not convert string to amount: {text!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"amount must be a finite number: {text!r}")
+    try:
+        return int(value.scaleb(CURRENCY_DIGITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation: #----------------------------------------------------------------------More digits than the decimal context holds, e.g. '1e999'
+        raise ValueError(f"amount is too large: {text!r}") from None
+
+
+def from_minor(units):
+    """Convert minor units to the amount stored in the transactions dictionary (currency units).
+    The result is the float closest to the exact decimal value, so to_minor gives units back."""
+    return units / SCALE
+
+
+def to_minor(amount):
+    """Convert an amount from the transactions dictionary (int or float currency units) to minor units."""
+    units = round(amount * SCALE)
+    if units / SCALE == amount: #-------------------------------------------------------------------Always true for amounts made by from_minor
+        return units
+    return parse_minor(repr(amount)) #---------------------------------------------------------------Older data with more decimals: round its decimal text
+
+
+def parse_amount(text):
+    """Parse a decimal amount to the value stored in the transactions dictionary, rounded to the currency digits.
+    Raises ValueError if the text is not a number."""
+    return parse_minor(text) / SCALE
+
+
+def format_minor(units):
+    """Format minor units as fixed point text with the currency digits, e.g. 1230 -> '12.30'."""
+    sign = '-' if units < 0 else ''
+    whole, fraction = divmod(abs(units), SCALE)
+    if not CURRENCY_DIGITS:
+        return f"{sign}{whole}"
+    return f"{sign}{whole}.{fraction:0{CURRENCY_DIGITS}d}"
@@ -0,0 +1,164 @@
+import glob
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import ledger
+from bulk_import import parse_bulk_batch, write_rejects
+from duplicate_index import write_duplicates
+
+#---------------------------------------------------------------------------------------------------Parallel bulk import settings
+CHUNK_BYTES = 32 * 1024 * 1024 #--------------------------------------------------------------------Large files are split into pieces of about this size
+CHUNKS_PER_WORKER = 2 #-------------------------------------------------------------------------------Parsed chunks waiting to be merged, per worker
+
+
+def is_multi_file(pattern):
+    """Check if the user input names a folder or a glob pattern instead of a single file."""
+    return os.path.isdir(pattern) or glob.has_magic(pattern)
+
+
+def expand_bulk_paths(pattern):
+    """Get the sorted list of bulk files for a folder, glob pattern or single file name."""
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(pattern, '*.txt')))
+
+    if glob.has_magic(pattern):
+        return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+    return [pattern]
+
+
+def split_file(filename, chunk_bytes=CHUNK_BYTES):
+    """Split a file into (filename, start, end) byte ranges that begin and end on line boundaries."""
+    size = os.path.getsize(filename)
+    chunks = []
+    start = 0
+
+    with open(filename, 'rb') as file:
+        while start < size:
+            end = start + chunk_bytes
+
+            if end >= size:
+                end = size
+            else:
+                file.seek(end)
+                file.readline() #-------------------------------------------------------Move the split point to the end of the current line
+                end = file.tell()
+
+            chunks.append((filename, start, end))
+            start = end
+
+    return chunks
+
+
+def parse_chunk(chunk):
+    """Parse one byte range of a bulk file. Runs inside a worker process.
+    Args:
+    - chunk: A (filename, start, end) tuple from split_file.
+    Returns:
+    - (staged, rejects, line_count) where staged maps each expense type to a list of (amount, date) pairs,
+      rejects is a list of (line_number, line, reason) tuples numbered from 1 at the start of the chunk
+      and line_count is the number of lines in the chunk, so the caller can number them within the file."""
+
+    filename, start, end = chunk
+
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start).decode('utf-8')
+
+    lines = data.splitlines()
+    staged, rejects = parse_bulk_batch(lines, 1)
+    return staged, rejects, len(lines)
+
+
+def parse_chunks(pool, chunks, window):
+    """Parse chunks in a process pool and yield the results in chunk order.
+    At most window chunks are submitted ahead of the one being merged, so a large import never holds
+    more than window parsed chunks in memory."""
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(parse_chunk, chunk))
+        if len(pending) > window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def import_bulk_files(pattern, workers=None, chunk_bytes=CHUNK_BYTES, duplicates='keep', near_days=None):
+    """Import every bulk file matching a folder or glob pattern (or a list of them) into the shared transactions dictionary.
+
+    Files are split at line boundaries and parsed by a process pool. The results are merged
+    back in file and chunk order, so the transactions dictionary ends up exactly as if the
+    files had been imported one after another with read_bulk_transactions_from_file.
+    Malformed lines are written to '<file>.rejects' and duplicates found to '<file>.duplicates'.
+    Each file is checked for duplicates against everything stored before it, earlier files included.
+    Args:
+    - pattern: A folder, glob pattern or file name, or a list of them.
+    - workers: Number of worker processes (defaults to the number of CPUs).
+    - chunk_bytes: Approximate size of the pieces large files are split into.
+    - duplicates: 'keep', 'skip' or 'flag' rows already stored.
+    - near_days: Also treat rows with the same category and amount within this many days as duplicates.
+    Returns:
+    - A dictionary with the import statistics (files, rows, rejected, duplicates, near_duplicates, seconds, rows_per_sec)."""
+
+    start_time = time.perf_counter()
+    patterns = [pattern] if isinstance(pattern, str) else pattern
+    filenames = [filename for each_pattern in patterns for filename in expand_bulk_paths(each_pattern)]
+    stats = {'files': len(filenames), 'rows': 0, 'rejected': 0, 'duplicates': 0, 'near_duplicates': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+
+    chunks = []
+    for filename in filenames:
+        chunks.extend(split_file(filename, chunk_bytes))
+
+    if len(chunks) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = parse_chunks(pool, chunks, CHUNKS_PER_WORKER * (workers or os.cpu_count() or 1)) #--In chunk order, merged as they arrive
+    else:
+        pool = None
+        results = map(parse_chunk, chunks) #-------------------------------------------Not worth starting a pool for a single chunk
+
+    reject_files = {}
+    duplicate_files = {}
+    checks = {} #---------------------------------------------------------------------------------One duplicate check per file
+    line_numbers = {} #---------------------------------------------------------------------------File -> line number of its next chunk
+    try:
+        for (filename, chunk_start, chunk_end), (staged, rejects, line_count) in zip(chunks, results):
+            first_line = line_numbers.get(filename, 1)
+            line_numbers[filename] = first_line + line_count
+            if duplicates != 'keep':
+                check = checks.get(filename)
+                if check is None:
+                    check = checks[filename] = ledger.duplicate_index.check(near_days)
+                staged, found = check.filter(staged, duplicates)
+                if found:
+                    if filename not in duplicate_files:
+                        duplicate_files[filename] = open(filename + ".duplicates", 'w')
+                    write_duplicates(duplicate_files[filename], found)
+
+            ledger.add_rows(staged)
+            if duplicates != 'keep':
+                check.added_rows(staged)
+            stats['rows'] += sum(len(rows) for rows in staged.values())
+
+            if rejects:
+                if filename not in reject_files:
+                    reject_files[filename] = open(filename + ".rejects", 'w')
+                write_rejects(reject_files[filename], [(first_line + line_number - 1, line, reason) for line_number, line, reason in rejects])
+                stats['rejected'] += len(rejects)
+    finally:
+        for report_file in list(reject_files.values()) + list(duplicate_files.values()):
+            report_file.close()
+        if pool is not None:
+            pool.shutdown()
+
+    for check in checks.values():
+        stats['duplicates'] += check.stats['duplicates']
+        stats['near_duplicates'] += check.stats['near_duplicates']
+
+    stats['seconds'] = time.perf_counter() - start_time
+    if stats['seconds'] > 0:
+        stats['rows_per_sec'] = stats['rows'] / stats['seconds']
+
+    return stats
@@ -0,0 +1,378 @@
+import json
+import os
+
+from dates import date_sort_key, date_to_day, day_range
+from money import from_minor, parse_amount, to_minor
+from storage_backend import StorageBackend, file_stamp
+
+#---------------------------------------------------------------------------------------------------Files inside the storage folder
+CATEGORIES_FILENAME = 'categories.json' #------------------------------------------------------------Category order
+SEGMENT_SUFFIX = '.seg' #------------------------------------------------------------------------------One segment per month, e.g. '2024-01.seg'
+INVALID_MONTH = 'invalid' #---------------------------------------------------------------------------Segment for dates that are not in YYYY-MM-DD format
+
+#---------------------------------------------------------------------------------------------------Bytes read from the end of a segment when looking for its footer
+FOOTER_READ_SIZE = 64 * 1024
+
+
+def month_of(date_str, cache=None):
+    """Get the segment name ('YYYY-MM', or 'invalid') a date belongs to."""
+    if cache is not None:
+        month = cache.get(date_str)
+        if month is not None:
+            return month
+    try:
+        date_to_day(date_str)
+        month = date_str[:7]
+    except (TypeError, ValueError):
+        month = INVALID_MONTH
+    if cache is not None:
+        cache[date_str] = month
+    return month
+
+
+class PartitionedStorage(StorageBackend):
+    """Stores transactions in a folder with one segment file per month.
+
+    Each segment holds the rows of one month as JSON lines ([category, amount, date]) and ends with
+    a footer line that has the total, count, min and max of every category in that month. Month
+    totals are read from the footers alone, and date range queries only open the segments that
+    overlap the range.
+
+    Only the segments of months that changed are rewritten on commit, each one atomically, so past
+    months are left alone while new transactions arrive. When loaded, the transactions of a category
+    come back in month order (and in the order they were added within a month).
+    """
+
+    def __init__(self, folder='transactions.parts'):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.transactions = {}
+        self.reset_state()
+
+    def reset_state(self):
+        """Forget the in-memory view of the segments."""
+        self.categories = [] #------------------------------------------------------------------------Category order, as in the transactions dictionary
+        self.months = {} #---------------------------------------------------------------------------month -> {category: [transaction, ...]}
+        self.shadow = {} #---------------------------------------------------------------------------category -> list of the same transactions in dictionary order
+        self.month_cache = {}
+        self.dirty_months = set()
+        self.unordered = set() #------------------------------------------------------------------------(month, category) lists to put back in dictionary order before writing
+        self.categories_changed = False
+
+    #-----------------------------------------------------------------------------------------------Segment files
+    def segment_filename(self, month):
+        return os.path.join(self.folder, month + SEGMENT_SUFFIX)
+
+    def stored_months(self):
+        """Get the months that have a segment file, in date order (invalid dates last)."""
+        months = sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.folder) if name.endswith(SEGMENT_SUFFIX))
+        if INVALID_MONTH in months:
+            months.remove(INVALID_MONTH)
+            months.append(INVALID_MONTH)
+        return months
+
+    def read_footer(self, month):
+        """Read the footer of a segment without reading its rows.
+        Returns:
+        - {category: [total, count, min, max]}."""
+
+        with open(self.segment_filename(month), 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            read_size = FOOTER_READ_SIZE
+            while True:
+                start = max(0, size - read_size)
+                file.seek(start)
+                tail = file.read(size - start).rstrip(b'\n')
+                newline = tail.rfind(b'\n')
+                if newline >= 0 or start == 0:
+                    return json.loads(tail[newline + 1:], parse_float=parse_amount)['footer']
+                read_size *= 2 #------------------------------------------------------------------------Footer is longer than the block read, read more
+
+    def read_segment(self, month):
+        """Yield the (category, amount, date) rows of a segment."""
+        with open(self.segment_filename(month), 'r') as file:
+            for line in file:
+                if line.startswith('{'): #----------------------------------------------------------Footer line
+                    break
+                yield tuple(json.loads(line, parse_float=parse_amount))
+
+    def write_segment(self, month, positions=None):
+        """Write the segment of a month from memory (or remove it if the month is empty).
+        positions caches {category: {id(transaction): position}} across the segments of one commit."""
+        filename = self.segment_filename(month)
+        month_rows = self.months.get(month)
+        if not month_rows:
+            self.months.pop(month, None)
+            if os.path.exists(filename):
+                os.remove(filename)
+            return
+
+        footer = {}
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            for category in self.categories:
+                category_rows = month_rows.get(category)
+                if not category_rows:
+                    continue
+                if (month, category) in self.unordered:
+                    if positions is None:
+                        positions = {}
+                    category_positions = positions.get(category)
+                    if category_positions is None:
+                        category_positions = positions[category] = {id(transaction): position for position, transaction in enumerate(self.shadow[category])}
+                    category_rows.sort(key=lambda transaction: category_positions[id(transaction)])
+                amounts = [to_minor(transaction['amount']) for transaction in category_rows] #----------Exact totals in minor units
+                footer[category] = [from_minor(sum(amounts)), len(amounts), from_minor(min(amounts)), from_minor(max(amounts))]
+                file.writelines(json.dumps([category, transaction['amount'], transaction['date']]) + '\n'
+                                for transaction in category_rows)
+            file.write(json.dumps({'footer': footer}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_filename, filename)
+
+    def write_categories(self):
+        """Write the category order file atomically."""
+        filename = os.path.join(self.folder, CATEGORIES_FILENAME)
+        with open(filename + '.tmp', 'w') as file:
+            json.dump(self.categories, file)
+        os.replace(filename + '.tmp', filename)
+
+    def read_categories(self):
+        try:
+            with open(os.path.join(self.folder, CATEGORIES_FILENAME), 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return []
+
+    #-----------------------------------------------------------------------------------------------In-memory view of the segments
+    def index_transaction(self, category, transaction):
+        """Add a transaction to the end of its month."""
+        month = month_of(transaction['date'], self.month_cache)
+        self.months.setdefault(month, {}).setdefault(category, []).append(transaction)
+        self.dirty_months.add(month)
+
+    def unindex_transaction(self, category, transaction):
+        """Remove a transaction from its month."""
+        month = month_of(transaction['date'], self.month_cache)
+        category_rows = self.months[month][category]
+        for position in range(len(category_rows) - 1, -1, -1): #----------------------------------Look for this exact object (equal rows may exist)
+            if category_rows[position] is transaction:
+                del category_rows[position]
+                break
+        if not category_rows:
+            del self.months[month][category]
+        self.dirty_months.add(month)
+
+    def unindex_transactions(self, category, transactions):
+        """Remove many transactions of a category from their months, filtering each month once."""
+        by_month = {}
+        for transaction in transactions:
+            by_month.setdefault(month_of(transaction['date'], self.month_cache), set()).add(id(transaction))
+        for month, ids in by_month.items():
+            month_rows = self.months[month]
+            category_rows = [transaction for transaction in month_rows[category] if id(transaction) not in ids]
+            if category_rows:
+                month_rows[category] = category_rows
+            else:
+                del month_rows[category]
+            self.dirty_months.add(month)
+
+    def remove_shadow_rows(self, category, indexes):
+        """Take the transactions at ascending indexes out of a category's shadow list."""
+        shadow = self.shadow[category]
+        removed = [shadow[index] for index in indexes]
+        indexes = set(indexes)
+        shadow[:] = [transaction for index, transaction in enumerate(shadow) if index not in indexes]
+        self.unindex_transactions(category, removed)
+        return removed
+
+    #-----------------------------------------------------------------------------------------------StorageBackend methods
+    def is_empty(self):
+        """Check whether the folder has no categories yet."""
+        return not self.read_categories()
+
+    def load(self, transactions, apply_record):
+        """Fill the transactions dictionary from every segment."""
+        self.reset_state()
+        self.categories = self.read_categories()
+        for category in self.categories:
+            transactions[category] = []
+            self.shadow[category] = []
+
+        for month in self.stored_months():
+            month_rows = self.months[month] = {}
+            for category, amount, date in self.read_segment(month):
+                transaction = {'amount': amount, 'date': date}
+                transactions[category].append(transaction)
+                self.shadow[category].append(transaction)
+                category_rows = month_rows.get(category)
+                if category_rows is None:
+                    category_rows = month_rows[category] = []
+                category_rows.append(transaction)
+
+        self.transactions = transactions
+        return 0
+
+    def append(self, record):
+        """Route a change record to the months it touches (written on the next commit)."""
+        op = record['op']
+        category = record['category']
+
+        if op == 'add':
+            if category not in self.shadow:
+                self.shadow[category] = []
+                self.categories.append(category)
+                self.categories_changed = True
+            added = self.transactions[category][len(self.transactions[category]) - len(record['rows']):]
+            self.shadow[category].extend(added)
+            for transaction in added:
+                self.index_transaction(category, transaction)
+
+        elif op == 'update':
+            index = record['index']
+            old = self.shadow[category][index]
+            new = self.transactions[category][index]
+            self.shadow[category][index] = new
+            old_month = month_of(old['date'], self.month_cache)
+            if old_month == month_of(new['date'], self.month_cache):
+                category_rows = self.months[old_month][category] #------------------------------Same month: replace in place to keep the order
+                category_rows[next(position for position, row in enumerate(category_rows) if row is old)] = new
+                self.dirty_months.add(old_month)
+            else:
+                self.unindex_transaction(category, old)
+                self.index_transaction(category, new)
+                self.unordered.add((month_of(new['date'], self.month_cache), category)) #------The row was added at the end of its new month
+
+        elif op == 'delete':
+            self.unindex_transaction(category, self.shadow[category].pop(record['index']))
+
+        elif op == 'update_rows':
+            shadow = self.shadow[category]
+            new_rows = self.transactions[category]
+            self.unindex_transactions(category, [shadow[index] for index in record['indexes']])
+            for index in record['indexes']:
+                shadow[index] = new_rows[index]
+                self.index_transaction(category, shadow[index])
+                self.unordered.add((month_of(shadow[index]['date'], self.month_cache), category)) #--Added at the end of their months
+
+        elif op == 'delete_rows':
+            self.remove_shadow_rows(category, record['indexes'])
+
+        elif op == 'move_rows':
+            new_category = record['new_category']
+            moved = self.remove_shadow_rows(category, record['indexes'])
+            if new_category not in self.shadow:
+                self.shadow[new_category] = []
+                self.categories.append(new_category)
+                self.categories_changed = True
+            self.shadow[new_category].extend(moved)
+            for transaction in moved:
+                self.index_transaction(new_category, transaction)
+
+        elif op == 'delete_category':
+            for month, month_rows in self.months.items():
+                if month_rows.pop(category, None) is not None:
+                    self.dirty_months.add(month)
+            del self.shadow[category]
+            self.unordered = {(month, name) for month, name in self.unordered if name != category}
+            self.categories.remove(category)
+            self.categories_changed = True
+
+        elif op == 'rename_category':
+            new_category = record['new_category']
+            merge = new_category in self.shadow
+            for month, month_rows in self.months.items():
+                category_rows = month_rows.pop(category, None)
+                if category_rows is not None:
+                    month_rows.setdefault(new_category, []).extend(category_rows)
+                    self.dirty_months.add(month)
+
+            self.unordered = {(month, new_category if name == category else name) for month, name in self.unordered}
+            if merge:
+                self.shadow[new_category].extend(self.shadow.pop(category))
+                self.categories.remove(category)
+            else:
+                self.shadow[new_category] = self.shadow.pop(category)
+                self.categories[self.categories.index(category)] = new_category
+            self.categories_changed = True
+
+        else:
+            raise ValueError(f"Unknown change record: {op}")
+
+    def apply_external(self, record):
+        """Update the in-memory view for a change another process has already written to the segments."""
+        dirty_months = set(self.dirty_months)
+        self.append(record)
+        self.dirty_months = dirty_months #---------------------------------------------------------------The files already hold the change
+        self.categories_changed = False
+
+    def commit(self, transactions=None):
+        """Rewrite the segments of the months that changed since the last commit."""
+        if self.categories_changed:
+            self.write_categories()
+            self.categories_changed = False
+        positions = {} #-----------------------------------------------------------------------------Shared by every month that has to be put back in order
+        for month in sorted(self.dirty_months):
+            self.write_segment(month, positions)
+        self.unordered = {(month, category) for month, category in self.unordered if month not in self.dirty_months} #--Kept for months another process wrote
+        self.dirty_months = set()
+
+    def rollback(self):
+        """Forget the changes since the last commit. Nothing is written before a commit, so only the
+        in-memory view has to go; it is rebuilt by the next load."""
+        self.reset_state()
+
+    def write_all(self, transactions):
+        """Replace every segment with the contents of the transactions dictionary."""
+        self.reset_state()
+        self.transactions = transactions
+        self.categories = list(transactions)
+        for category, category_transactions in transactions.items():
+            self.shadow[category] = list(category_transactions)
+            for transaction in category_transactions:
+                self.index_transaction(category, transaction)
+
+        for month in self.stored_months(): #-----------------------------------------------------------Remove segments of months that no longer have rows
+            if month not in self.months:
+                os.remove(self.segment_filename(month))
+        self.categories_changed = True
+        self.commit()
+
+    def iter_rows(self, category=None, start_date=None, end_date=None):
+        """Yield stored (category, amount, date) rows, opening only the segments inside the date range."""
+        dated = start_date is not None or end_date is not None
+        first_day, last_day = day_range(start_date, end_date)
+        for month in self.stored_months():
+            if dated and (month == INVALID_MONTH
+                          or (start_date is not None and month < start_date[:7])
+                          or (end_date is not None and month > end_date[:7])):
+                continue
+            for row in self.read_segment(month):
+                if category is not None and row[0] != category:
+                    continue
+                if dated and not first_day <= date_sort_key(row[2]) <= last_day:
+                    continue
+                yield row
+
+    def month_totals(self, start_month=None, end_month=None):
+        """Get {month: {category: total}} from the segment footers, without reading any rows.
+        start_month and end_month ('YYYY-MM') limit the months returned (inclusive)."""
+
+        totals = {}
+        for month in self.stored_months():
+            if month == INVALID_MONTH:
+                continue
+            if (start_month is not None and month < start_month) or (end_month is not None and month > end_month):
+                continue
+            totals[month] = {category: values[0] for category, values in self.read_footer(month).items()}
+        return totals
+
+    def stamp(self):
+        """Get the stamp of the category file and every segment."""
+        names = sorted(name for name in os.listdir(self.folder) if name == CATEGORIES_FILENAME or name.endswith(SEGMENT_SUFFIX))
+        return file_stamp([os.path.join(self.folder, name) for name in names])
+
+    def close(self):
+        """Write any months that changed since the last commit."""
+        self.commit()
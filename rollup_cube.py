@@ -0,0 +1,279 @@
+import json
+import os
+
+from dates import date_to_day, day_to_date
+from money import CURRENCY_DIGITS, to_minor
+
+#---------------------------------------------------------------------------------------------------Time levels of the cube, finest first
+LEVELS = ('day', 'week', 'month', 'year')
+
+#---------------------------------------------------------------------------------------------------The cube is saved next to the storage as '<storage file name>.cube'
+CUBE_SUFFIX = '.cube'
+
+
+def period_label(level, period):
+    """Get the label of a period number: 'YYYY-MM-DD' for days and weeks (the Monday), 'YYYY-MM' or 'YYYY'."""
+    if level in ('day', 'week'):
+        return day_to_date(period)
+    if level == 'month':
+        return f"{1970 + period // 12:04d}-{period % 12 + 1:02d}"
+    return f"{period:04d}"
+
+
+def period_step(level):
+    """Get the distance between two consecutive period numbers of a level."""
+    return 7 if level == 'week' else 1
+
+
+def day_periods(day):
+    """Get the (day, week, month, year) period numbers of a day number.
+    Weeks are numbered by the day number of their Monday and months by months since 1970-01."""
+    date_str = day_to_date(day)
+    year = int(date_str[:4])
+    return day, day - (day + 3) % 7, (year - 1970) * 12 + int(date_str[5:7]) - 1, year #------------1970-01-01 was a Thursday
+
+
+def downsample(values, width):
+    """Reduce a series to at most width buckets, one per pixel column.
+    Returns:
+    - A list of (minimum, maximum, sum, count) per bucket. Keeping the minimum and maximum of
+      every bucket keeps single spikes visible however many periods share a pixel."""
+
+    if width <= 0 or not values:
+        return []
+    if len(values) <= width:
+        return [(value, value, value, 1) for value in values]
+
+    buckets = []
+    for column in range(width):
+        part = values[column * len(values) // width:(column + 1) * len(values) // width]
+        buckets.append((min(part), max(part), sum(part), len(part)))
+    return buckets
+
+
+class RollupCube:
+    """Precomputed totals by category and by day, week, month and year.
+
+    Every cell holds [money out, money in, count] in minor units: positive amounts are counted as
+    money out (spent) and negative amounts as money in, so the net total of a cell is out - in.
+    The cube is kept in step through the ledger listener methods and saved next to the storage,
+    so trend and cash flow views over many years read a few thousand cells instead of every
+    transaction. Transactions with invalid dates are left out.
+
+    The saved file starts with a header line holding the stamp of the storage it belongs to (see
+    StorageBackend.stamp). A load only checks that header; the cells are read on first use.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.stale = True
+        self.saved = None #--------------------------------------------------------------------------(filename, stamp) of a cube file that matches the transactions
+
+    def clear(self):
+        self.cells = {level: {} for level in LEVELS} #-------------------------------------------------level -> {period: {category: [out, in, count]}}
+        self.period_cache = {} #-----------------------------------------------------------------------Date text -> (day, week, month, year) periods, or None if invalid
+        self.minor_cache = {}
+
+    def rebuild(self):
+        """Build the cube from the transactions dictionary."""
+        self.clear()
+        for category, category_transactions in self.transactions.items():
+            self.add_rows(category, ((transaction['amount'], transaction['date']) for transaction in category_transactions))
+        self.stale = False
+
+    def ensure_built(self):
+        """Read the saved cube, or build it from the transactions if there is no matching file."""
+        if self.stale:
+            if self.saved is None or not self.restore(*self.saved):
+                self.rebuild()
+
+    def periods_of(self, date_str):
+        """Get the (day, week, month, year) periods of a date, or None if it is not a valid YYYY-MM-DD date."""
+        periods = self.period_cache.get(date_str, False)
+        if periods is False:
+            try:
+                periods = day_periods(date_to_day(date_str))
+            except (TypeError, ValueError):
+                periods = None
+            self.period_cache[date_str] = periods
+        return periods
+
+    def add_cell(self, level, period, category, out, received, count):
+        """Add to one cell, removing the cell once it holds no transactions."""
+        categories = self.cells[level].get(period)
+        if categories is None:
+            categories = self.cells[level][period] = {}
+        cell = categories.get(category)
+        if cell is None:
+            cell = categories[category] = [0, 0, 0]
+        cell[0] += out
+        cell[1] += received
+        cell[2] += count
+        if not cell[2]:
+            del categories[category]
+            if not categories:
+                del self.cells[level][period]
+
+    def add_rows(self, category, rows, sign=1):
+        """Add (sign=1) or remove (sign=-1) (amount, date) rows of one category.
+        Rows are added up per date first, so every level is touched once per date instead of once per row."""
+
+        minor_cache = self.minor_cache
+        dates = {}
+        for amount, date_str in rows:
+            units = minor_cache.get(amount)
+            if units is None:
+                units = minor_cache[amount] = to_minor(amount)
+            cell = dates.get(date_str)
+            if cell is None:
+                cell = dates[date_str] = [0, 0, 0]
+            if units >= 0:
+                cell[0] += units
+            else:
+                cell[1] -= units
+            cell[2] += 1
+
+        for date_str, (out, received, count) in dates.items():
+            periods = self.periods_of(date_str)
+            if periods is None:
+                continue
+            for level, period in zip(LEVELS, periods):
+                self.add_cell(level, period, category, sign * out, sign * received, sign * count)
+
+    #-----------------------------------------------------------------------------------------------Ledger listener methods
+    def apply(self, record, removed):
+        """Update the cube for one ledger change record.
+        A cube that was not used yet is read from its saved file first and the change applied to it,
+        so close() can save it again without rebuilding it from every transaction."""
+        if self.stale:
+            if self.saved is None or not self.restore(*self.saved):
+                self.saved = None #-----------------------------------------------------------------Nothing to start from, rebuild on next use
+                return
+        self.saved = None #-------------------------------------------------------------------------The saved file no longer matches the transactions
+
+        op = record['op']
+        category = record['category']
+
+        if op == 'add':
+            self.add_rows(category, record['rows'])
+        elif op == 'update':
+            self.add_rows(category, [(removed[0]['amount'], removed[0]['date'])], -1)
+            self.add_rows(category, [(record['amount'], record['date'])])
+        elif op in ('delete', 'delete_category', 'delete_rows'):
+            self.add_rows(category, ((transaction['amount'], transaction['date']) for transaction in removed), -1)
+        elif op == 'update_rows':
+            self.add_rows(category, ((transaction['amount'], transaction['date']) for transaction in removed), -1)
+            self.add_rows(category, record['rows'])
+        elif op == 'move_rows':
+            rows = [(transaction['amount'], transaction['date']) for transaction in removed]
+            self.add_rows(category, rows, -1)
+            self.add_rows(record['new_category'], rows)
+        elif op == 'rename_category':
+            new_category = record['new_category']
+            for level in LEVELS:
+                for period, categories in self.cells[level].items():
+                    cell = categories.pop(category, None)
+                    if cell is not None:
+                        merged = categories.get(new_category)
+                        categories[new_category] = cell if merged is None else [a + b for a, b in zip(merged, cell)]
+
+    def reset(self, transactions):
+        """Drop the cube after the whole dictionary was replaced. It is read from its file or rebuilt on next use."""
+        self.transactions = transactions
+        self.stale = True
+        self.saved = None
+
+    #-----------------------------------------------------------------------------------------------Queries
+    def series(self, level, category=None, start=None, end=None):
+        """Get the totals of every period of a level in date order, including empty periods.
+        Args:
+        - level: One of 'day', 'week', 'month' or 'year'.
+        - category: Only count this category (None for every category).
+        - start, end: Optional first and last period numbers (inclusive).
+        Returns:
+        - A list of (period, out, in, count) tuples, amounts in minor units."""
+
+        self.ensure_built()
+        totals = {}
+        for period, categories in self.cells[level].items():
+            if (start is not None and period < start) or (end is not None and period > end):
+                continue
+            if category is None:
+                cells = categories.values()
+            else:
+                cells = [categories[category]] if category in categories else []
+            for cell in cells:
+                total = totals.get(period)
+                if total is None:
+                    totals[period] = list(cell)
+                else:
+                    total[0] += cell[0]
+                    total[1] += cell[1]
+                    total[2] += cell[2]
+
+        if not totals:
+            return []
+        step = period_step(level)
+        empty = (0, 0, 0)
+        return [(period,) + tuple(totals.get(period, empty))
+                for period in range(min(totals) if start is None else start, (max(totals) if end is None else end) + 1, step)]
+
+    #-----------------------------------------------------------------------------------------------Saving next to the storage
+    def read_header(self, filename):
+        """Read the header line of a saved cube, or None if the file is missing or unreadable."""
+        try:
+            with open(filename, 'r') as file:
+                return json.loads(file.readline())
+        except (OSError, ValueError):
+            return None
+
+    def use_saved(self, filename, stamp):
+        """Use the saved cube (on first use) if it was saved for this exact storage state.
+        Returns:
+        - True if the file matches the storage, False if the cube will be rebuilt instead."""
+
+        header = self.read_header(filename) if stamp is not None else None
+        if header is None or header.get('stamp') != stamp or header.get('currency_digits') != CURRENCY_DIGITS:
+            return False
+        self.saved = (filename, stamp)
+        return True
+
+    def save(self, filename, stamp):
+        """Write the cells of every level with the storage stamp they belong to.
+        Skipped when the file already matches or the storage has no stamp."""
+
+        if stamp is None or self.saved == (filename, stamp):
+            return
+        self.ensure_built()
+        cells = {level: [[period, category] + cell for period, categories in self.cells[level].items() for category, cell in categories.items()]
+                 for level in LEVELS}
+        with open(filename + '.tmp', 'w') as file:
+            file.write(json.dumps({'stamp': stamp, 'currency_digits': CURRENCY_DIGITS}) + '\n')
+            json.dump(cells, file, separators=(',', ':'))
+        os.replace(filename + '.tmp', filename)
+        self.saved = (filename, stamp)
+
+    def restore(self, filename, stamp):
+        """Read the cells of a saved cube.
+        Returns:
+        - True if the cube was restored, False if it has to be rebuilt (missing, outdated or unreadable file)."""
+
+        try:
+            with open(filename, 'r') as file:
+                header = json.loads(file.readline())
+                cells = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if header.get('stamp') != stamp or header.get('currency_digits') != CURRENCY_DIGITS:
+            return False
+
+        self.clear()
+        for level in LEVELS:
+            level_cells = self.cells[level]
+            for period, category, out, received, count in cells[level]:
+                categories = level_cells.get(period)
+                if categories is None:
+                    categories = level_cells[period] = {}
+                categories[category] = [out, received, count]
+        self.stale = False
+        return True
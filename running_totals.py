@@ -0,0 +1,137 @@
+from money import format_minor, to_minor
+
+
+class RunningTotals:
+    """Per-category and per-month totals that are updated on every change.
+
+    The totals are kept in step through the ledger listener methods, so a summary only
+    has to read one number per category instead of adding up every transaction. Totals are
+    integers of minor units (see money), so any number of changes adds up without drift.
+    """
+
+    def __init__(self):
+        self.category_totals = {} #-------------------------------------------------------------------{category: total in minor units}
+        self.category_counts = {} #-------------------------------------------------------------------{category: number of transactions}
+        self.month_totals = {} #----------------------------------------------------------------------{'YYYY-MM': {category: total in minor units}}
+
+    def add(self, category, amount, date, sign=1):
+        """Add (sign=1) or remove (sign=-1) one transaction from the totals."""
+        amount = to_minor(amount)
+        self.category_totals[category] = self.category_totals.get(category, 0) + sign * amount
+        self.category_counts[category] = self.category_counts.get(category, 0) + sign
+
+        month = self.month_totals.get(date[:7])
+        if month is None:
+            month = self.month_totals[date[:7]] = {}
+        month[category] = month.get(category, 0) + sign * amount
+
+    def apply(self, record, removed):
+        """Update the totals for one ledger change record."""
+        op = record['op']
+        category = record['category']
+
+        if op == 'add':
+            if category not in self.category_totals: #--------------------------------------------------Keep new categories in dictionary order
+                self.category_totals[category] = 0
+                self.category_counts[category] = 0
+            for amount, date in record['rows']:
+                self.add(category, amount, date)
+
+        elif op == 'update':
+            self.add(category, removed[0]['amount'], removed[0]['date'], -1)
+            self.add(category, record['amount'], record['date'])
+
+        elif op == 'delete':
+            self.add(category, removed[0]['amount'], removed[0]['date'], -1)
+
+        elif op in ('update_rows', 'delete_rows', 'move_rows'):
+            for transaction in removed:
+                self.add(category, transaction['amount'], transaction['date'], -1)
+            if op == 'update_rows':
+                for amount, date in record['rows']:
+                    self.add(category, amount, date)
+            elif op == 'move_rows':
+                new_category = record['new_category']
+                if new_category not in self.category_totals:
+                    self.category_totals[new_category] = 0
+                    self.category_counts[new_category] = 0
+                for transaction in removed:
+                    self.add(new_category, transaction['amount'], transaction['date'])
+
+        elif op == 'delete_category':
+            del self.category_totals[category]
+            del self.category_counts[category]
+            for month in self.month_totals.values():
+                month.pop(category, None)
+
+        elif op == 'rename_category':
+            self.rename(category, record['new_category'])
+
+    def rename(self, category, new_category):
+        """Move the totals of a category to its new name, merging if the new name exists."""
+        for totals in [self.category_totals, self.category_counts] + list(self.month_totals.values()):
+            if category not in totals:
+                continue
+            if new_category in totals:
+                totals[new_category] += totals.pop(category)
+            elif totals is self.category_totals or totals is self.category_counts:
+                items = [(new_category if key == category else key, value) for key, value in totals.items()]
+                totals.clear()
+                totals.update(items)
+            else:
+                totals[new_category] = totals.pop(category)
+
+    def reset(self, transactions):
+        """Recompute every total from the transactions dictionary."""
+        self.category_totals, self.category_counts, self.month_totals = compute_totals(transactions)
+
+    def check(self, transactions):
+        """Recompute the totals from scratch and compare them with the maintained totals.
+        Returns:
+        - A list of mismatch descriptions (empty when everything matches)."""
+
+        category_totals, category_counts, month_totals = compute_totals(transactions)
+        mismatches = []
+
+        for category in set(category_totals) | set(self.category_totals):
+            expected = category_totals.get(category, 0)
+            actual = self.category_totals.get(category, 0)
+            if expected != actual:
+                mismatches.append(f"{category}: total is {format_minor(actual)}, expected {format_minor(expected)}")
+            if category_counts.get(category, 0) != self.category_counts.get(category, 0):
+                mismatches.append(f"{category}: count is {self.category_counts.get(category, 0)}, expected {category_counts.get(category, 0)}")
+
+        for month in set(month_totals) | set(self.month_totals):
+            expected_month = month_totals.get(month, {})
+            actual_month = self.month_totals.get(month, {})
+            for category in set(expected_month) | set(actual_month):
+                expected = expected_month.get(category, 0)
+                actual = actual_month.get(category, 0)
+                if expected != actual:
+                    mismatches.append(f"{category} in {month}: total is {format_minor(actual)}, expected {format_minor(expected)}")
+
+        return mismatches
+
+
+def compute_totals(transactions):
+    """Compute (category_totals, category_counts, month_totals) in minor units from the transactions dictionary."""
+    category_totals = {}
+    category_counts = {}
+    month_totals = {}
+    minor_cache = {} #----------------------------------------------------------------------------------Amount -> minor units, amounts repeat a lot
+
+    for category, category_transactions in transactions.items():
+        category_totals[category] = 0
+        category_counts[category] = len(category_transactions)
+
+        for transaction in category_transactions:
+            amount = minor_cache.get(transaction['amount'])
+            if amount is None:
+                amount = minor_cache[transaction['amount']] = to_minor(transaction['amount'])
+            category_totals[category] += amount
+            month = month_totals.get(transaction['date'][:7])
+            if month is None:
+                month = month_totals[transaction['date'][:7]] = {}
+            month[category] = month.get(category, 0) + amount
+
+    return category_totals, category_counts, month_totals
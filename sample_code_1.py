@@ -1,7 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import json
-from datetime import datetime 
+import ledger
+import aggregation
+import bulk_edit
+import instrumentation
+from background_worker import BackgroundWorker
+from column_store import ColumnStore
+from dates import date_sort_key, date_to_day
+from money import format_minor, parse_amount, to_minor
+from rollup_cube import LEVELS, downsample, period_label
+
+#---------------------------------------------------------------------------------------------------------------------------------Number of rows shown in the table at a time
+PAGE_SIZE = 20
+
+#-------------------------------------------------------------------------------------------------------Milliseconds between checks for changes saved by other instances
+CHANGE_POLL_MS = 2000
+
+#---------------------------------------------------------------------------------------------------------------------------------Trend and cash flow chart settings
+CHART_WIDTH = 640
+CHART_HEIGHT = 320
+CHART_MARGIN = 60 #-------------------------------------------------------------------------------------------------------------Room for the axis labels around the plot
+CHART_VIEWS = ['Trend', 'Cash flow']
+ALL_CATEGORIES = 'All categories'
 
 # Transaction class to represent a single transaction
 class Transaction:
@@ -13,14 +34,23 @@ class Transaction:
         
 # FinanceTrackerGUI class for creating the graphical user interfaceclass FinanceTrackerGUI:
 class FinanceTrackerGUI:  
-    def __init__(self, root):
+    def __init__(self, root, transactions=None):
         self.root = root
         self.root.title("Personal Finance Tracker")
+        self.worker = BackgroundWorker(self.root, on_busy=self.show_busy) #------------------------------------------------------Runs loading, searching, sorting and summaries off the UI thread
         self.create_widgets()
-        self.transactions = self.load_transactions("transactions.json") #------------------------------------------------------------Load transactions from a JSON file
-        self.display_transactions(self.transactions)
         self.sort_column = None #------------------------------------------------------------------------------------------------Variable to store the column to sort by
         self.sort_reverse = False #-----------------------------------------------------------------------------------------------------Variable to store the sort order
+        self.render_table() #--------------------------------------------------------------------------------------------------------Show the empty table until the data is ready
+
+        if transactions is None:
+            self.transactions = ledger.transactions
+            self.status_var.set("Loading transactions...")
+            self.worker.submit('refresh', self.load_in_background, self.finish_refresh, ledger.STORAGE_FILENAME) #---------Load transactions from the configured storage
+        else:
+            self.transactions = transactions
+            self.refresh_transactions()
+        self.root.after(CHANGE_POLL_MS, self.watch_changes)
 
     def create_widgets(self):
         '''Create all the widgets for the GUI'''
@@ -34,7 +64,9 @@ class FinanceTrackerGUI:
         transactions_frame.pack(pady=10)
 
         #---------------------------------------------------------------------------------------------------------------------------Treeview for displaying transactions
-        self.transactions_tree = ttk.Treeview(transactions_frame, columns=('Category','Date','Amount'))
+        #Only PAGE_SIZE rows exist in the Treeview. Scrolling changes which rows of the table model they show,
+        #so the widget stays the same size no matter how many transactions there are.
+        self.transactions_tree = ttk.Treeview(transactions_frame, columns=('Category','Date','Amount'), height=PAGE_SIZE)
         self.transactions_tree.column("#0", width=0, stretch=tk.NO)
         self.transactions_tree.heading("#0", text="", anchor=tk.W)
         self.transactions_tree.heading('Category', text='Category')
@@ -43,9 +75,21 @@ class FinanceTrackerGUI:
         self.transactions_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True) #----------------------------------------Pack the Treeview to the left side of the frame and fill the frame
         
         #-------------------------------------------------------------------------------------------------------------------------------------Scrollbar for the Treeview
-        scrollbar = ttk.Scrollbar(transactions_frame, orient="vertical", command=self.transactions_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.transactions_tree.configure(yscrollcommand=scrollbar.set) #-----------------------------------------------------Configure the Treeview to use the scrollbar
+        self.scrollbar = ttk.Scrollbar(transactions_frame, orient="vertical", command=self.scroll_table)
+        self.scrollbar.pack(side="right", fill="y")
+
+        #------------------------------------------------------------------------------------------------------------------------------Create the fixed set of table rows
+        self.table_items = [self.transactions_tree.insert("", 'end', values=("", "", "")) for _ in range(PAGE_SIZE)]
+        self.table_rows = [] #-------------------------------------------------------------------------------------------------------Table model, rows are (category, date, amount)
+        self.table_order = None #-------------------------------------------------------------------------------------------------List of model rows in display order, None for model order
+        self.table_offset = 0 #---------------------------------------------------------------------------------------------------Model row shown in the first table row
+        self.sort_cache = {} #----------------------------------------------------------------------------------------------------(column, reverse) -> sorted row order of the current model
+        self.category_names = [] #------------------------------------------------------------------------------------------------Categories of the last loaded table, for the edit and chart windows
+
+        #----------------------------------------------------------------------------------------------------------------------------------Scroll the table with the mouse wheel
+        self.transactions_tree.bind("<MouseWheel>", lambda event: self.scroll_table('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.transactions_tree.bind("<Button-4>", lambda event: self.scroll_table('scroll', -1, 'units'))
+        self.transactions_tree.bind("<Button-5>", lambda event: self.scroll_table('scroll', 1, 'units'))
 
         #------------------------------------------------------------------------------------------------------------------------------------------Search bar and button
         search_frame = ttk.Frame(self.root)
@@ -70,9 +114,31 @@ class FinanceTrackerGUI:
         sort_button.pack(pady=6)
 
         #----------------------------------------------------------------------------------------------------------------Refresh button to refresh the transaction table
-        self.refresh_button = ttk.Button(self.root, text="Refresh", command=lambda: self.display_transactions(self.transactions), width=7, padding=(3, 3))
+        self.refresh_button = ttk.Button(self.root, text="Refresh", command=self.refresh_transactions, width=7, padding=(3, 3))
         self.refresh_button.pack(pady=6)
 
+        #-------------------------------------------------------------------------------------------------------------Button to open the trend and cash flow charts
+        trends_button = ttk.Button(self.root, text="Trends", command=self.open_trends, width=7, padding=(3, 3))
+        trends_button.pack(pady=6)
+
+        #------------------------------------------------------------------------------------------Button to delete, re-price or re-categorise many transactions at once
+        bulk_button = ttk.Button(self.root, text="Bulk Edit", command=self.open_bulk_edit, width=9, padding=(3, 3))
+        bulk_button.pack(pady=6)
+
+        #----------------------------------------------------------------------------------------------------------Status line and progress bar for background work
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(pady=6)
+
+        self.status_var = tk.StringVar()
+        status_label = ttk.Label(status_frame, textvariable=self.status_var)
+        status_label.pack(side="left", padx=5)
+
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
+        self.progress.pack(side="left")
+
+        #---------------------------------------------------------------------------------------------------Search as the user types (a new key press cancels the older search)
+        self.search_entry.bind("<KeyRelease>", lambda event: self.search_transactions(show_message=False))
+
         #---------------------------------------------------------------------------------------------------------------------------------Bind events to column headings
         self.transactions_tree.heading('Category', text='Category', command=lambda: self.sort_by_column(0))
         self.transactions_tree.heading('Date', text='Date', command=lambda: self.sort_by_column(1))
@@ -80,83 +146,225 @@ class FinanceTrackerGUI:
 
         
     def load_transactions(self, filename):
-        '''Load transactions from a JSON file'''
+        '''Load transactions from storage (a JSON snapshot and its journal, or an SQLite database)'''
         
         try:
-            with open(filename, 'r') as file:
-                transaction = json.load(file) #-------------------------------------------------------------------------------------Load transactions from the JSON file
-                return transaction
-        except FileNotFoundError:
-            return {}
-
-    def display_transactions(self, transactions):
-        '''Display transactions in the Treeview'''
-        
-        #------------------------------------------------------------------------------------------------------------------Clear existing transactions from the treeview
-        self.transactions_tree.delete(*self.transactions_tree.get_children())
-
-        #-------------------------------------------------------------------------------------------------------------------------------Add transactions to the treeview
-        for category, category_transactions in transactions.items():
-            for transaction in category_transactions:
-                date = transaction['date']
-                amount = transaction['amount']
-                self.transactions_tree.insert("", 'end', values=(category, date, amount)) #------------------------------------ Insert the transaction into the Treeview
-        
-    def search_transactions(self):
-        '''Search transactions based on user input'''
+            return ledger.load(filename) #--------------------------------------------------------------------------------------Load the snapshot and the changes logged after it
+        except json.decoder.JSONDecodeError:
+            return ledger.transactions
+
+    def show_busy(self, busy):
+        '''Start or stop the progress bar while the background worker is busy'''
+        
+        if busy:
+            self.progress.start(10)
+        else:
+            self.progress.stop()
+
+    @instrumentation.timed('gui.load')
+    def load_in_background(self, filename, cancelled):
+        '''Load the transactions and prepare the table (runs on the worker thread)'''
+        
+        self.load_transactions(filename)
+        return self.prepare_table(cancelled)
+
+    @instrumentation.timed('gui.summary')
+    def prepare_table(self, cancelled):
+        '''Take a snapshot of the table and compute the summary (runs on the worker thread).
+        The UI thread only ever reads the snapshot, so the worker can go on changing the ledger.
+        Returns (summary, table rows, category names).'''
+        
+        store = ledger.column_store()
+        if self.transactions is ledger.transactions:
+            rows = store.snapshot() #--------------------------------------------------------------------------------------Copy of the store columns, not shared with the ledger
+        else:
+            rows = self.table_model(self.transactions)
+        return aggregation.aggregate(store, 'category', ('sum', 'count')), rows, list(self.transactions)
+
+    def table_model(self, transactions):
+        '''Get a list of (category, date, amount) rows from a transactions dictionary'''
+        
+        return [(category, transaction['date'], transaction['amount']) for category, category_transactions in transactions.items() for transaction in category_transactions]
+
+    def watch_changes(self):
+        '''Pick up the changes other instances saved (one stat call every CHANGE_POLL_MS when nothing changed)'''
+        
+        if ledger.changed_elsewhere() and not self.worker.pending: #----------------------------------------------------Wait until the worker is idle
+            self.status_var.set("Loading changes saved by another instance...")
+            self.worker.submit('refresh', self.sync_in_background, self.finish_refresh)
+        self.root.after(CHANGE_POLL_MS, self.watch_changes)
+
+    @instrumentation.timed('gui.sync')
+    def sync_in_background(self, cancelled):
+        '''Apply the changes other instances saved and prepare the table (runs on the worker thread)'''
+        
+        ledger.refresh()
+        return self.prepare_table(cancelled)
+
+    def refresh_transactions(self):
+        '''Refresh the table and summary from the full set of transactions'''
+        
+        self.worker.submit('refresh', self.prepare_table, self.finish_refresh)
+
+    def finish_refresh(self, result):
+        '''Show the full table once the background refresh is done'''
+        
+        if isinstance(result, Exception):
+            messagebox.showerror("Error", f"Could not load transactions: {result}")
+            return
+        
+        summary, rows, self.category_names = result
+        self.display_transactions(rows)
+        count = sum(values['count'] for category, values in summary)
+        total = sum(to_minor(values['sum']) for category, values in summary) #-----------------------------------------------Add the category sums exactly in minor units
+        self.status_var.set(f"{count} transactions, total Rs. {format_minor(total)}")
+
+    @instrumentation.timed('gui.display')
+    def display_transactions(self, rows):
+        '''Display table rows prepared by the worker in the Treeview'''
         
-        search_query = self.search_entry.get().lower() #----------------------------------------------------------------------Get the search query from the entry widget
-        filtered_transactions = {} #-------------------------------------------------------------------------------------------Dictionary to store filtered transactions
+        self.table_rows = rows #-------------------------------------------------------------------------------------Swapped in here on the UI thread, never changed afterwards
+        self.table_order = None
+        self.table_offset = 0
+        self.sort_cache = {}
+        self.render_table()
 
-        for category, category_transactions in self.transactions.items():
-            filtered_category_transactions = [] #---------------------------------------------------------------------List to store filtered transactions for a category
+    @instrumentation.timed('gui.render')
+    def render_table(self):
+        '''Fill the visible Treeview rows from the table model'''
+        
+        total = len(self.table_rows)
+        for index, item in enumerate(self.table_items):
+            position = self.table_offset + index
             
-            for transaction in category_transactions:
-                try:
-                    amount = float(search_query) #---------------------------------------------------------------------------Check if the search query is a valid number
-                except ValueError:
-                    amount = None
-                    
-                if search_query in category.lower() or (amount is not None and amount == transaction['amount']): #------------Check if the search query matches the category or amount
-                    filtered_category_transactions.append(transaction)
-                    
-            if filtered_category_transactions:
-                filtered_transactions[category] = filtered_category_transactions #-------------------------------------------Add filtered transactions to the dictionary
+            if position < total:
+                row = self.table_order[position] if self.table_order is not None else position
+                self.transactions_tree.item(item, values=self.table_rows[row])
+                self.transactions_tree.move(item, '', index) #---------------------------------------------------------------Re-attach the row if it was hidden
+            else:
+                self.transactions_tree.detach(item) #-----------------------------------------------------------------------Hide rows past the end of the table
+
+        #-------------------------------------------------------------------------------------------------------------------Show the visible window on the scrollbar
+        if total:
+            self.scrollbar.set(self.table_offset / total, min(self.table_offset + PAGE_SIZE, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_table(self, action, amount, unit=None):
+        '''Move the visible window of the table (called by the scrollbar and the mouse wheel)'''
+        
+        total = len(self.table_rows)
+        if action == 'moveto':
+            offset = int(float(amount) * total)
+        elif unit == 'pages':
+            offset = self.table_offset + int(amount) * PAGE_SIZE
+        else:
+            offset = self.table_offset + int(amount)
+
+        offset = max(0, min(offset, total - PAGE_SIZE))
+        if offset != self.table_offset:
+            self.table_offset = offset
+            self.render_table()
+        
+    def search_transactions(self, show_message=True):
+        '''Search transactions based on user input'''
+        
+        search_query = self.search_entry.get() #------------------------------------------------------------------------------Get the search query from the entry widget
+        self.status_var.set("Searching...")
+        
+        #-----------------------------------------------------------------------------------------Look up the category and amount indexes on the worker thread
+        self.worker.submit('search', self.find_transactions, lambda result: self.finish_search(result, show_message), search_query)
+
+    @instrumentation.timed('gui.search')
+    def find_transactions(self, search_query, cancelled):
+        '''Look up the transactions matching a search query (runs on the worker thread)'''
+        
+        return self.table_model(ledger.search_index.search(search_query, cancelled))
 
+    def finish_search(self, filtered_transactions, show_message):
+        '''Show the search results once the background search is done'''
+        
+        if isinstance(filtered_transactions, Exception):
+            messagebox.showerror("Error", f"Search failed: {filtered_transactions}")
+            return
         
         if not filtered_transactions: #-----------------------------------------------------------------------------------------------------If no transactions are found
-            messagebox.showinfo("No Results", "No transactions found matching your search.")
+            self.status_var.set("No transactions found.")
+            if show_message:
+                messagebox.showinfo("No Results", "No transactions found matching your search.")
         else:
             self.display_transactions(filtered_transactions)
+            self.status_var.set(f"{len(self.table_rows)} transactions found.")
 
             
     def sort_by_column(self, col, reverse=False):
         '''Sort transactions by column'''
         
-        data = [(self.transactions_tree.set(child, col), child) for child in self.transactions_tree.get_children('')] #-------Get all the transactions from the Treeview
+        #--------------------------------------------------------------------------------------------------------------------Use the cached order if this sort was done before
+        order = self.sort_cache.get((col, reverse))
+        if order is not None:
+            instrumentation.count('gui.sort_cache_hits')
+            self.show_sorted(col, reverse, order)
+            return
 
-        #--------------------------------------------------------------------------------------------------------------------Sort the data based on the column and order
-        try:
-            if col == 1:  #---------------------------------------------------------------------------------------------------------------------------------Sort by date
-                data.sort(key=lambda x: self.convert_date_for_sorting(x[0]), reverse=reverse)
-                
-            elif col == 2:  #-----------------------------------------------------------------------------------------------------------------------------Sort by amount
-                data.sort(key=lambda x: float(x[0]), reverse=reverse)
-                
-            else:  #------------------------------------------------------------------------------------------------------------------------------------Sort by category
-                data.sort(key=lambda x: x[0].lower().strip(), reverse=reverse)
-                
-        except ValueError:
+        #--------------------------------------------------------------------------------------------------------------------Sort the table model on the worker thread
+        rows = self.table_rows
+        self.status_var.set("Sorting...")
+        self.worker.submit('sort', self.sort_rows, lambda order: self.finish_sort(col, reverse, rows, order), rows, ('category', 'date', 'amount')[col], reverse)
+
+    def finish_sort(self, col, reverse, rows, order):
+        '''Cache and show a sort order once the background sort is done'''
+        
+        if isinstance(order, (TypeError, ValueError)):
             messagebox.showerror("Invalid Data", "One or more transactions have invalid data.")
             return
+        if isinstance(order, Exception):
+            messagebox.showerror("Error", f"Sort failed: {order}")
+            return
+        if rows is not self.table_rows: #--------------------------------------------------------------------------------The table changed while sorting
+            return
+
+        self.sort_cache[(col, reverse)] = order
+        instrumentation.count('gui.sorted_rows', len(order))
+        self.status_var.set("")
+        self.show_sorted(col, reverse, order)
 
-        #----------------------------------------------------------------------------------------------------------------------------Rearrange items in sorted positions
-        for index, (value, child) in enumerate(data):
-            self.transactions_tree.move(child, '', index) #---------------------------------------------------------------------Move the transaction to the new position
+    def show_sorted(self, col, reverse, order):
+        '''Show the table in a sorted order from the top'''
+        
+        self.table_order = order
+        self.table_offset = 0
+        self.render_table()
 
         #------------------------------------------------------------------------------------------------------------------Update the heading to show the sort direction
         self.transactions_tree.heading(col, command=lambda: self.sort_by_column(col, not reverse))
 
+    @instrumentation.timed('gui.sort')
+    def sort_rows(self, rows, column, reverse, cancelled=None):
+        '''Get the table model rows in sorted order using typed keys ('category', 'date' or 'amount')'''
+        
+        if isinstance(rows, ColumnStore):
+            return rows.sort_order(column, reverse) #--------------------------------------------------------------------Sort directly on the store columns
+
+        if column == 'date':
+            keys = [date_sort_key(date) for category, date, amount in rows] #------------------------------------------------Integer day numbers, each distinct date is parsed once (see dates)
+        elif column == 'amount':
+            keys = [float(amount) for category, date, amount in rows]
+        else:
+            keys = [category.lower().strip() for category, date, amount in rows]
+
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+
+    def open_trends(self):
+        '''Open a window with trend and cash flow charts of the transactions'''
+        
+        TrendWindow(self.root, self.worker, self.category_names)
+
+    def open_bulk_edit(self):
+        '''Open a window that changes every transaction matching a filter at once'''
+        
+        BulkEditWindow(self.root, self.worker, self.category_names, self.refresh_transactions)
+
     def sort_transactions(self):
         sort_option = self.sort_var.get()
         if sort_option == 'Date':
@@ -165,12 +373,7 @@ class FinanceTrackerGUI:
     def convert_date_for_sorting(self, date_str):
         '''Convert date string to a format suitable for sorting'''
         
-        try:
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d") #------------------------------------------------------------Convert the date string to a datetime object
-            return date_obj.year, date_obj.month, date_obj.day
-        
-        except ValueError:
-            return datetime.max.year, datetime.max.month, datetime.max.day #------------------------------------------------Return maximum date values for invalid dates
+        return date_sort_key(date_str) #--------------------------------------------------------------------------------------Day number, invalid dates sort last
             
     def sort_transactions(self):
         '''Sort transactions based on user selection'''
@@ -186,12 +389,258 @@ class FinanceTrackerGUI:
             col = 2  #---------------------------------------------------------------------------------------------------------------Sort by the amount column (index 2)
         self.sort_by_column(col)
 
+
+
+class TrendWindow:
+    '''Window with trend and cash flow charts drawn from the ledger's rollup cube.
+    The charts read one total per period from the cube, never the transactions themselves, and the
+    periods are downsampled to the width of the canvas so every pixel column is drawn once.'''
+
+    def __init__(self, parent, worker, categories):
+        self.worker = worker
+        self.series = [] #-----------------------------------------------------------------------------------------------------(period, out, in, count) of the chosen level and category
+        self.window = tk.Toplevel(parent)
+        self.window.title("Trends")
+
+        #---------------------------------------------------------------------------------------------------------------------Chart, level and category choosers
+        controls = ttk.Frame(self.window)
+        controls.pack(pady=6)
+
+        self.view_var = tk.StringVar(value=CHART_VIEWS[0])
+        self.level_var = tk.StringVar(value='month')
+        self.category_var = tk.StringVar(value=ALL_CATEGORIES)
+        choosers = [(self.view_var, CHART_VIEWS, self.draw),
+                    (self.level_var, list(LEVELS), self.load_series),
+                    (self.category_var, [ALL_CATEGORIES] + categories, self.load_series)]
+        for variable, values, command in choosers:
+            combobox = ttk.Combobox(controls, textvariable=variable, values=values, state='readonly', width=16)
+            combobox.pack(side="left", padx=3)
+            combobox.bind("<<ComboboxSelected>>", lambda event, command=command: command())
+
+        self.canvas = tk.Canvas(self.window, width=CHART_WIDTH, height=CHART_HEIGHT, background='white')
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.draw()) #-------------------------------------------------------Redraw at the new width when the window is resized
+        self.load_series()
+
+    def load_series(self):
+        '''Read the periods of the chosen level and category from the cube on the worker thread'''
+        
+        category = self.category_var.get()
+        self.worker.submit('trend', self.read_series, self.finish_series, self.level_var.get(), None if category == ALL_CATEGORIES else category)
+
+    @instrumentation.timed('gui.trend')
+    def read_series(self, level, category, cancelled):
+        '''Get the cube series (builds the cube first if it was not saved, runs on the worker thread)'''
+        
+        return ledger.cube.series(level, category)
+
+    def finish_series(self, series):
+        '''Keep the series and draw it once the worker is done'''
+        
+        if isinstance(series, Exception):
+            messagebox.showerror("Error", f"Could not read the trends: {series}")
+            return
+        self.series = series
+        self.draw()
+
+    def draw(self):
+        '''Draw the chosen chart at the current size of the canvas'''
+        
+        self.canvas.delete('all')
+        width = max(self.canvas.winfo_width(), CHART_MARGIN * 3)
+        height = max(self.canvas.winfo_height(), CHART_MARGIN * 3)
+        plot_width = width - 2 * CHART_MARGIN
+
+        if not self.series:
+            self.canvas.create_text(width // 2, height // 2, text="No dated transactions.")
+            return
+
+        #-----------------------------------------------------------------------------------------------------------------Label the first and last period under the plot
+        level = self.level_var.get()
+        self.canvas.create_text(CHART_MARGIN, height - CHART_MARGIN // 2, text=period_label(level, self.series[0][0]), anchor=tk.W)
+        self.canvas.create_text(width - CHART_MARGIN, height - CHART_MARGIN // 2, text=period_label(level, self.series[-1][0]), anchor=tk.E)
+
+        if self.view_var.get() == 'Trend':
+            self.draw_trend(width, height, plot_width)
+        else:
+            self.draw_cash_flow(width, height, plot_width)
+
+    def y_position(self, value, low, high, height):
+        '''Get the canvas y of a value on an axis from low (bottom) to high (top)'''
+        
+        if high == low:
+            return height // 2
+        return CHART_MARGIN + (high - value) * (height - 2 * CHART_MARGIN) / (high - low)
+
+    def draw_axis(self, low, high, width, height, x, anchor):
+        '''Draw the zero line and label the lowest and highest value of an axis'''
+        
+        zero = self.y_position(0, low, high, height)
+        self.canvas.create_line(CHART_MARGIN, zero, width - CHART_MARGIN, zero, fill='gray')
+        self.canvas.create_text(x, CHART_MARGIN, text=format_minor(high), anchor=anchor)
+        self.canvas.create_text(x, height - CHART_MARGIN, text=format_minor(low), anchor=anchor)
+
+    def draw_trend(self, width, height, plot_width):
+        '''Net spending (out - in) per period as a line, with the range of each pixel column when periods share one'''
+        
+        buckets = downsample([out - received for period, out, received, count in self.series], plot_width)
+        low = min(0, min(bucket[0] for bucket in buckets))
+        high = max(0, max(bucket[1] for bucket in buckets))
+        self.draw_axis(low, high, width, height, CHART_MARGIN - 4, tk.E)
+
+        step = plot_width / len(buckets)
+        points = []
+        for index, (minimum, maximum, total, count) in enumerate(buckets):
+            x = CHART_MARGIN + (index + 0.5) * step
+            if count > 1: #----------------------------------------------------------------------------------------------Several periods in this pixel column: show their range
+                self.canvas.create_line(x, self.y_position(minimum, low, high, height), x, self.y_position(maximum, low, high, height), fill='light blue')
+            points.extend((x, self.y_position(total / count, low, high, height)))
+
+        if len(points) > 2:
+            self.canvas.create_line(*points, fill='blue', width=2)
+        else:
+            self.canvas.create_oval(points[0] - 3, points[1] - 3, points[0] + 3, points[1] + 3, fill='blue')
+
+    def draw_cash_flow(self, width, height, plot_width):
+        '''Money in (up) and money out (down) per period as bars, with the running balance as a line on its own axis'''
+        
+        outs = downsample([out for period, out, received, count in self.series], plot_width)
+        ins = downsample([received for period, out, received, count in self.series], plot_width)
+        low = -max(bucket[2] for bucket in outs)
+        high = max(bucket[2] for bucket in ins)
+        self.draw_axis(min(low, 0), max(high, 0), width, height, CHART_MARGIN - 4, tk.E)
+
+        step = plot_width / len(outs)
+        zero = self.y_position(0, min(low, 0), max(high, 0), height)
+        balances = []
+        balance = 0
+        for index, (out_bucket, in_bucket) in enumerate(zip(outs, ins)):
+            left = CHART_MARGIN + index * step
+            right = left + max(step - 1, 1)
+            if in_bucket[2]:
+                self.canvas.create_rectangle(left, self.y_position(in_bucket[2], min(low, 0), max(high, 0), height), right, zero, fill='green', outline='')
+            if out_bucket[2]:
+                self.canvas.create_rectangle(left, zero, right, self.y_position(-out_bucket[2], min(low, 0), max(high, 0), height), fill='red', outline='')
+            balance += in_bucket[2] - out_bucket[2]
+            balances.append(balance)
+
+        #------------------------------------------------------------------------------------------------------------------Running balance on the right hand axis
+        balance_low = min(0, min(balances))
+        balance_high = max(0, max(balances))
+        points = []
+        for index, balance in enumerate(balances):
+            points.extend((CHART_MARGIN + (index + 0.5) * step, self.y_position(balance, balance_low, balance_high, height)))
+        if len(points) > 2:
+            self.canvas.create_line(*points, fill='blue', width=2)
+        self.canvas.create_text(width - CHART_MARGIN + 4, CHART_MARGIN, text=format_minor(balance_high), anchor=tk.W, fill='blue')
+        self.canvas.create_text(width - CHART_MARGIN + 4, height - CHART_MARGIN, text=format_minor(balance_low), anchor=tk.W, fill='blue')
+
+
+
+class BulkEditWindow:
+    '''Window that deletes, re-prices or re-categorises every transaction matching a filter.
+    Preview counts the matching transactions, Apply changes them in one bulk change per category
+    and saves once. Both run on the worker thread; the main table is refreshed afterwards.'''
+
+    def __init__(self, parent, worker, categories, on_change):
+        self.worker = worker
+        self.on_change = on_change
+        self.window = tk.Toplevel(parent)
+        self.window.title("Bulk Edit")
+
+        #-----------------------------------------------------------------------------------------------------------Filter, action and value fields
+        form = ttk.Frame(self.window)
+        form.pack(padx=10, pady=6)
+
+        self.category_var = tk.StringVar(value=ALL_CATEGORIES)
+        self.action_var = tk.StringVar(value=bulk_edit.BULK_ACTIONS[0])
+        self.entries = {}
+        ttk.Label(form, text="Category").grid(row=0, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=self.category_var, values=[ALL_CATEGORIES] + categories, state='readonly', width=18).grid(row=0, column=1, pady=2)
+        for row, (name, label) in enumerate([('min', "Minimum amount"), ('max', "Maximum amount"), ('start', "Start date (YYYY-MM-DD)"),
+                                             ('end', "End date (YYYY-MM-DD)")], 1):
+            ttk.Label(form, text=label).grid(row=row, column=0, sticky=tk.W)
+            self.entries[name] = ttk.Entry(form, width=20)
+            self.entries[name].grid(row=row, column=1, pady=2)
+        ttk.Label(form, text="Action").grid(row=5, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=self.action_var, values=list(bulk_edit.BULK_ACTIONS), state='readonly', width=18).grid(row=5, column=1, pady=2)
+        ttk.Label(form, text="Amount, factor or category").grid(row=6, column=0, sticky=tk.W)
+        self.entries['value'] = ttk.Entry(form, width=20)
+        self.entries['value'].grid(row=6, column=1, pady=2)
+
+        buttons = ttk.Frame(self.window)
+        buttons.pack(pady=6)
+        ttk.Button(buttons, text="Preview", command=lambda: self.run(True)).pack(side="left", padx=5)
+        self.apply_button = ttk.Button(buttons, text="Apply", command=lambda: self.run(False))
+        self.apply_button.pack(side="left", padx=5)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self.window, textvariable=self.status_var).pack(pady=6)
+
+    def read_filters(self):
+        '''Read the filter fields as bulk_edit arguments, or show an error and return None'''
+        
+        text = {name: entry.get().strip() for name, entry in self.entries.items()}
+        try:
+            min_amount = parse_amount(text['min']) if text['min'] else None
+            max_amount = parse_amount(text['max']) if text['max'] else None
+            for name in ('start', 'end'):
+                if text[name]:
+                    date_to_day(text[name])
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid amounts and dates in the format YYYY-MM-DD.")
+            return None
+
+        category = self.category_var.get()
+        filters = (None if category == ALL_CATEGORIES else category, min_amount, max_amount, text['start'] or None, text['end'] or None)
+        if filters == (None, None, None, None, None):
+            messagebox.showerror("Error", "Give at least one filter.")
+            return None
+        action = self.action_var.get()
+        return (action, None if action == 'delete' else text['value']) + filters
+
+    def run(self, dry_run):
+        '''Count (dry_run) or change the matching transactions on the worker thread'''
+        
+        arguments = self.read_filters()
+        if arguments is None:
+            return
+        if not dry_run:
+            if not messagebox.askyesno("Bulk Edit", f"Apply '{arguments[0]}' to every matching transaction?"):
+                return
+            self.apply_button.state(['disabled']) #-------------------------------------------------------------------Apply once at a time
+        self.status_var.set("Counting..." if dry_run else "Applying...")
+        #-----------------------------------------------------------------------------------------------------------Separate kinds, so a Preview never supersedes a queued Apply
+        self.worker.submit('bulk_preview' if dry_run else 'bulk_apply', self.edit, lambda count: self.finish(count, dry_run), *arguments, dry_run)
+
+    @instrumentation.timed('gui.bulk_edit')
+    def edit(self, action, value, category, min_amount, max_amount, start_date, end_date, dry_run, cancelled):
+        '''Run the bulk edit (runs on the worker thread)'''
+        
+        return bulk_edit.bulk_edit(action, value, category, min_amount, max_amount, start_date, end_date, dry_run)
+
+    def finish(self, count, dry_run):
+        '''Show the result and refresh the main table after a change'''
+        
+        if not dry_run:
+            self.apply_button.state(['!disabled'])
+        if isinstance(count, Exception):
+            self.status_var.set("")
+            messagebox.showerror("Error", f"Could not edit the transactions: {count}")
+            return
+        if dry_run:
+            self.status_var.set(f"{count} transactions would change.")
+        else:
+            self.status_var.set(f"{count} transactions changed.")
+            if count:
+                self.on_change()
+
             
-def main():
-    '''Create the main window and start the application'''
+def main(transactions=None):
+    '''Create the main window and start the application.
+    The CLI passes its own transactions dictionary so the file is not read a second time.'''
     root = tk.Tk()
-    app = FinanceTrackerGUI(root) #--------------------------------------------------------------------------------------------------Create the FinanceTrackerGUI object
-    app.display_transactions(app.transactions) #------------------------------------------------------------------------------------Display transactions in the Treeview
+    app = FinanceTrackerGUI(root, transactions) #------------------------------------------------------------------------------------Create the FinanceTrackerGUI object (loads and displays in the background)
     root.mainloop()
 
 if __name__ == "__main__":
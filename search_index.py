@@ -0,0 +1,226 @@
+from bisect import bisect_left, bisect_right
+
+from dates import date_sort_key, day_range
+from money import parse_minor, to_minor
+
+#---------------------------------------------------------------------------------------------------Deleting more rows than this at once rebuilds the sorted lists instead
+BULK_REMOVE_LIMIT = 64
+
+
+class SearchIndex:
+    """Indexes over the transactions dictionary for category, amount and date searches.
+
+    - categories are kept in a sorted list of lower case names for prefix and substring search
+    - amounts (in integer minor units, see money) and dates are kept in sorted lists of
+      (value, sequence) keys for exact equality and range search
+    Every transaction gets a sequence number when it is indexed, so results come back in the order
+    the transactions were added. The index is built on first use and then kept up to date through
+    the ledger listener methods.
+    """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.stale = True
+
+    def rebuild(self):
+        """Build all indexes from the transactions dictionary."""
+        self.next_seq = 0
+        self.rows = {} #------------------------------------------------------------------------------sequence -> (category, transaction)
+        self.seq_by_id = {} #-------------------------------------------------------------------------id(transaction) -> sequence
+        self.amount_keys = []
+        self.date_keys = []
+        self.pending = [] #---------------------------------------------------------------------------Keys added since the lists were last sorted
+        self.category_names = sorted((category.lower(), category) for category in self.transactions)
+
+        for category, category_transactions in self.transactions.items():
+            for transaction in category_transactions:
+                self.index_row(category, transaction)
+
+        self.amount_keys.sort()
+        self.date_keys.sort()
+        self.pending = []
+        self.stale = False
+
+    def ensure_built(self):
+        """Build the index if it is missing, and sort in any rows added since the last query."""
+        if self.stale:
+            self.rebuild()
+        elif self.pending:
+            for amount_key, date_key in self.pending:
+                self.amount_keys.append(amount_key)
+                self.date_keys.append(date_key)
+            self.amount_keys.sort() #---------------------------------------------------------------Timsort merges the sorted run and the new tail quickly
+            self.date_keys.sort()
+            self.pending = []
+
+    def index_row(self, category, transaction, pending=False):
+        """Give a transaction a sequence number and add it to the amount and date indexes."""
+        seq = self.next_seq
+        self.next_seq += 1
+        self.rows[seq] = (category, transaction)
+        self.seq_by_id[id(transaction)] = seq
+
+        amount_key = (to_minor(transaction['amount']), seq)
+        date_key = (date_sort_key(transaction['date']), seq)
+        if pending:
+            self.pending.append((amount_key, date_key))
+        else:
+            self.amount_keys.append(amount_key)
+            self.date_keys.append(date_key)
+
+    def unindex_rows(self, transactions):
+        """Remove transactions from every index."""
+        self.ensure_built()
+        removed = set()
+
+        for transaction in transactions:
+            seq = self.seq_by_id.pop(id(transaction))
+            del self.rows[seq]
+            removed.add(seq)
+
+            if len(transactions) <= BULK_REMOVE_LIMIT:
+                del self.amount_keys[bisect_left(self.amount_keys, (to_minor(transaction['amount']), seq))]
+                del self.date_keys[bisect_left(self.date_keys, (date_sort_key(transaction['date']), seq))]
+
+        if len(transactions) > BULK_REMOVE_LIMIT:
+            self.amount_keys = [key for key in self.amount_keys if key[1] not in removed]
+            self.date_keys = [key for key in self.date_keys if key[1] not in removed]
+
+    def add_category_name(self, category):
+        """Add a category to the sorted category name list."""
+        key = (category.lower(), category)
+        position = bisect_left(self.category_names, key)
+        if position == len(self.category_names) or self.category_names[position] != key:
+            self.category_names.insert(position, key)
+
+    def remove_category_name(self, category):
+        """Remove a category from the sorted category name list."""
+        key = (category.lower(), category)
+        position = bisect_left(self.category_names, key)
+        if position < len(self.category_names) and self.category_names[position] == key:
+            del self.category_names[position]
+
+    #-----------------------------------------------------------------------------------------------Ledger listener methods
+    def apply(self, record, removed):
+        """Update the indexes for one ledger change record."""
+        if self.stale:
+            return
+
+        op = record['op']
+        category = record['category']
+
+        if op == 'add':
+            self.add_category_name(category)
+            category_transactions = self.transactions[category]
+            for transaction in category_transactions[len(category_transactions) - len(record['rows']):]:
+                self.index_row(category, transaction, pending=True)
+
+        elif op == 'update':
+            self.unindex_rows(removed)
+            self.index_row(category, self.transactions[category][record['index']], pending=True)
+
+        elif op in ('delete', 'delete_rows'):
+            self.unindex_rows(removed)
+
+        elif op == 'update_rows':
+            self.unindex_rows(removed)
+            category_transactions = self.transactions[category]
+            for index in record['indexes']:
+                self.index_row(category, category_transactions[index], pending=True)
+
+        elif op == 'move_rows': #-----------------------------------------------------------------------Same transaction objects, so only the category changes
+            new_category = record['new_category']
+            self.add_category_name(new_category)
+            for transaction in removed:
+                self.rows[self.seq_by_id[id(transaction)]] = (new_category, transaction)
+
+        elif op == 'delete_category':
+            self.unindex_rows(removed)
+            self.remove_category_name(category)
+
+        elif op == 'rename_category':
+            new_category = record['new_category']
+            self.remove_category_name(category)
+            self.add_category_name(new_category)
+            for transaction in self.transactions[new_category]:
+                seq = self.seq_by_id[id(transaction)]
+                self.rows[seq] = (new_category, transaction)
+
+    def reset(self, transactions):
+        """Drop the index after the whole dictionary was replaced. It is rebuilt on next use."""
+        self.transactions = transactions
+        self.stale = True
+
+    #-----------------------------------------------------------------------------------------------Queries
+    def categories_with_prefix(self, prefix):
+        """Get the categories whose name starts with prefix (case insensitive)."""
+        self.ensure_built()
+        prefix = prefix.lower()
+        position = bisect_left(self.category_names, (prefix,))
+        matches = []
+        while position < len(self.category_names) and self.category_names[position][0].startswith(prefix):
+            matches.append(self.category_names[position][1])
+            position += 1
+        return matches
+
+    def categories_matching(self, text):
+        """Get the categories whose name contains text (case insensitive)."""
+        self.ensure_built()
+        text = text.lower()
+        return [category for name, category in self.category_names if text in name]
+
+    def rows_in_range(self, keys, low, high):
+        """Get the (category, transaction) rows whose key value lies between low and high (inclusive)."""
+        start = 0 if low is None else bisect_left(keys, (low,))
+        end = len(keys) if high is None else bisect_right(keys, (high, float('inf')))
+        return [self.rows[seq] for value, seq in keys[start:end]]
+
+    def amount_range(self, low=None, high=None):
+        """Get the (category, transaction) rows with low <= amount <= high (amounts in currency units)."""
+        self.ensure_built()
+        return self.rows_in_range(self.amount_keys, None if low is None else to_minor(low), None if high is None else to_minor(high))
+
+    def amount_equal(self, amount):
+        """Get the (category, transaction) rows with exactly this amount."""
+        return self.amount_range(amount, amount)
+
+    def minor_range(self, low=None, high=None):
+        """Get the (category, transaction) rows with low <= amount <= high, given in minor units."""
+        self.ensure_built()
+        return self.rows_in_range(self.amount_keys, low, high)
+
+    def date_range(self, start_date=None, end_date=None):
+        """Get the (category, transaction) rows with start_date <= date <= end_date ('YYYY-MM-DD').
+        Rows with an invalid date are only returned when neither end is given."""
+        self.ensure_built()
+        if start_date is None and end_date is None:
+            return self.rows_in_range(self.date_keys, None, None)
+        return self.rows_in_range(self.date_keys, *day_range(start_date, end_date))
+
+    def search(self, query, cancelled=None):
+        """Find the transactions whose category contains the query, or whose amount equals it.
+        cancelled is an optional function that returns True when the search should stop early.
+        Returns:
+        - A {category: [transaction, ...]} dictionary in the same layout as the transactions dictionary."""
+
+        results = {}
+        query = query.strip()
+
+        for category in self.categories_matching(query):
+            if cancelled is not None and cancelled():
+                return results
+            if self.transactions[category]:
+                results[category] = list(self.transactions[category])
+
+        try:
+            amount = parse_minor(query) #----------------------------------------------------------Parse the query once, not once per row
+        except ValueError:
+            amount = None
+
+        if amount is not None:
+            matched = set(results)
+            for category, transaction in self.minor_range(amount, amount):
+                if category not in matched:
+                    results.setdefault(category, []).append(transaction)
+
+        return results
@@ -0,0 +1,195 @@
+import sqlite3
+
+from storage_backend import StorageBackend, file_stamp
+
+#---------------------------------------------------------------------------------------------------Open connections, shared by every user of the same database file
+connections = {}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL, -- from_minor(units): an 8 byte IEEE double, read back as the same float (see money)
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, id);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+"""
+
+#---------------------------------------------------------------------------------------------------Rows are read from the database in pieces of this size
+FETCH_SIZE = 10000
+
+
+def get_connection(filename):
+    """Get the shared connection to a database file, opening it on first use.
+    The connection may be used from the GUI worker thread as well, so it is not tied to one thread."""
+
+    connection = connections.get(filename)
+    if connection is None:
+        connection = sqlite3.connect(filename, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connections[filename] = connection
+    return connection
+
+
+class SqliteStorage(StorageBackend):
+    """Stores transactions in an SQLite database.
+
+    Categories are kept in their own table with their position, so the transactions dictionary comes
+    back in the same order. The transactions of a category are ordered by id, and the position a change
+    record refers to is the position in that order.
+    """
+
+    def __init__(self, filename='transactions.db'):
+        self.filename = filename
+        self.connection = get_connection(filename)
+
+    def is_empty(self):
+        """Check whether the database has no categories yet."""
+        return self.connection.execute("SELECT 1 FROM categories LIMIT 1").fetchone() is None
+
+    def load(self, transactions, apply_record):
+        """Fill the transactions dictionary, reading rows from the database in pieces."""
+        for (name,) in self.connection.execute("SELECT name FROM categories ORDER BY position"):
+            transactions[name] = []
+
+        cursor = self.connection.execute("SELECT category, amount, date FROM transactions ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for category, amount, date in rows:
+                transactions[category].append({'amount': amount, 'date': date})
+
+        return 0
+
+    def row_id(self, category, index):
+        """Get the id of the transaction at index in a category."""
+        return self.connection.execute(
+            "SELECT id FROM transactions WHERE category = ? ORDER BY id LIMIT 1 OFFSET ?", (category, index)).fetchone()[0]
+
+    def row_ids(self, category, indexes):
+        """Get the ids of the transactions at several indexes of a category with one query."""
+        ids = [row[0] for row in self.connection.execute("SELECT id FROM transactions WHERE category = ? ORDER BY id", (category,))]
+        return [ids[index] for index in indexes]
+
+    def add_category(self, category):
+        """Add a category at the end of the category order if it does not exist yet."""
+        self.connection.execute(
+            "INSERT OR IGNORE INTO categories (name, position) SELECT ?, COALESCE(MAX(position), 0) + 1 FROM categories", (category,))
+
+    def append(self, record):
+        """Run the SQL for one change record inside the current database transaction."""
+        op = record['op']
+        category = record['category']
+        execute = self.connection.execute
+
+        if op == 'add':
+            self.add_category(category)
+            self.connection.executemany(
+                "INSERT INTO transactions (category, amount, date) VALUES (?, ?, ?)",
+                ((category, amount, date) for amount, date in record['rows']))
+
+        elif op == 'update':
+            execute("UPDATE transactions SET amount = ?, date = ? WHERE id = ?",
+                    (record['amount'], record['date'], self.row_id(category, record['index'])))
+
+        elif op == 'delete':
+            execute("DELETE FROM transactions WHERE id = ?", (self.row_id(category, record['index']),))
+
+        elif op == 'update_rows':
+            self.connection.executemany("UPDATE transactions SET amount = ?, date = ? WHERE id = ?",
+                                        ((amount, date, row_id) for (amount, date), row_id
+                                         in zip(record['rows'], self.row_ids(category, record['indexes']))))
+
+        elif op in ('delete_rows', 'move_rows'):
+            ids = self.row_ids(category, record['indexes'])
+            if op == 'move_rows': #-------------------------------------------------------------------New ids put the rows at the end of the other category
+                self.add_category(record['new_category'])
+                self.connection.executemany("INSERT INTO transactions (category, amount, date) SELECT ?, amount, date FROM transactions WHERE id = ?",
+                                            ((record['new_category'], row_id) for row_id in ids))
+            self.connection.executemany("DELETE FROM transactions WHERE id = ?", ((row_id,) for row_id in ids))
+
+        elif op == 'delete_category':
+            execute("DELETE FROM transactions WHERE category = ?", (category,))
+            execute("DELETE FROM categories WHERE name = ?", (category,))
+
+        elif op == 'rename_category':
+            new_category = record['new_category']
+            if execute("SELECT 1 FROM categories WHERE name = ?", (new_category,)).fetchone():
+                #-----------------------------------------------------------------------------------Merge: move the rows to the end of the existing category
+                execute("INSERT INTO transactions (category, amount, date) SELECT ?, amount, date FROM transactions WHERE category = ? ORDER BY id",
+                        (new_category, category))
+                execute("DELETE FROM transactions WHERE category = ?", (category,))
+                execute("DELETE FROM categories WHERE name = ?", (category,))
+            else:
+                execute("UPDATE transactions SET category = ? WHERE category = ?", (new_category, category))
+                execute("UPDATE categories SET name = ? WHERE name = ?", (new_category, category))
+
+        else:
+            raise ValueError(f"Unknown change record: {op}")
+
+    def commit(self, transactions):
+        """Commit the current database transaction."""
+        self.connection.commit()
+
+    def rollback(self):
+        """Roll back the current database transaction."""
+        self.connection.rollback()
+
+    def write_all(self, transactions):
+        """Replace the database contents with the transactions dictionary in one transaction."""
+        with self.connection:
+            self.connection.execute("DELETE FROM transactions")
+            self.connection.execute("DELETE FROM categories")
+            self.connection.executemany("INSERT INTO categories (name, position) VALUES (?, ?)",
+                                        ((category, position) for position, category in enumerate(transactions, 1)))
+            self.connection.executemany("INSERT INTO transactions (category, amount, date) VALUES (?, ?, ?)",
+                                        ((category, transaction['amount'], transaction['date'])
+                                         for category, category_transactions in transactions.items()
+                                         for transaction in category_transactions))
+
+    def iter_rows(self, category=None, start_date=None, end_date=None):
+        """Stream (category, amount, date) rows straight from the database using the indexes."""
+        conditions = []
+        parameters = []
+        if category is not None:
+            conditions.append("category = ?")
+            parameters.append(category)
+        if start_date is not None:
+            conditions.append("date >= ?")
+            parameters.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= ?")
+            parameters.append(end_date)
+
+        query = "SELECT category, amount, date FROM transactions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        cursor = self.connection.execute(query + " ORDER BY id", parameters)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+    def stamp(self):
+        """Get the stamp of the database file (and of its write-ahead log while that has pages in it)."""
+        stamp = file_stamp([self.filename])
+        wal = file_stamp([self.filename + '-wal'])
+        if wal and wal[0][1]:
+            stamp += wal
+        return stamp
+
+    def close(self):
+        """Commit, move the write-ahead log into the database file and keep the shared connection
+        open for other users of the same file."""
+        self.connection.commit()
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
@@ -0,0 +1,69 @@
+import os
+
+
+class StorageBackend:
+    """Interface every storage backend of the ledger implements.
+
+    The ledger keeps the transactions dictionary in memory and hands every change record to the
+    backend with append. commit makes the appended records durable. Backends decide how: the JSON
+    backend (journal.TransactionJournal) appends to a log, the SQLite backend
+    (sqlite_storage.SqliteStorage) runs the matching SQL statements inside a database transaction.
+    """
+
+    def load(self, transactions, apply_record):
+        """Fill the transactions dictionary from storage.
+        apply_record is the ledger function that applies one change record to a dictionary."""
+        raise NotImplementedError
+
+    def append(self, record):
+        """Store one change record (durable after the next commit)."""
+        raise NotImplementedError
+
+    def append_batch(self, records):
+        """Store several change records as one unit: after a crash either all of them are found or none.
+        Backends that only make appends durable at commit already get this from a loop over append."""
+        for record in records:
+            self.append(record)
+
+    def commit(self, transactions):
+        """Make every appended record durable."""
+        raise NotImplementedError
+
+    def rollback(self):
+        """Drop every record appended since the last commit. The ledger loads the transactions again afterwards."""
+        raise NotImplementedError
+
+    def write_all(self, transactions):
+        """Replace everything in storage with the transactions dictionary."""
+        raise NotImplementedError
+
+    def iter_rows(self, category=None, start_date=None, end_date=None):
+        """Yield stored (category, amount, date) rows, optionally filtered by category and date range."""
+        raise NotImplementedError
+
+    def apply_external(self, record):
+        """Follow a change record that another process has already stored, after it was applied to the
+        transactions dictionary. Backends that keep an in-memory view of their files update it here."""
+        pass
+
+    def close(self):
+        """Commit nothing further and release files or connections."""
+        raise NotImplementedError
+
+    def stamp(self):
+        """Get a cheap description of the stored files (names, sizes and modification times) that changes
+        whenever the stored data changes, or None if the backend cannot tell. Caches written next to the
+        data (such as the rollup cube) keep the stamp so they can tell whether they are still valid."""
+        return None
+
+
+def file_stamp(filenames):
+    """Get [name, size, modification time in ns] of every file that exists."""
+    stamp = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            continue
+        stamp.append([os.path.basename(filename), stat.st_size, stat.st_mtime_ns])
+    return stamp
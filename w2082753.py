@@ -1,66 +1,125 @@
 import json
-from datetime import datetime
-import sample_code_1
-
-#---------------------------------------------------------------------------------------------------Global dictionary to store transactions
-transactions = {}
+import archive
+import bulk_edit
+import bulk_import
+import parallel_import
+import ledger
+from concurrency import ConcurrencyError
+from dates import valid_date
+import aggregation
+import instrumentation
+from money import from_minor, parse_amount, to_minor
+
+#---------------------------------------------------------------------------------------------------Global dictionary to store transactions (shared with the ledger module)
+transactions = ledger.transactions
+
+#---------------------------------------------------------------------------------------------------Bulk imports keep rows that are already stored, like batch_cli and ingest_service
+#Set to 'skip' to leave them out or 'flag' to only list them, both in '<file>.duplicates'.
+DUPLICATE_MODE = 'keep'
 
 #---------------------------------------------------------------------------------------------------File handling functions
 
+@instrumentation.timed('cli.load')
 def load_transactions():
-    """Load transactions from the 'transactions.json' file."""
+    """Load transactions from storage.
+    By default this is the 'transactions.bin' snapshot (or 'transactions.json' before the first
+    compaction) plus the 'transactions.log' journal. Set the FINANCE_TRACKER_STORAGE environment
+    variable to a .db file name to use SQLite instead, or to a .parts folder name to keep one
+    segment per month."""
     try:
-        with open('transactions.json', 'r') as file:
-            transactions.update(json.load(file))
+        ledger.load()
+        if transactions:
             print("Transactions loaded successfully.")
-    except (FileNotFoundError, json.decoder.JSONDecodeError):
-        print("transactions.json Not found or empty. Creating a new dictionary.")
-        transactions.clear()
+        else:
+            print(f"{ledger.STORAGE_FILENAME} Not found or empty. Creating a new dictionary.")
+    except json.decoder.JSONDecodeError:
+        print(f"{ledger.STORAGE_FILENAME} is not valid JSON. Creating a new dictionary.")
     return transactions
 
 
 #--------------------------------------------------------------------------------------------------Save function for save details in transactions dictionary
+@instrumentation.timed('cli.save')
 def save_transactions():
-    """Save the transactions dictionary to the 'transactions.json' file."""
-    with open("transactions.json", "w") as file:
-        json.dump(transactions, file, indent=4)#--------------------------------------------------Dump the transactions list to the file in a readable format
+    """Save the changes made since the last save.
+    With JSON storage the changes are appended to the 'transactions.log' journal, which is compacted
+    into the 'transactions.bin' snapshot once it grows bigger than the snapshot. 'transactions.json' is
+    rewritten as an export at the same time. With SQLite they are committed."""
+    ledger.save()
 
 
+@instrumentation.timed('cli.bulk_import')
 def read_bulk_transactions_from_file(filename):
     """Read bulk transactions from a text file and add them to the transactions dictionary.
+    Archives written by Export Archive ('.ndjson', '.gz', '.zst') are decompressed while they are read.
+    Malformed lines are written to '<filename>.rejects' instead of stopping the import. Rows that are
+    already stored are kept unless DUPLICATE_MODE says otherwise (see '<filename>.duplicates').
     Args:
     - filename: The name of the file containing the bulk data.
     Returns:
     - transactions: The updated transactions dictionary."""
     
     try:
-        with open(filename, 'r') as file: #-----------------------Open the file in read mode
-            for line in file:
-                parts = line.strip().split(',')#------------------Split the line into parts based on commas
-                
-                if len(parts) != 3: #-----------------------------Check if the line has exactly 3 parts
-                    raise ValueError("Invalid data format in the file. Ensure each line has expense type, amount, and date separated by commas.")
-                
-                expense_type, amount, date = parts #--------------Extract the expense type, amount, and date from the parts
-                amount = float(amount)
-                
-                if expense_type not in transactions: #------------If the expense type is not already in the transactions dictionary, create a new empty list for it
-                    transactions[expense_type] = []
-                    
-                transactions[expense_type].append({'amount': amount, 'date': date})
+        if archive.is_archive(filename):
+            stats = archive.import_archive(filename, duplicates=DUPLICATE_MODE)
+        else:
+            stats = bulk_import.stream_bulk_transactions(filename, duplicates=DUPLICATE_MODE) #--Stream the file in batches
+        instrumentation.count('rows_imported', stats['rows'])
+        instrumentation.count('rows_rejected', stats['rejected'])
+        print(f"Imported {stats['rows']} transactions in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/sec).")
+        
+        if stats['rejected']:
+            print(f"{stats['rejected']} invalid lines were written to '{filename}.rejects'.")
+            
+        if stats['duplicates']:
+            print(f"{stats['duplicates']} duplicate transactions were {'skipped' if DUPLICATE_MODE == 'skip' else 'found'} (listed in '{filename}.duplicates').")
                 
     except FileNotFoundError:
         print(f"File '{filename}' not found.")
         
-    except ValueError as e:
-        print(f"Error: {e}")
-        
     except Exception as e:
         print(f"Error: {e}")
     
     return transactions
    
 
+@instrumentation.timed('cli.bulk_import_files')
+def read_bulk_transactions_from_files(pattern):
+    """Read every bulk file in a folder or glob pattern in parallel and add them to the transactions dictionary.
+    Args:
+    - pattern: A folder or glob pattern (e.g. 'imports/*.txt').
+    Returns:
+    - transactions: The updated transactions dictionary."""
+    
+    try:
+        stats = parallel_import.import_bulk_files(pattern, duplicates=DUPLICATE_MODE)
+        instrumentation.count('rows_imported', stats['rows'])
+        instrumentation.count('rows_rejected', stats['rejected'])
+        print(f"Imported {stats['rows']} transactions from {stats['files']} files in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/sec).")
+        
+        if stats['rejected']:
+            print(f"{stats['rejected']} invalid lines were written to the '.rejects' files.")
+            
+        if stats['duplicates']:
+            print(f"{stats['duplicates']} duplicate transactions were {'skipped' if DUPLICATE_MODE == 'skip' else 'found'} (listed in the '.duplicates' files).")
+            
+    except FileNotFoundError as e:
+        print(f"File '{e.filename}' not found.")
+        
+    except Exception as e:
+        print(f"Error: {e}")
+        
+    return transactions
+
+
+def read_bulk_input(bulk_input):
+    """Import a single bulk file, or every file in a folder or glob pattern."""
+    if parallel_import.is_multi_file(bulk_input):
+        read_bulk_transactions_from_files(bulk_input)
+    else:
+        read_bulk_transactions_from_file(bulk_input)
+    save_transactions()
+
+
 def get_valid_date():
     """Get a valid date from user input."""
     
@@ -68,8 +127,7 @@ def get_valid_date():
         date = input("Enter date (YYYY-MM-DD): ")
         
         try:
-            datetime.strptime(date, "%Y-%m-%d") #-----------------------------------------------------Try to convert input to datetime
-            return date
+            return valid_date(date) #-----------------------------------------------------------------Check the fixed YYYY-MM-DD layout (cached)
         
         except ValueError:
             print("Invalid date format. Please enter a date in the format YYYY-MM-DD.")
@@ -90,24 +148,20 @@ def add_transaction():
     
     while True:
         try: 
-            amount = float(input("Enter amount: "))
+            amount = parse_amount(input("Enter amount: "))
             break
         
         except ValueError:
             print("Invalid input. Please enter a valid number for the amount.")
 
-    if category not in transactions: #----------------------------Check if category exists
-        transactions[category] = []  #----------------------------Initialize category list
-        
     date = get_valid_date()
-    transactions[category].append({  #----------------------------Add transaction to category list
-        "amount": amount,
-        "date": date
-    })
+    ledger.add_row(category, amount, date) #----------------------Add transaction to category list (creates the category if needed)
+    save_transactions() #----------------------------------------------------------Save right away so other instances see it and the storage lock is released
     
     print("Transaction added successfully.\n")
         
 
+@instrumentation.timed('cli.view')
 def view_transactions():
     """View all transactions in the transactions dictionary."""
     
@@ -115,25 +169,20 @@ def view_transactions():
         print("All transactions.")
         category_count = 1
         
-        #--------------------------------------------------------------------------------Iterate over each category and its transaction list
-        for category, transaction_list in transactions.items():
+        #--------------------------------------------------------------------------------Iterate over each category and its transactions in the column store
+        for category, rows in ledger.column_store().grouped_rows():
             print("----------------------------------------")
             print(f"{category_count}) Expense type: {category}")
             
             count = 1
             category_count = category_count + 1
             
-            #----------------------------------------------------------------------------Iterate over each transaction in the transaction list
-            for transaction in transaction_list:
-                if isinstance(transaction, dict):  #-------------------------------------Check if transaction is a dictionary
-                    
-                    print(f"\n{count}")
-                    print(f"Amount  : {transaction.get('amount')}")
-                    print(f"Date    : {transaction.get('date')}")
-                    count = count + 1
-                    
-                else:
-                    print(f"Invalid transaction format: {transaction}")
+            #----------------------------------------------------------------------------Iterate over each transaction in the category
+            for date, amount in rows:
+                print(f"\n{count}")
+                print(f"Amount  : {amount}")
+                print(f"Date    : {date}")
+                count = count + 1
                     
         print("----------------------------------------")
         
@@ -146,7 +195,6 @@ def update_transaction():
     """Update an existing transaction in the transactions list."""
     
     view_transactions() # Display all transactions for user reference
-    global transactions
     if transactions: # Check if there are any transactions
         try:
             # Get the index of the category to update
@@ -172,30 +220,16 @@ def update_transaction():
                     choice = input("What do you want to change? (category -'c'/amount-'a'/date-'d'): ").lower()
 
                     if choice == "a":
-                        new_amount = float(input("Enter the new amount: "))
-                        transaction_details["amount"] = new_amount
+                        new_amount = parse_amount(input("Enter the new amount: "))
+                        ledger.update_row(category, transaction_index, new_amount, transaction_details["date"])
 
                     elif choice == "d":
                         new_date = get_valid_date()
-                        transaction_details["Enter new date"] = new_date
+                        ledger.update_row(category, transaction_index, transaction_details["amount"], new_date)
 
                     elif choice == "c":
                         new_category = input("Enter the new category: ")
-                        updated_expenses = {}
-                        
-                        # Loop over the dictionary and update the key name
-                        for key, value in transactions.items():
-                            if key == category:
-                                updated_expenses[new_category] = value
-                            else:
-                                updated_expenses[key] = value  # Copy other keys unchanged
-                        transactions.clear()
-                        transactions = updated_expenses
-                        print(updated_expenses)
-                        
-                        #print(transactions)
-                        #transactions.clear()
-                        #transactions = updated_expenses
+                        ledger.rename_category(category, new_category) #-----------------Rename the category in place (merges if it already exists)
                         
                     else:
                         print("Invalid option!")
@@ -238,7 +272,7 @@ def delete_transaction():
                 if 0 <= category_index < len(category_list):
                     category = category_list[category_index]
                     
-                    del transactions[category]
+                    ledger.delete_category(category)
                     
                     save_transactions()
                     
@@ -261,7 +295,7 @@ def delete_transaction():
                     
                     #----------------------------------------------------------------------Check if the transaction index is valid
                     if 0 <= transaction_index < len(transactions_list):
-                        del transactions_list[transaction_index]
+                        ledger.delete_row(category, transaction_index)
                         
                         save_transactions()
                         
@@ -293,6 +327,7 @@ def get_transaction_index(transactions, id):
     return None
 
 
+@instrumentation.timed('cli.summary')
 def display_summary():
     """Display a summary of income, expense, and balance."""
     
@@ -300,14 +335,9 @@ def display_summary():
         print("No transactions found.")
         return
 
-    total_expenses = 0
-    category_totals = {}
-
-    #---------------------------------------------------------------------Calculate total expenses and category-wise totals
-    for category, category_transactions in transactions.items():
-        category_total = sum(transaction["amount"] for transaction in category_transactions)
-        category_totals[category] = category_total
-        total_expenses += category_total
+    #---------------------------------------------------------------------Read the category-wise totals kept up to date on every change (exact minor units)
+    category_totals = ledger.totals.category_totals
+    total_expenses = from_minor(sum(category_totals.values()))
 
     print()
     
@@ -317,12 +347,69 @@ def display_summary():
     #----------------------------------------------------------------------Print category-wise expenses
     print("\n--Category wise Expenses--")
     for category, total in category_totals.items():
-        print(f"\n{category}: Rs. {total}")
+        print(f"\n{category}: Rs. {from_minor(total)}")
 
     print("")
 
 
 
+def get_optional_date(message):
+    """Get a date from user input, or None if the user leaves it empty."""
+    
+    while True:
+        date = input(message).strip()
+        if not date:
+            return None
+        
+        try:
+            return valid_date(date)
+        
+        except ValueError:
+            print("Invalid date format. Please enter a date in the format YYYY-MM-DD.")
+
+
+def display_report():
+    """Display totals, counts, means, min, max and median grouped by category, day, month or year."""
+    
+    if not transactions:
+        print("No transactions found.")
+        return
+
+    group_by = input("Group by (category/day/month/year): ").strip().lower() or 'category'
+    if group_by not in aggregation.GROUP_BY_OPTIONS:
+        print("Invalid option!")
+        return
+    
+    start_date = get_optional_date("Start date (YYYY-MM-DD, empty for all): ")
+    end_date = get_optional_date("End date (YYYY-MM-DD, empty for all): ")
+    
+    functions = ('sum', 'count', 'mean', 'min', 'max', 'percentile')
+    with instrumentation.timer('cli.report'):
+        report = aggregation.aggregate(ledger.column_store(), group_by, functions, start_date, end_date)
+
+    if not report:
+        print("No transactions found.")
+        return
+
+    print(f"\n{group_by.capitalize():<20} {'Total':>14} {'Count':>8} {'Mean':>12} {'Min':>12} {'Max':>12} {'Median':>12}")
+    print("-" * 96)
+    for group, values in report:
+        print(f"{group:<20} {values['sum']:>14.2f} {values['count']:>8} {values['mean']:>12.2f} {values['min']:>12.2f} {values['max']:>12.2f} {values['percentile']:>12.2f}")
+    print("")
+
+
+def check_totals():
+    """Recompute every total from scratch and compare it with the running totals."""
+    
+    mismatches = ledger.totals.check(transactions)
+    if mismatches:
+        print(f"{len(mismatches)} totals do not match:")
+        for mismatch in mismatches:
+            print(f" - {mismatch}")
+    else:
+        print("All running totals match the transactions.")
+
+
 def transactions_id_check(message):
     """Get a valid integer input from the user for a transaction ID."""
     while True:
@@ -335,28 +422,161 @@ def transactions_id_check(message):
             
 
 
-def search_transactions():
-    """Search transactions by category."""
+def get_optional_amount(message):
+    """Get an amount from user input, or None if the user leaves it empty."""
+    
+    while True:
+        amount = input(message).strip()
+        if not amount:
+            return None
+        
+        try:
+            return parse_amount(amount)
+        
+        except ValueError:
+            print("Invalid input. Please enter a valid number for the amount.")
+
+
+@instrumentation.timed('cli.bulk_edit')
+def bulk_edit_transactions():
+    """Delete, re-price or re-categorise every transaction matching a filter in one step."""
+    
+    if not transactions:
+        print("No transactions found.")
+        return
+
+    category = input("Category (exact name, empty for all): ").strip() or None
+    min_amount = get_optional_amount("Minimum amount (empty for no limit): ")
+    max_amount = get_optional_amount("Maximum amount (empty for no limit): ")
+    start_date = get_optional_date("Start date (YYYY-MM-DD, empty for all): ")
+    end_date = get_optional_date("End date (YYYY-MM-DD, empty for all): ")
+    if category is None and min_amount is None and max_amount is None and start_date is None and end_date is None:
+        print("Give at least one filter.")
+        return
+
+    action = input("Action (delete/set/add/multiply/move): ").strip().lower()
+    if action not in bulk_edit.BULK_ACTIONS:
+        print("Invalid option!")
+        return
+    value = None
+    if action == 'move':
+        value = input("Move to category: ")
+    elif action != 'delete':
+        value = input("Factor: " if action == 'multiply' else "Amount: ")
+
+    try:
+        count = bulk_edit.bulk_edit(action, value, category, min_amount, max_amount, start_date, end_date, dry_run=True)
+        if not count:
+            print("No transactions to change.")
+            return
+        if input(f"{count} transactions will change. Continue? (Y/N): ").upper() != "Y":
+            return
+        count = bulk_edit.bulk_edit(action, value, category, min_amount, max_amount, start_date, end_date)
+    except ValueError as e:
+        print(f"Invalid input: {e}")
+        return
+    print(f"{count} transactions changed.")
+
+
+@instrumentation.timed('cli.export_archive')
+def export_archive_file():
+    """Stream every transaction into a compressed archive file that can be imported on another machine."""
     
-    category = input("Enter category to search: ")  #--------------------------------------------------------------------------------Ask the user to input the category they want to search for
+    filename = input("Archive file name (.ndjson or .csv, optionally .gz or .zst, e.g. ledger.ndjson.gz): ").strip()
+    if not filename:
+        print("Invalid input!")
+        return
+    try:
+        stats = archive.export_archive(filename, archive.transaction_rows(transactions))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    print(f"Exported {stats['rows']} transactions to '{filename}' ({stats['bytes'] / 1024:.0f} KiB) in {stats['seconds']:.2f}s.")
 
-     #-------------------------------------------------------------------------------------------------------------------------------Filter transactions by category
-    filtered_transactions = {id: transaction for id, transaction in transactions.items() if transaction['category'] == category}
 
-    if not filtered_transactions:
+def print_search_results(results):
+    """Print (category, transaction) search results with their count and total."""
+    
+    if not results:
         print("No transactions found.")
+        return
+    
+    print(f"\nNumber of transactions found: {len(results)}")
+    total_amount = from_minor(sum(to_minor(transaction['amount']) for category, transaction in results))
+    print(f"Total amount: {total_amount}")
+    
+    for category, transaction in results:
+        print("----------------------------------------")
+        print(f"Category: {category}")
+        print(f"Amount: {transaction['amount']}")
+        print(f"Date: {transaction['date']}")
+
+
+def search_transactions():
+    """Search transactions by category, amount range or date range using the search index."""
+    
+    search_by = input("Search by (category -'c'/amount-'a'/date-'d'): ").lower()#-----------------------------------------------------Ask the user what they want to search by
+    
+    if search_by == "c":
+        category = input("Enter category to search: ")  #--------------------------------------------------------------------------Ask the user to input the category they want to search for
         
-    else:
-        print(f"\nNumber of transactions found for category '{category}': {len(filtered_transactions)}")
-        total_amount = sum(transaction['amount'] for transaction in filtered_transactions.values())
-        print(f"Total amount for category '{category}': {total_amount}")
+        #---------------------------------------------------------------------------------------------------------------------------Find the categories containing the text in the category index
+        with instrumentation.timer('cli.search'):
+            results = []
+            for matched_category in ledger.search_index.categories_matching(category):
+                results.extend((matched_category, transaction) for transaction in transactions[matched_category])
+            
+    elif search_by == "a":
+        low = get_optional_amount("Minimum amount (empty for no minimum): ")
+        high = get_optional_amount("Maximum amount (empty for no maximum): ")
+        with instrumentation.timer('cli.search'):
+            results = ledger.search_index.amount_range(low, high)
         
-        for id, transaction in filtered_transactions.items():
-            print("----------------------------------------")
-            print(f"Transaction {id}")
-            print(f"Amount: {transaction['amount']}")
-            print(f"Category: {transaction['category']}")
-            print(f"Date: {transaction['date']}")
+    elif search_by == "d":
+        start_date = get_optional_date("Start date (YYYY-MM-DD, empty for all): ")
+        end_date = get_optional_date("End date (YYYY-MM-DD, empty for all): ")
+        with instrumentation.timer('cli.search'):
+            results = ledger.search_index.date_range(start_date, end_date)
+        
+    else:
+        print("Invalid option!")
+        return
+    
+    instrumentation.count('search_results', len(results))
+    print_search_results(results)
+
+
+def open_gui():
+    """Open the GUI on the CLI's transactions dictionary.
+    The GUI module (and tkinter) is only imported here, so the CLI starts without them."""
+    
+    try:
+        import sample_code_1
+    except ImportError as e:
+        print(f"The GUI is not available: {e}")
+        return
+    
+    try:
+        sample_code_1.main(transactions)
+    except sample_code_1.tk.TclError as e: #------------------------------------------------------No display (e.g. on a headless server)
+        print(f"The GUI could not be opened: {e}")
+
+
+def toggle_profiling():
+    """Switch the profiling mode on or off. Switching it off writes the report file."""
+    
+    if instrumentation.enabled:
+        report_filename = instrumentation.stop()
+        print(f"Profiling stopped. Report written to '{report_filename}'.")
+        return
+    
+    mode = input("Capture (timers/cprofile/tracemalloc/all): ").strip().lower() or 'timers'
+    if mode not in ('timers', 'cprofile', 'tracemalloc', 'all'):
+        print("Invalid option!")
+        return
+    
+    instrumentation.start(cprofile=mode in ('cprofile', 'all'), trace_memory=mode in ('tracemalloc', 'all'))
+    print("Profiling started. Choose this option again to stop and write the report.")
 
 
 #----------------------------------------------------------------------------------------------------------------Starting main program
@@ -371,13 +591,13 @@ def main_menu():
         display_main_menu() #------------------------------------------------------------------------------------For get the main menu
         
     elif method == "B":
-        bulk_file = input("Enter the file name(txt) : ")#--------------------------------------------------------for bulk method
+        bulk_file = input("Enter the file name(txt), folder or pattern : ")#------------------------------------for bulk method
         
-        read_bulk_transactions_from_file(bulk_file)#------------------------------------------------------------call the bulk function
+        read_bulk_input(bulk_file)#-----------------------------------------------------------------------------call the bulk function
         display_main_menu()
 
     elif method == "G":
-        sample_code_1.main()
+        open_gui()
         display_main_menu()
         
         
@@ -394,50 +614,91 @@ def display_main_menu():
         print("7. Add another Bulk File")
         print("8. Open GUI")
         print("9. Exit")
+        print("10. Report")
+        print("11. Check Totals")
+        print("12. Profiling On/Off")
+        print("13. Bulk Edit")
+        print("14. Export Archive")
         
         choice = input("Enter your choice: ")
 
-        #If the user chose to add a transaction, add it and print the new summary
-        if choice == '1':
-            add_transaction()
+        #Pick up what other instances saved meanwhile (one stat call when nothing changed)
+        try:
+            if ledger.refresh():
+                print("Transactions were changed by another instance and have been updated.")
+        except ConcurrencyError as e:
+            print(e)
+            continue
 
-        # If the user chose to view transactions, print them    
-        elif choice == '2':
-            view_transactions()
+        try:
+            #If the user chose to add a transaction, add it and print the new summary
+            if choice == '1':
+                add_transaction()
+
+            # If the user chose to view transactions, print them    
+            elif choice == '2':
+                view_transactions()
+
+            # If the user chose to update a transaction, update it and print the new summary
+            elif choice == '3':
+                update_transaction()
+                display_summary()
+
+            # If the user chose to delete a transaction, delete it and print the new summary    
+            elif choice == '4':
+                delete_transaction()
+
+            # If the user chose to display a summary, print it    
+            elif choice == '5':
+                display_summary()
+
+            #If the user can search the transaction to view usign this option
+            elif choice == '6':
+                search_transactions()
+
+            #If the user can get again to load the bulk data file   
+            elif choice == '7':
+                bulk_file = input("Enter the file name(txt), folder or pattern : ")
+                read_bulk_input(bulk_file)
+
+            elif choice == '8':
+                open_gui()
+            
+            # If the user chose to exit, break the loop    
+            elif choice == '9':
+                print("Exiting program.")
+                save_transactions()
+                ledger.close()
+                if instrumentation.enabled:
+                    print(f"Profile report written to '{instrumentation.stop()}'.")
+                break
+        
+            #If the user chose the report, print the grouped totals
+            elif choice == '10':
+                display_report()
 
-        # If the user chose to update a transaction, update it and print the new summary
-        elif choice == '3':
-            update_transaction()
-            display_summary()
+            #If the user chose to check the totals, recompute them and compare
+            elif choice == '11':
+                check_totals()
 
-        # If the user chose to delete a transaction, delete it and print the new summary    
-        elif choice == '4':
-            delete_transaction()
+            #If the user chose profiling, switch it on or off
+            elif choice == '12':
+                toggle_profiling()
 
-        # If the user chose to display a summary, print it    
-        elif choice == '5':
-            display_summary()
+            #If the user chose bulk edit, change every matching transaction at once
+            elif choice == '13':
+                bulk_edit_transactions()
 
-        #If the user can search the transaction to view usign this option
-        elif choice == '6':
-            search_transactions()
+            #If the user chose to export, stream every transaction into an archive file
+            elif choice == '14':
+                export_archive_file()
 
-        #If the user can get again to load the bulk data file   
-        elif choice == '7':
-            bulk_file = input("Enter the file name(txt) : ")
-            read_bulk_transactions_from_file(bulk_file)
+            else:
+                print("Invalid choice. Please try again.")
 
-        elif choice == '8':
-            sample_code_1.main()
-            
-        # If the user chose to exit, break the loop    
-        elif choice == '9':
-            print("Exiting program.")
-            save_transactions()
-            break
-        
-        else:
-            print("Invalid choice. Please try again.")
+        #Another instance changed the same transactions, or kept the storage locked for too long
+        except ConcurrencyError as e:
+            print(f"\n{e}")
 
 
 if __name__ == "__main__":